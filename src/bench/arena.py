@@ -0,0 +1,74 @@
+"""
+Memory held by the syntax tree of a large generated program, as the
+dataclass nodes from `parse.parsenode` and as an `AstArena`, in bytes per
+node. The tokens are shared by both and not counted.
+
+The arena is measured as just its columns, and again once a view has been
+created for every node, which is what a full walk over it (by the
+resolver and codegen) ends up doing.
+
+    python -m bench.arena [functions]
+"""
+import sys
+import tracemalloc
+from dataclasses import fields, is_dataclass
+
+from lex.lexer import Lexer
+from lex.token import Token
+from parse.parser import Parser
+from parse.arena import AstArena
+
+def generated_program(functions: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines.append(f"let f{i} = |a, b|:")
+        lines.append(f"    let c = a * {i} + b")
+        lines.append(f"    c = if c > {i}: c - a / 2 else: -c end")
+        lines.append(f"    c + b")
+        lines.append(f"end")
+        lines.append(f"print(f{i}({i}, 3))")
+    return "\n".join(lines) + "\n"
+
+def count_nodes(node: object) -> int:
+    if is_dataclass(node) and not isinstance(node, Token):
+        return 1 + sum(count_nodes(getattr(node, field.name)) for field in fields(node))
+    if isinstance(node, (tuple, list)):
+        return sum(count_nodes(value) for value in node)
+    return 0
+
+def traced() -> int:
+    return tracemalloc.get_traced_memory()[0]
+
+def report(label: str, size: int, nodes: int):
+    print(f"{label.ljust(40)} {size:>12} bytes  {size / nodes:8.1f} bytes/node")
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = generated_program(functions)
+    lexer = Lexer(source)
+    tokens = lexer.lex()
+    parser = Parser(tokens, lexer.line_index)
+
+    tracemalloc.start()
+    start = traced()
+    tree = parser.parse_program()
+    tree_size = traced() - start
+
+    start = traced()
+    arena = AstArena.from_tree(tree, tokens)
+    arena_size = traced() - start
+
+    start = traced()
+    for index in range(len(arena)):
+        arena.node(index)
+    views_size = traced() - start
+    tracemalloc.stop()
+
+    nodes = count_nodes(tree)
+    print(f"{len(source)} bytes of source, {len(tokens)} tokens, {nodes} nodes")
+    report("dataclass nodes", tree_size, nodes)
+    report("arena columns", arena_size, nodes)
+    report("arena with every view", arena_size + views_size, nodes)
+
+if __name__ == "__main__":
+    main()
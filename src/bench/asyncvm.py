@@ -0,0 +1,81 @@
+"""
+Event loop latency while SPY programs run on it: a heartbeat coroutine
+sleeps 1ms at a time and records how late it wakes up, while `n` fib
+programs run concurrently, first with blocking `VM.run_module` calls and
+then on `AsyncVM`s at a few `yield_every` settings.
+
+    python -m bench.asyncvm [n]
+"""
+import asyncio
+import math
+import sys
+from time import perf_counter_ns
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.asyncvm import AsyncVM
+from bench.common import format_time_ns
+
+source = """
+let fib = |n|:
+    if n < 2: n
+    else: fib(n - 1) + fib(n - 2)
+    end
+end
+fib(17)
+"""
+
+def percentile(values: list[int], p: float) -> int:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+async def measure(n: int, run) -> tuple[int, list[int]]:
+    """
+    Runs `n` copies of `run` next to the heartbeat, and returns the total
+    time and the heartbeat's wake-up delays.
+    """
+
+    delays = []
+    finished = False
+
+    async def heartbeat():
+        while not finished:
+            start = perf_counter_ns()
+            await asyncio.sleep(0.001)
+            delays.append(perf_counter_ns() - start - 1_000_000)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    start = perf_counter_ns()
+    await asyncio.gather(*(run() for _ in range(n)))
+    elapsed = perf_counter_ns() - start
+    finished = True
+    await beat
+    return elapsed, delays
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    block = compile_source(source)
+
+    async def blocking():
+        VM().run_module(block)
+
+    def on_async_vm(yield_every: int):
+        async def run():
+            await AsyncVM(yield_every=yield_every).run_module_async(block)
+        return run
+
+    runs = {"blocking VM.run_module": blocking}
+    for yield_every in (10_000, 1000, 100):
+        runs[f"AsyncVM yield_every={yield_every}"] = on_async_vm(yield_every)
+
+    print(f"{'':40} {'total':>12} {'p50 delay':>12} {'p99 delay':>12} {'max delay':>12}")
+    for label, run in runs.items():
+        elapsed, delays = asyncio.run(measure(n, run))
+        print(f"{label.ljust(40)} {format_time_ns(elapsed).rjust(12)}"
+              f" {format_time_ns(percentile(delays, 50)).rjust(12)}"
+              f" {format_time_ns(percentile(delays, 99)).rjust(12)}"
+              f" {format_time_ns(max(delays)).rjust(12)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Stack backend against register backend: instructions executed and wall
+time for the same compiled programs. The register VM is timed against the
+stack VM's bytecode loop on its own, which is what it replaces, and
+against the stack VM with its threaded and Python tiers, which is how
+modules are normally run. The register VM has no such tiers, and the
+stack VM outruns it once they kick in.
+
+    python -m bench.backends [n]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.registers import RegisterVM
+from bench.common import time_interleaved, report
+
+def programs(n: int) -> dict[str, str]:
+    return {
+        "fib": f"""
+let fib = |n|:
+    if n < 2: n
+    else: fib(n - 1) + fib(n - 2)
+    end
+end
+fib({n})
+""",
+        "sum": f"""
+let sum = |n, total|:
+    if n < 1: total
+    else:
+        let square = n * n
+        sum(n - 1, total + square - n / 2)
+    end
+end
+let repeat = |times|:
+    if times > 0:
+        sum({n * 20}, 0)
+        repeat(times - 1)
+    end
+end
+repeat(100)
+""",
+        "closures": f"""
+let make_counter = ||:
+    let count = 0
+    ||:
+        count = count + 1
+        count
+    end
+end
+let run = |counter, n|:
+    if n > 0:
+        counter()
+        run(counter, n - 1)
+    else: counter()
+    end
+end
+run(make_counter(), {n * 200})
+""",
+    }
+
+def count_instructions(vm, block) -> int:
+    count = 0
+    def tracer(frames, pc):
+        nonlocal count
+        count += 1
+    vm.tracer = tracer
+    vm.run_module(block)
+    return count
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    for label, source in programs(n).items():
+        block = compile_source(source)
+        stack_count = count_instructions(VM(), block)
+        register_count = count_instructions(RegisterVM(), block)
+        print(f"{label}: {stack_count} stack instructions, {register_count} register instructions "
+              f"({register_count / stack_count * 100:.0f}%)")
+
+        bytecode_ns, tiered_ns, register_ns = time_interleaved([
+            lambda: VM(tier_up_threshold=None, transpile_threshold=None).run_module(block),
+            lambda: VM().run_module(block),
+            lambda: RegisterVM().run_module(block),
+        ], repeat=5)
+        report(f"{label} on the stack VM, bytecode only", bytecode_ns)
+        report(f"{label} on the register VM", register_ns, bytecode_ns)
+        report(f"{label} on the stack VM, every tier", tiered_ns)
+        report(f"{label} on the register VM", register_ns, tiered_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-call overhead of SPY function calls, with and without reusing frames.
+
+    python -m bench.calls [n]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from bench.common import time_interleaved, report
+
+def programs(n: int) -> dict[str, str]:
+    return {
+        "fib": f"""
+let fib = |n|:
+    if n < 2: n
+    else: fib(n - 1) + fib(n - 2)
+    end
+end
+fib({n})
+""",
+        "ackermann": f"""
+let ackermann = |m, n|:
+    if m < 1: n + 1
+    elif n < 1: ackermann(m - 1, 1)
+    else: ackermann(m - 1, ackermann(m, n - 1))
+    end
+end
+ackermann(2, {n * 20})
+""",
+    }
+
+def count_calls(block) -> int:
+    calls = 0
+    depth = 0
+    def tracer(frames, pc):
+        nonlocal calls, depth
+        if len(frames) > depth:
+            calls += 1
+        depth = len(frames)
+    vm = VM()
+    vm.tracer = tracer
+    vm.run_module(block)
+    # the module itself isn't a call
+    return calls - 1
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for label, source in programs(n).items():
+        block = compile_source(source)
+        calls = count_calls(block)
+        fresh_ns, pooled_ns = time_interleaved(
+            [lambda: VM(frame_pool_size=0).run_module(block), lambda: VM().run_module(block)], repeat=5)
+        print(f"{label}: {calls} calls")
+        report(f"{label} with fresh frames", fresh_ns)
+        report(f"{label} with pooled frames", pooled_ns, fresh_ns)
+        print(f"per call: {fresh_ns / calls:.0f}ns fresh, {pooled_ns / calls:.0f}ns pooled")
+
+if __name__ == "__main__":
+    main()
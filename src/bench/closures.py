@@ -0,0 +1,93 @@
+"""
+Closure-heavy code compiled the way it used to be, with every captured
+variable in a cell and every name loaded as a variable, against copying
+immutable captures into closures by value and loading immutable `let`s of
+literals as constants. Prints how many cells and deref instructions each
+version has, then times them on the bytecode tiers and with the Python
+tier. `print` discards its output.
+
+    python -m bench.closures [n]
+"""
+import sys
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from process.binding import Resolver, DeclarationSite
+from codegen.codegen import Codegen
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+class CellResolver(Resolver):
+    """
+    Treats every variable as one that can change, so every captured
+    variable gets a cell and no name is loaded as a constant.
+    """
+
+    def _declare(self, name: str, decl: DeclarationSite, type=None):
+        super()._declare(name, decl, type)
+        self.names[name][-1].immutable = False
+
+def program(n: int) -> str:
+    return f"""
+let scale = 3
+let offset = 10
+let compose = |f, g|: |x|: f(g(x)) end end
+let adder = |n|: |x|: x + n + offset end end
+let times = |n|: |x|: x * n * scale end end
+let sum = |i, acc|:
+    if i < 1: acc
+    else:
+        let double = times(2)
+        let step = compose(adder(i), double)
+        sum(i - 1, acc + step(i))
+    end
+end
+print(sum({n}, 0))
+"""
+
+def compile_with(cls: type[Resolver], source: str) -> Block:
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = cls(root, builtins.keys())
+    resolver.resolve()
+    return Codegen(resolver, lexer.line_index).compile_program(root, resolver)
+
+def closure_counts(block: Block) -> tuple[int, int]:
+    """
+    The number of cells in `block` and the functions nested in it, and of
+    their LOAD_DEREF and STORE_DEREF instructions.
+    """
+
+    cells = len(block.cell_names)
+    derefs = sum(1 for _, name, _ in block.instructions() if name in ("LOAD_DEREF", "STORE_DEREF"))
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            nested_cells, nested_derefs = closure_counts(const.block)
+            cells += nested_cells
+            derefs += nested_derefs
+    return cells, derefs
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    quiet = {**builtins, "print": lambda value: None}
+    source = program(n)
+    celled = compile_with(CellResolver, source)
+    copied = compile_with(Resolver, source)
+
+    for label, block in (("cells", celled), ("copies", copied)):
+        cells, derefs = closure_counts(block)
+        print(f"{label.ljust(10)} {cells:>4} cells {derefs:>4} deref instructions")
+
+    for tier, options in (("bytecode", {"transpile_threshold": None}), ("python", {})):
+        celled_ns, copied_ns = time_interleaved([
+            lambda: VM(quiet, **options).run_module(celled),
+            lambda: VM(quiet, **options).run_module(copied),
+        ], repeat=10)
+        report(f"{tier}: every capture in a cell", celled_ns)
+        report(f"{tier}: immutable captures copied", copied_ns, celled_ns)
+
+if __name__ == "__main__":
+    main()
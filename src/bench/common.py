@@ -0,0 +1,45 @@
+from time import perf_counter_ns
+from typing import Callable
+
+def format_time_ns(ns: int) -> str:
+    if ns < 1_000_000_000:
+        return f"{ns / 1_000_000:.3f}ms"
+    else:
+        return f"{ns / 1_000_000_000:.3f}s"
+
+def time_best_of(fn: Callable[[], object], repeat: int = 5) -> int:
+    """
+    Runs `fn` `repeat` times and returns the fastest run in nanoseconds.
+    """
+
+    best = None
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        fn()
+        elapsed = perf_counter_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def time_interleaved(fns: list[Callable[[], object]], repeat: int = 5) -> list[int]:
+    """
+    Like `time_best_of` for several functions, alternating between them on
+    each round so that they see the same machine noise. Use this when the
+    difference between them is small.
+    """
+
+    best = [None] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            start = perf_counter_ns()
+            fn()
+            elapsed = perf_counter_ns() - start
+            if best[i] is None or elapsed < best[i]:
+                best[i] = elapsed
+    return best
+
+def report(label: str, ns: int, baseline: int | None = None):
+    line = f"{label.ljust(40)} {format_time_ns(ns).rjust(12)}"
+    if baseline is not None and ns > 0:
+        line += f"  ({baseline / ns:.2f}x)"
+    print(line)
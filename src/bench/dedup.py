@@ -0,0 +1,76 @@
+"""
+Template-heavy code, where the same callbacks are written out again and
+again, compiled with every function literal getting its own block and
+with identical ones sharing a block. Prints the dedup ratio, the memory
+the compiled module holds on to and its serialized size.
+
+    python -m bench.dedup [functions]
+"""
+import sys
+import gc
+import tracemalloc
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from process.binding import Resolver
+from process.types import TypeInference
+from codegen.codegen import Codegen
+from codegen.block import Block
+from codegen.module import dump_module
+from vm.builtins import builtins
+
+def program(functions: int) -> str:
+    lines = ["let apply = |f, x|: f(x) end"]
+    for i in range(functions):
+        lines.append(f"let f{i} = |n|:")
+        lines.append("    let double = apply(|x|: x * 2 end, n)")
+        lines.append("    let bump = apply(|x|: x + 1 end, n)")
+        lines.append("    let pick = apply(|x|: if x > 10: x else: 10 end end, n)")
+        lines.append(f"    double + bump + pick + {i}")
+        lines.append("end")
+        lines.append(f"print(f{i}({i}))")
+    return "\n".join(lines) + "\n"
+
+def compile(source: str, share_blocks: bool) -> tuple[Block, Codegen]:
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = Resolver(root, builtins.keys())
+    resolver.resolve()
+    types = TypeInference(resolver)
+    types.infer()
+    codegen = Codegen(resolver, lexer.line_index, types=types, share_blocks=share_blocks)
+    return codegen.compile_program(root, resolver), codegen
+
+def retained(source: str, share_blocks: bool) -> int:
+    """
+    Bytes allocated while compiling `source` that are still in use while
+    the module is.
+    """
+
+    gc.collect()
+    tracemalloc.start()
+    block, _ = compile(source, share_blocks)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del block
+    return size
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = program(functions)
+
+    _, codegen = compile(source, True)
+    distinct = len(codegen.distinct_blocks)
+    print(f"{codegen.function_count} function literals, {distinct} distinct blocks "
+          f"(dedup ratio {codegen.function_count / distinct:.2f})")
+
+    for share_blocks in (False, True):
+        block, _ = compile(source, share_blocks)
+        label = "shared" if share_blocks else "separate"
+        print(f"{label.ljust(10)} {retained(source, share_blocks) / 1024:>10.0f} KiB retained "
+              f"{len(dump_module(block)):>10} bytes serialized "
+              f"{len(dump_module(block, pooled=True)):>10} bytes pooled")
+
+if __name__ == "__main__":
+    main()
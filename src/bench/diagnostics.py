@@ -0,0 +1,66 @@
+"""
+Error reporting on a large file with many syntax errors.
+
+Checks that a single lex and parse reports every error, and compares
+line/column lookup through `LineIndex` with rescanning the source for
+each diagnostic.
+
+    python -m bench.diagnostics [functions]
+"""
+import sys
+
+from lex.lexer import Lexer
+from lex.diagnostic import LineIndex
+from parse.parser import Parser
+from bench.common import time_best_of, report
+
+def broken_program(functions: int) -> str:
+    chunks = []
+    for i in range(functions):
+        # every fourth function has a syntax error, every tenth a lex error
+        broken = " +" if i % 4 == 0 else ""
+        stray = " $" if i % 10 == 0 else ""
+        chunks.append(
+            f"let f{i} = |a, b|:\n"
+            f"    let c = a *{broken} b{stray}\n"
+            f"    if c > {i}: c - 1 else: c + 1 end\n"
+            f"end\n"
+        )
+    return "".join(chunks)
+
+def rescan_line_col(source: str, offset: int) -> tuple[int, int]:
+    line = source.count('\n', 0, offset) + 1
+    return (line, offset - (source.rfind('\n', 0, offset) + 1) + 1)
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    source = broken_program(functions)
+
+    lexer = Lexer(source)
+    parser = Parser(lexer.lex(), lexer.line_index)
+    parser.parse_program()
+
+    expected = sum(1 for i in range(functions) if i % 4 == 0) \
+        + sum(1 for i in range(functions) if i % 10 == 0)
+    reported = len(lexer.diagnostics) + len(parser.diagnostics)
+    print(f"{len(source)} bytes, {functions} functions: "
+          f"{reported} errors reported in one pass (expected {expected})")
+
+    def compile_once():
+        lexer = Lexer(source)
+        Parser(lexer.lex(), lexer.line_index).parse_program()
+
+    report("lex + parse with recovery", time_best_of(compile_once, 3))
+
+    offsets = [d.position[0] for d in lexer.diagnostics + parser.diagnostics]
+    index = LineIndex(source)
+    assert all(index.line_col(o) == rescan_line_col(source, o) for o in offsets)
+
+    rescan_ns = time_best_of(lambda: [rescan_line_col(source, o) for o in offsets])
+    build_ns = time_best_of(lambda: LineIndex(source))
+    indexed_ns = time_best_of(lambda: [index.line_col(o) for o in offsets])
+    report("line lookup, rescan source", rescan_ns)
+    report("line lookup, LineIndex (incl. build)", build_ns + indexed_ns, rescan_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Calls to small helper functions, with inlining off and at a few size
+budgets. Prints how many call instructions each budget leaves, then
+times them on the bytecode tiers; the Python tier translates calls as
+they are written, so inlining doesn't change it. `print` discards its
+output.
+
+    python -m bench.inline [n]
+"""
+import sys
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+budgets = [None, 4, 8, 16, 32]
+
+def program(n: int) -> str:
+    return f"""
+let square = |x|: x * x end
+let add = |a, b|: a + b end
+let clamp = |x, low, high|:
+    if x < low: low
+    elif x > high: high
+    else: x
+    end
+end
+let norm = |x, y|: add(square(x), square(y)) end
+let sum = |i, acc|:
+    if i < 1: acc
+    else: sum(i - 1, add(acc, clamp(norm(i, i - 1), 0, 5000)))
+    end
+end
+print(sum({n}, 0))
+"""
+
+def call_count(block: Block) -> int:
+    count = sum(1 for _, name, _ in block.instructions() if name == "CALL" or name == "TAIL_CALL")
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            count += call_count(const.block)
+    return count
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    quiet = {**builtins, "print": lambda value: None}
+    source = program(n)
+    blocks = [compile_source(source, inline_budget=budget) for budget in budgets]
+
+    for budget, block in zip(budgets, blocks):
+        print(f"budget {str(budget).ljust(6)} {call_count(block):>4} call instructions")
+
+    times = time_interleaved([
+        lambda block=block: VM(quiet, transpile_threshold=None).run_module(block)
+        for block in blocks
+    ], repeat=10)
+    for budget, ns in zip(budgets, times):
+        report(f"budget {budget}", ns, times[0] if budget is not None else None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Startup of a large module that only calls a few of its functions, with
+function bodies compiled up front and with them compiled on first call.
+Times compiling alone and compiling and running the module. `print`
+discards its output.
+
+    python -m bench.lazy [functions] [every]
+"""
+import sys
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+def program(functions: int, every: int) -> str:
+    """
+    `functions` functions of a few statements each, every `every`th of
+    which is called once.
+    """
+
+    lines = []
+    for i in range(functions):
+        lines.append(f"let f{i} = |a, b|:")
+        lines.append(f"    let var c = a * {i} + b")
+        lines.append(f"    c = if c > {i}: c - a / 2 elif c < 0: -c else: c + 1 end")
+        lines.append(f"    let d = |x|: x * c + {i} end")
+        lines.append(f"    d(a) + d(b) - c")
+        lines.append(f"end")
+    for i in range(0, functions, every):
+        lines.append(f"print(f{i}({i}, 3))")
+    return "\n".join(lines) + "\n"
+
+def generated_count(block: Block) -> int:
+    """
+    The number of function blocks under `block` whose bodies have been
+    generated.
+    """
+
+    count = 0
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst) and const.block.pending is None:
+            count += 1 + generated_count(const.block)
+    return count
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    every = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    quiet = {**builtins, "print": lambda value: None}
+    source = program(functions, every)
+
+    def start(lazy: bool) -> Block:
+        block = compile_source(source, lazy_functions=lazy)
+        VM(quiet).run_module(block)
+        return block
+
+    for lazy in (False, True):
+        print(f"lazy {str(lazy).ljust(6)} {generated_count(start(lazy)):>6} function bodies generated")
+
+    eager_ns, lazy_ns = time_interleaved([
+        lambda: compile_source(source),
+        lambda: compile_source(source, lazy_functions=True),
+    ], repeat=3)
+    report("compile, eager", eager_ns)
+    report("compile, lazy", lazy_ns, eager_ns)
+
+    eager_ns, lazy_ns = time_interleaved([lambda: start(False), lambda: start(True)], repeat=3)
+    report("compile and run, eager", eager_ns)
+    report("compile and run, lazy", lazy_ns, eager_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cost of building location tables during code generation, of converting
+them to lines and columns when the module is serialized, and their size
+in the serialized module.
+
+    python -m bench.locations [statements]
+"""
+import sys
+from time import perf_counter_ns
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from process.binding import Resolver
+from codegen.codegen import Codegen
+from codegen.module import dump_module
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+def large_program(statements: int) -> str:
+    lines = ["let v0 = 1"]
+    for i in range(1, statements):
+        if i % 5 == 0:
+            lines.append(f"if v{i - 1} > {i}:\n    print(v{i - 1} * 2)\nelse:\n    print(-v{i // 2})\nend")
+        lines.append(f"let v{i} = v{i - 1} + {i} * v{i // 2} - 3")
+    return "\n".join(lines)
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    lexer = Lexer(large_program(statements))
+    parser = Parser(lexer.lex(), lexer.line_index)
+    root = parser.parse_program()
+    assert not lexer.diagnostics and not parser.diagnostics
+    resolver = Resolver(root, builtins.keys())
+    resolver.resolve()
+
+    def compile(line_index):
+        return Codegen(resolver, line_index).compile_program(root, resolver)
+
+    block = compile(lexer.line_index)
+    print(f"{statements} statements, {len(block.body)} bytes of bytecode, "
+          f"{len(block.locations)} location entries")
+
+    without_ns, with_ns = time_interleaved(
+        [lambda: compile(None), lambda: compile(lexer.line_index)], repeat=30)
+    report("codegen without locations", without_ns)
+    report("codegen with locations", with_ns)
+    print(f"overhead: {(with_ns - without_ns) / without_ns * 100:.1f}%")
+
+    def convert():
+        block = compile(lexer.line_index)
+        start = perf_counter_ns()
+        len(block.locations)
+        return perf_counter_ns() - start
+
+    report("conversion for serializing", min(convert() for _ in range(10)))
+
+    stripped, full = dump_module(block, strip_locations=True), dump_module(block)
+    print(f"module size: {len(stripped)} bytes stripped, {len(full)} bytes with locations "
+          f"({len(block.locations.encode()) / len(block.locations):.2f} bytes/entry)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Compiling one very large module with every function generated in this
+process and with module-level functions generated by a few worker
+processes. Checks that both produce the same serialized module first.
+Parsing, resolving and type inference stay serial, and workers only pay
+off with as many free cores.
+
+    python -m bench.parallel [functions] [workers...]
+"""
+import sys
+import os
+
+from codegen.module import dump_module
+from compiler import compile_source
+from bench.common import time_interleaved, report
+from bench.lazy import program
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = [int(arg) for arg in sys.argv[2:]] or [2, 4]
+    source = program(functions, 20)
+
+    print(f"{os.cpu_count()} cores")
+    serial = dump_module(compile_source(source), pooled=True)
+    for count in workers:
+        same = dump_module(compile_source(source, workers=count), pooled=True) == serial
+        print(f"workers {str(count).ljust(4)} {'identical' if same else 'DIFFERENT'} module")
+
+    times = time_interleaved(
+        [lambda: compile_source(source)]
+        + [lambda count=count: compile_source(source, workers=count) for count in workers],
+        repeat=3)
+    report("compile, serial", times[0])
+    for count, ns in zip(workers, times[1:]):
+        report(f"compile, {count} workers", ns, times[0])
+
+if __name__ == "__main__":
+    main()
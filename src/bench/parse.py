@@ -0,0 +1,66 @@
+"""
+Memory held by the syntax trees the parser builds, over a corpus of SPY
+sources: the bytes and the number of allocations still live once each
+tree is built, per token. The tokens themselves are made before measuring
+and not counted.
+
+With no paths, the corpus is the programs from `bench.tiers` and the
+generated program from `bench.arena`.
+
+    python -m bench.parse [PATH...]
+"""
+import sys
+import tracemalloc
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from vm.stats import module_paths
+from bench.arena import generated_program
+from bench.tiers import programs
+
+def measure(source: str) -> tuple[int, int, int]:
+    """
+    Parses `source` and returns its token count and the bytes and
+    allocations its tree holds.
+    """
+
+    lexer = Lexer(source)
+    tokens = lexer.lex()
+    parser = Parser(tokens, lexer.line_index)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tree = parser.parse_program()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    # leave out what taking the snapshots allocated
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    differences = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), "filename")
+    size = sum(difference.size_diff for difference in differences)
+    count = sum(difference.count_diff for difference in differences)
+    del tree
+    return len(tokens), size, count
+
+def main():
+    if len(sys.argv) > 1:
+        corpus = {}
+        for path in module_paths(sys.argv[1:]):
+            if path.endswith(".spy"):
+                with open(path) as file:
+                    corpus[path] = file.read()
+    else:
+        corpus = {**programs(20), "generated": generated_program(1000)}
+
+    total_tokens = total_size = total_count = 0
+    for label, source in corpus.items():
+        tokens, size, count = measure(source)
+        total_tokens += tokens
+        total_size += size
+        total_count += count
+        print(f"{label.ljust(30)} {tokens:>8} tokens {size:>10} bytes {count:>8} allocations")
+    print(f"{'total'.ljust(30)} {total_tokens:>8} tokens {total_size:>10} bytes {total_count:>8} allocations")
+    print(f"per token: {total_size / total_tokens:.1f} bytes, {total_count / total_tokens:.2f} allocations")
+
+if __name__ == "__main__":
+    main()
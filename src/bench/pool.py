@@ -0,0 +1,85 @@
+"""
+Size and load time of serialized modules with every block keeping its
+own names and constants, and with one pool shared by the whole module.
+Loading is timed on its own and together with creating the VM's runtime
+form of every block, which is when constants are materialized. Both
+loads build large object graphs, so the cyclic garbage collector is off
+while they are timed, as `timeit` does, or its pauses land on whichever
+run happens to trigger them.
+
+The corpus is the generated programs from `bench.arena` and `bench.lazy`
+and one whose functions share their strings and numbers, or the given
+SPY sources.
+
+    python -m bench.pool [PATH...]
+"""
+import sys
+import gc
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.module import dump_module, load_module
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.stats import module_paths
+from bench.common import time_interleaved, report
+from bench.arena import generated_program
+from bench.lazy import program
+
+def shared_program(functions: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines.append(f"let f{i} = |a, b|:")
+        lines.append('    let unit = " items"')
+        lines.append('    if a > 100: print("large batch of " + unit)')
+        lines.append('    elif a < 0: print("negative count of " + unit)')
+        lines.append('    else: print("small batch of " + unit)')
+        lines.append(f"    end")
+        lines.append(f"    a * 1000 + b * 60 - 1")
+        lines.append(f"end")
+    return "\n".join(lines) + "\n"
+
+def const_count(block: Block) -> int:
+    count = len(block.consts)
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            count += const_count(const.block) - 1
+    return count
+
+def load_code(data: bytes):
+    VM().code_for(load_module(data))
+
+def main():
+    if len(sys.argv) > 1:
+        corpus = {}
+        for path in module_paths(sys.argv[1:]):
+            if path.endswith(".spy"):
+                with open(path) as file:
+                    corpus[path] = file.read()
+    else:
+        corpus = {
+            "arena 2000": generated_program(2000),
+            "lazy 2000": program(2000, 20),
+            "shared 2000": shared_program(2000),
+        }
+
+    for label, source in corpus.items():
+        block = compile_source(source)
+        separate, pooled = dump_module(block), dump_module(block, pooled=True)
+        print(f"{label}: {const_count(block)} constants, "
+              f"{len(separate)} bytes per block, {len(pooled)} bytes pooled "
+              f"({len(pooled) / len(separate):.0%})")
+
+        gc.collect()
+        gc.disable()
+
+        separate_ns, pooled_ns = time_interleaved([lambda: load_module(separate), lambda: load_module(pooled)], repeat=10)
+        report(f"{label} load, per block", separate_ns)
+        report(f"{label} load, pooled", pooled_ns, separate_ns)
+        separate_ns, pooled_ns = time_interleaved([lambda: load_code(separate), lambda: load_code(pooled)], repeat=10)
+        report(f"{label} load and materialize, per block", separate_ns)
+        report(f"{label} load and materialize, pooled", pooled_ns, separate_ns)
+        gc.enable()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Parsing an expression-heavy program with the table-driven Pratt core
+against the chains of comparisons it replaced, which looked each
+operator's precedence up through `if` chains and checked it with
+`get_args` every time.
+
+    python -m bench.pratt [lines]
+"""
+import sys
+from typing import get_args, cast
+
+from lex.lexer import Lexer
+from lex.token import *
+from parse.parser import Parser, ParseError
+from parse.parsenode import *
+from bench.common import time_interleaved, report
+
+class ChainedParser(Parser):
+    @staticmethod
+    def get_prefix_precedence(token: Token):
+        if token.type == 'minus' or token.type == 'plus':
+            return Parser.unary_power(Parser.precedence_unary_minus)
+        if token.type == 'bang':
+            return Parser.unary_power(Parser.precedence_not)
+        else: return 0
+
+    @staticmethod
+    def get_postfix_precedence(token: Token):
+        if token.type == 'lbracket' or token.type == 'lparen':
+            return Parser.unary_power(Parser.precedence_index_call)
+        return 0
+
+    @staticmethod
+    def get_binary_precedence(token: Token):
+        if token.type == "asterisk" or token.type == "slash":
+            return Parser.binary_left_associative_powers(Parser.precedence_multiplicative)
+        elif token.type == "plus" or token.type == "minus":
+            return Parser.binary_left_associative_powers(Parser.precedence_additive)
+        elif token.type == "period":
+            return Parser.binary_left_associative_powers(Parser.precedence_index_call)
+        elif token.type in {'less', 'greater', 'lessequals', 'greaterequals', 'equalsequals', 'bangequals'}:
+            return Parser.binary_left_associative_powers(Parser.precedence_comparison)
+        elif token.type == "equals":
+            return Parser.binary_left_associative_powers(Parser.precedence_assignment)
+        else:
+            return (0, 0)
+
+    def peek(self):
+        if self.pos < len(self.tokens) - 1:
+            return self.tokens[self.pos]
+        else:
+            return self.tokens[-1]
+
+    def peek_is(self, type: TokenType, value: str | None = None):
+        peeked = self.peek()
+        if peeked.type != type:
+            return False
+        elif value is not None and peeked.content != value:
+            return False
+        else:
+            return True
+
+    def parse_expression(self, min_bp: int = 0) -> Expression:
+        if self.peek_is('keyword', Keyword_if):
+            return self.parse_if_else_expression()
+        elif self.peek_is('keyword', Keyword_loop):
+            return self.parse_loop_expression()
+        elif self.peek_is('keyword', Keyword_break):
+            return self.parse_break_expression()
+        elif self.peek_is('keyword', Keyword_continue):
+            return self.parse_continue_expression()
+
+        pre_bp = self.get_prefix_precedence(self.peek())
+
+        if pre_bp != 0 and pre_bp > min_bp:
+            op = self.consume()
+            if self.peek().whitespace_before:
+                raise ParseError("while parsing prefix operator: unexpected whitespace", self.peek())
+            if op.type not in get_args(PrefixOperator):
+                raise ParseError(f"while parsing prefix operator: invalid operator {op.content}", op)
+            op = cast(PrefixOperator, op.type)
+            left = PrefixExpressionNode(self.parse_expression(pre_bp), op)
+        else:
+            left = self.parse_atomic_expression()
+
+        while True:
+            post_bp = self.get_postfix_precedence(self.peek())
+            if post_bp == 0 or post_bp < min_bp:
+                break
+            op = self.consume()
+            if op.type == 'lparen':
+                args = self.parse_argument_list()
+                self.expect('rparen')
+                left = CallExpressionNode(left, args)
+            else:
+                expr = self.parse_expression()
+                self.expect('rbracket')
+                left = IndexExpressionNode(left, expr)
+
+        while True:
+            (left_bp, right_bp) = self.get_binary_precedence(self.peek())
+            if self.peek().whitespace_before != self.peek().whitespace_after:
+                left_bp, right_bp = 0, 0
+            if left_bp == 0 or left_bp < min_bp:
+                break
+            op = self.consume()
+            right = self.parse_expression(right_bp)
+            if op.type == 'equals':
+                if not isinstance(left, IdentifierExpressionNode):
+                    raise ParseError("left side of assignment must be identifier", op)
+                left = AssignmentExpressionNode(left, right)
+            elif op.type not in get_args(BinaryOperator):
+                raise ParseError(f"while parsing binary operator: invalid operator {op.content}", op)
+            else:
+                left = BinaryExpressionNode(left, right, cast(BinaryOperator, op.type))
+
+        return left
+
+def expression_program(lines: int) -> str:
+    return "".join(
+        f"let v{i} = a * {i} + b / 2 - -c * d(e, {i}) <= f + g * h - {i} * i / j\n"
+        for i in range(lines))
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tokens = Lexer(expression_program(lines)).lex()
+
+    def parse(cls: type[Parser]):
+        return cls(tokens).parse_program()
+
+    assert parse(Parser) == parse(ChainedParser)
+
+    print(f"{lines} lines, {len(tokens)} tokens")
+    chained_ns, table_ns = time_interleaved([
+        lambda: parse(ChainedParser),
+        lambda: parse(Parser),
+    ])
+    report("precedence chains", chained_ns)
+    report("binding power tables", table_ns, chained_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+The byte-decoding interpreter with and without quickening, on the
+`bench.tiers` programs with the other tiers turned off so every call
+decodes bytecode. Quickening specializes the operations whose operand
+types type inference can't work out, so each program is compiled without
+inference first, as if all its functions escaped, and then with it. Also
+prints how the specialized instructions fared. `print` discards its
+output.
+
+    python -m bench.quicken [n]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+from bench.tiers import programs
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    quiet = {**builtins, "print": lambda value: None}
+
+    def run(block, **options):
+        vm = VM(quiet, tier_up_threshold=None, transpile_threshold=None, **options)
+        vm.run_module(block)
+        return vm
+
+    for label, source in programs(n).items():
+        for infer_types in (False, True):
+            block = compile_source(source, infer_types=infer_types)
+            typed = "typed" if infer_types else "untyped"
+            generic_ns, quickened_ns = time_interleaved([
+                lambda: run(block, quicken_threshold=None),
+                lambda: run(block),
+            ], repeat=10)
+            report(f"{label} {typed} generic", generic_ns)
+            report(f"{label} {typed} quickened", quickened_ns, generic_ns)
+            for name, counts in run(block, count_quickening_hits=True).quickening.summary().items():
+                print(f"    {name.ljust(20)} " + "  ".join(f"{key} {value}" for key, value in counts.items()))
+
+if __name__ == "__main__":
+    main()
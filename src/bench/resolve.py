@@ -0,0 +1,94 @@
+"""
+Name resolution over deeply nested `if` blocks.
+
+Compares the flat name-to-binding-stack resolver against a resolver that
+walks the scope chain for every reference, which is what `Resolver` used
+to do.
+
+    python -m bench.resolve [depth]
+"""
+import sys
+from typing import Collection, Literal
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from parse.parsenode import *
+from process.binding import Resolver, Scope, BindingInfo, DeclarationSite
+from bench.common import time_best_of, report
+
+class ScopeChainResolver(Resolver):
+    """
+    Resolves identifiers the way `Resolver` did before the flat binding
+    stacks: every scope has its own dict of the names declared in it, and
+    each reference checks them from the inside out, costing O(depth).
+    Everything else is `Resolver`'s, including the flat stacks, which it
+    keeps up to date but never reads, so the two differ only in how names
+    are looked up.
+    """
+    # the names declared in each of `scopes`, in the same order
+    scope_names: list[dict[str, BindingInfo]]
+
+    def __init__(self, root: ProgramNode, builtins: Collection[str] = ()):
+        super().__init__(root, builtins)
+        self.scope_names = []
+
+    def _push_scope(self, scope: Scope):
+        super()._push_scope(scope)
+        self.scope_names.append({})
+
+    def _pop_scope(self):
+        super()._pop_scope()
+        self.scope_names.pop()
+
+    def _declare(self, name: str, decl: DeclarationSite, type: Literal['parameter'] | None = None):
+        super()._declare(name, decl, type)
+        self.scope_names[-1][name] = self._declarations[-1]
+
+    def _resolve(self, node: Node):
+        if isinstance(node, IdentifierExpressionNode):
+            name = node.token.content
+            for names in reversed(self.scope_names):
+                if name in names:
+                    info = names[name]
+                    break
+            else:
+                if name in self.builtins:
+                    return
+                raise NameError(f"Name {name} cannot be resolved.")
+
+            self.bindings[node] = info
+            if info.function is not None and info.function is not self.scopes[-1].parent:
+                self._capture(name, info)
+        else:
+            super()._resolve(node)
+
+def nested_if_program(depth: int) -> str:
+    lines = ["let x = 1"]
+    for i in range(depth):
+        lines.append(f"if x > {i}:")
+    lines.append("x")
+    lines.extend("end" for _ in range(depth))
+    return "\n".join(lines)
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), depth * 10))
+
+    root = Parser(Lexer(nested_if_program(depth)).lex()).parse_program()
+
+    def run(cls: type[Resolver]):
+        resolver = cls(root)
+        resolver.resolve()
+        return resolver
+
+    flat, chain = run(Resolver), run(ScopeChainResolver)
+    assert flat.bindings == chain.bindings
+
+    print(f"{depth}-deep nested if, {len(flat.bindings)} references")
+    chain_ns = time_best_of(lambda: run(ScopeChainResolver))
+    flat_ns = time_best_of(lambda: run(Resolver))
+    report("scope chain walk", chain_ns)
+    report("flat binding stacks", flat_ns, chain_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Short-circuit `and`/`or` against evaluating both operands, as AND and OR
+used to, on conditions whose right-hand side is an expensive call that
+the left-hand side usually makes unnecessary. Both run on the bytecode
+tiers; the Python tier short-circuits either way. `print` discards its
+output.
+
+    python -m bench.shortcircuit [n]
+"""
+import sys
+
+from lex.lexer import Lexer
+from parse.parser import Parser
+from parse.parsenode import *
+from process.binding import Resolver
+from codegen.codegen import Codegen
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+class EagerCodegen(Codegen):
+    """
+    Evaluates both operands of `and`/`or` and combines them with AND/OR,
+    in conditions too.
+    """
+
+    def _generate_bytecode(self, node: Node):
+        if isinstance(node, BinaryExpressionNode) and (node.operator == 'and' or node.operator == 'or'):
+            block = self.blocks[-1]
+            self._generate_bytecode(node.left)
+            self._generate_bytecode(node.right)
+            if node.operator == 'and':
+                block.emit_and()
+            else:
+                block.emit_or()
+        else:
+            super()._generate_bytecode(node)
+
+    def _generate_condition(self, node: Node, jump_if: bool) -> list[int]:
+        block = self.blocks[-1]
+        self._generate_bytecode(node)
+        if jump_if:
+            block.emit_jump_forward_true(0)
+        else:
+            block.emit_jump_forward_false(0)
+        return [len(block.body) - 2]
+
+def program(n: int) -> str:
+    return f"""
+let slow = |k|:
+    if k < 1: true
+    else: slow(k - 1)
+    end
+end
+let count = |i, found|:
+    if i < 1: found
+    elif i < 4 and slow(50): count(i - 1, found + 1)
+    else: count(i - 1, found)
+    end
+end
+let any = |i, found|:
+    if i < 1: found
+    else: any(i - 1, found + if i > 0 or slow(50): 1 else: 0 end)
+    end
+end
+print(count({n}, 0))
+print(any({n}, 0))
+"""
+
+def compile_with(cls: type[Codegen], source: str):
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = Resolver(root, builtins.keys())
+    resolver.resolve()
+    return cls(resolver, lexer.line_index).compile_program(root, resolver)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    quiet = {**builtins, "print": lambda value: None}
+    source = program(n)
+    eager = compile_with(EagerCodegen, source)
+    short = compile_with(Codegen, source)
+
+    eager_ns, short_ns = time_interleaved([
+        lambda: VM(quiet, transpile_threshold=None).run_module(eager),
+        lambda: VM(quiet, transpile_threshold=None).run_module(short),
+    ], repeat=5)
+    report("both operands evaluated", eager_ns)
+    report("short-circuit jumps", short_ns, eager_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Tail calls against plain calls for recursion written as loops. Depth is
+kept under the VM's call depth limit so that both can run.
+
+    python -m bench.tailcalls [depth]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from bench.common import time_interleaved, report
+
+def program(depth: int) -> str:
+    return f"""
+let sum = |n, total|:
+    if n < 1: total
+    else: sum(n - 1, total + n)
+    end
+end
+let repeat = |times|:
+    if times > 0:
+        sum({depth}, 0)
+        repeat(times - 1)
+    end
+end
+repeat(20)
+"""
+
+def deepest(block) -> int:
+    depth = 0
+    def tracer(frames, pc):
+        nonlocal depth
+        depth = max(depth, len(frames))
+    vm = VM()
+    vm.tracer = tracer
+    vm.run_module(block)
+    return depth
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    plain = compile_source(program(depth), tail_calls=False)
+    tail = compile_source(program(depth), tail_calls=True)
+    print(f"deepest frame stack: {deepest(plain)} with CALL, {deepest(tail)} with TAIL_CALL")
+
+    plain_ns, tail_ns = time_interleaved(
+        [lambda: VM().run_module(plain), lambda: VM().run_module(tail)], repeat=5)
+    report("recursion with CALL", plain_ns)
+    report("recursion with TAIL_CALL", tail_ns, plain_ns)
+
+if __name__ == "__main__":
+    main()
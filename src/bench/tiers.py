@@ -0,0 +1,82 @@
+"""
+The threaded tier against the byte-decoding interpreter on the README
+examples. The language doesn't have loops, `%` or `return` yet, so the
+examples are written with recursion and a `mod` function instead.
+The Python tier is off for both, since hot functions would otherwise
+leave the threaded tier for it. `print` discards its output.
+
+    python -m bench.tiers [n]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+
+def programs(n: int) -> dict[str, str]:
+    mod = """
+let mod = |n, d|: n - n / d * d end
+"""
+    return {
+        "is_prime": mod + f"""
+let is_prime = |n|:
+    let check = |i|:
+        if i * i > n: true
+        elif mod(n, i) < 1: false
+        else: check(i + 2)
+        end
+    end
+    if n < 3: n > 1
+    elif mod(n, 2) < 1: false
+    else: check(3)
+    end
+end
+let count_primes = |i, found|:
+    if i < 2: found
+    elif is_prime(i): count_primes(i - 1, found + 1)
+    else: count_primes(i - 1, found)
+    end
+end
+print(count_primes({n * 100}, 0))
+""",
+        "fizzbuzz": mod + f"""
+let fizzbuzz = |i|:
+    if i > 0:
+        print(
+            if mod(i, 15) < 1: "FizzBuzz"
+            elif mod(i, 3) < 1: "Fizz"
+            elif mod(i, 5) < 1: "Buzz"
+            else: i
+            end
+        )
+        fizzbuzz(i - 1)
+    end
+end
+fizzbuzz({n * 100})
+""",
+        "fib": f"""
+let fib = |n|:
+    if n < 2: n
+    else: fib(n - 1) + fib(n - 2)
+    end
+end
+print(fib({n}))
+""",
+    }
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    quiet = {**builtins, "print": lambda value: None}
+
+    for label, source in programs(n).items():
+        block = compile_source(source)
+        bytecode_ns, threaded_ns = time_interleaved([
+            lambda: VM(quiet, tier_up_threshold=None, transpile_threshold=None).run_module(block),
+            lambda: VM(quiet, transpile_threshold=None).run_module(block),
+        ], repeat=5)
+        report(f"{label} decoding bytecode", bytecode_ns)
+        report(f"{label} with the threaded tier", threaded_ns, bytecode_ns)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+The Python tier against the threaded tier, on the programs from
+`bench.tiers`. `print` discards its output.
+
+    python -m bench.transpile [n]
+"""
+import sys
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from bench.common import time_interleaved, report
+from bench.tiers import programs
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    quiet = {**builtins, "print": lambda value: None}
+
+    for label, source in programs(n).items():
+        block = compile_source(source)
+        threaded_ns, native_ns = time_interleaved([
+            lambda: VM(quiet, transpile_threshold=None).run_module(block),
+            lambda: VM(quiet).run_module(block),
+        ], repeat=5)
+        report(f"{label} with the threaded tier", threaded_ns)
+        report(f"{label} translated to Python", native_ns, threaded_ns)
+
+if __name__ == "__main__":
+    main()
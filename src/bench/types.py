@@ -0,0 +1,113 @@
+"""
+How much of a corpus of SPY sources type inference can type: of the
+arithmetic and comparison operators in each program, how many have
+operands of a known type, and how many of those were emitted as typed
+instructions (division never is). Then the `bench.tiers` programs with
+and without typed instructions, decoding bytecode only.
+
+With no paths, the corpus is the programs from `bench.tiers` and the
+generated program from `bench.arena`.
+
+    python -m bench.types [PATH...]
+"""
+import sys
+from dataclasses import fields, is_dataclass
+
+from lex.lexer import Lexer
+from lex.token import Token
+from parse.parser import Parser
+from parse.parsenode import *
+from process.binding import Resolver
+from process.types import TypeInference
+from codegen.codegen import Codegen
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.instructions import typed_instructions
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from vm.stats import module_paths
+from bench.common import time_interleaved, report
+from bench.arena import generated_program
+from bench.tiers import programs
+
+_typed_names = {typed for forms in typed_instructions.values() for typed in forms.values()}
+
+def operators(node: object) -> list[BinaryExpressionNode]:
+    """
+    The arithmetic and comparison operators under `node`.
+    """
+
+    found = []
+    if isinstance(node, BinaryExpressionNode) and node.operator != 'and' and node.operator != 'or':
+        found.append(node)
+    if is_dataclass(node) and not isinstance(node, Token):
+        for field in fields(node):
+            found.extend(operators(getattr(node, field.name)))
+    elif isinstance(node, (tuple, list)):
+        for value in node:
+            found.extend(operators(value))
+    return found
+
+def typed_instruction_count(block: Block) -> int:
+    count = sum(1 for _, name, _ in block.instructions() if name in _typed_names)
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            count += typed_instruction_count(const.block)
+    return count
+
+def measure(source: str) -> tuple[int, int, int]:
+    """
+    Compiles `source` and returns its number of operators, how many of them
+    have typed operands and how many typed instructions were emitted.
+    """
+
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = Resolver(root, builtins.keys())
+    resolver.resolve()
+    types = TypeInference(resolver)
+    types.infer()
+    block = Codegen(resolver, types=types).compile_program(root, resolver)
+
+    nodes = operators(root)
+    typed = sum(1 for node in nodes if types.operand_type(node) is not None)
+    return len(nodes), typed, typed_instruction_count(block)
+
+def main():
+    if len(sys.argv) > 1:
+        corpus = {}
+        for path in module_paths(sys.argv[1:]):
+            if path.endswith(".spy"):
+                with open(path) as file:
+                    corpus[path] = file.read()
+    else:
+        corpus = {**programs(20), "generated": generated_program(1000)}
+
+    total = total_typed = total_emitted = 0
+    for label, source in corpus.items():
+        count, typed, emitted = measure(source)
+        total += count
+        total_typed += typed
+        total_emitted += emitted
+        print(f"{label.ljust(30)} {count:>8} operators {typed:>8} typed {emitted:>8} typed instructions")
+    print(f"{'total'.ljust(30)} {total:>8} operators {total_typed:>8} typed {total_emitted:>8} typed instructions")
+    if total:
+        print(f"typed: {total_typed / total:.1%} of operators, emitted typed: {total_emitted / total:.1%}")
+
+    if len(sys.argv) > 1:
+        return
+    print()
+    quiet = {**builtins, "print": lambda value: None}
+    for label, source in programs(20).items():
+        generic = compile_source(source, infer_types=False)
+        typed = compile_source(source)
+        generic_ns, typed_ns = time_interleaved([
+            lambda: VM(quiet, tier_up_threshold=None, transpile_threshold=None).run_module(generic),
+            lambda: VM(quiet, tier_up_threshold=None, transpile_threshold=None).run_module(typed),
+        ], repeat=10)
+        report(f"{label} generic instructions", generic_ns)
+        report(f"{label} typed instructions", typed_ns, generic_ns)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,23 @@
-from typing import Literal
+from typing import Callable, Iterator, Literal, TYPE_CHECKING
 
 import codegen.writer as writer
 from codegen.reader import Reader
-from codegen.consts import Const, FunctionLiteralConst
-from codegen.instructions import instruction_values, instruction_names
+from codegen.consts import Const, FunctionLiteralConst, const_key
+from codegen.instructions import instruction_values, instruction_names, instruction_operand_sizes
+from codegen.locations import LocationTable
+
+if TYPE_CHECKING:
+    from parse.parsenode import Expression, FunctionLiteralExpressionNode
+
+def read_instruction(reader: Reader) -> tuple[str, int | None]:
+    """
+    Reads one instruction, returning its name and operand (or None if it
+    takes none).
+    """
+
+    name = instruction_names[reader.read_uint8()]
+    arg = reader.read_uint16() if name in instruction_operand_sizes else None
+    return name, arg
 
 class Block():
     """
@@ -15,12 +29,27 @@ class Block():
     names: list[str]
     body: bytearray
     context: Literal['function', 'module']
+    name: str
+    argument_count: int
+    max_stack_depth: int
 
     consts: list[Const]
+    locations: LocationTable | None
+    node: 'FunctionLiteralExpressionNode | None'
 
-    def __init__(self, context: Literal['function', 'module']):
+    def __init__(self, context: Literal['function', 'module'], name: str = "<module>"):
         self.context = context
 
+        # Name the block was bound to, for debugging and profiling
+        self.name = name
+
+        # Number of parameters; arguments are passed in the first locals
+        self.argument_count = 0
+
+        # Most values the body ever holds on the stack at once; set by
+        # `Codegen` when the block is finished
+        self.max_stack_depth = 0
+
         # Names of global variables used within this block
         self.global_names = []
 
@@ -32,20 +61,51 @@ class Block():
 
         # Names of free variables (captured from outer scope) within this block
         self.free_names: list[str] = []
+
+        # Names of variables captured from outer scopes by value, since they
+        # never change; the closure holds them after the free variables, and
+        # they are copied into the locals right after the parameters
+        self.copied_names: list[str] = []
         self.names = []
         self.consts = []
+        # index of each const in `consts`, by `const_key`
+        self._const_indices: dict[tuple, int] = {}
         self.body = bytearray()
 
+        # Maps offsets in body back to the source, if it was generated with one
+        self.locations = None
+
+        # The function literal this block was generated from; not serialized,
+        # so None for blocks loaded from a module file
+        self.node = None
+
+        # Other function literals that generated the same block and share
+        # it (see `Codegen`); not serialized either
+        self.shared_nodes: list['FunctionLiteralExpressionNode'] = []
+
+        # The uses of immutable lets of a literal, which load the literal
+        # instead, and those lets themselves, by id, with the literal; not
+        # serialized either
+        self.constant_nodes: dict[int, 'Expression'] = {}
+
+        # Generates the body in place, for a function whose body the parser
+        # skipped, until it has; the body is just LAZY_BODY till then
+        self.pending: Callable[[], None] | None = None
+
     def get_const_index(self, const: Const) -> int:
         """
         Gets or inserts a constant into the consts list representing the given constant.
         """
 
-        try:
-            return self.consts.index(const)
-        except ValueError:
+        if len(self._const_indices) != len(self.consts):
+            # consts were added some other way, as by `load_module`
+            self._const_indices = {const_key(const): i for i, const in enumerate(self.consts)}
+        key = const_key(const)
+        index = self._const_indices.get(key)
+        if index is None:
+            index = self._const_indices[key] = len(self.consts)
             self.consts.append(const)
-            return len(self.consts) - 1
+        return index
         
     def get_local_index(self, name: str) -> int | None:
         """
@@ -63,7 +123,7 @@ class Block():
         """
 
         try:
-            return self.names.index(name)
+            return self.local_names.index(name)
         except ValueError:
             self.local_names.append(name)
             return len(self.local_names) - 1
@@ -226,6 +286,13 @@ class Block():
 
         writer.write_int_as_uint8(self.body, instruction_values["COPY_FREE_VARS"])
 
+    def emit_lazy_body(self):
+        """
+        Emit a `LAZY_BODY` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["LAZY_BODY"])
+
     def emit_make_object(self):
         """
         Emit a `MAKE_OBJECT` instruction.
@@ -275,6 +342,76 @@ class Block():
 
         writer.write_int_as_uint8(self.body, instruction_values["DIVIDE"])
 
+    def emit_int_add(self):
+        """
+        Emit an `INT_ADD` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_ADD"])
+
+    def emit_int_subtract(self):
+        """
+        Emit an `INT_SUBTRACT` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_SUBTRACT"])
+
+    def emit_int_multiply(self):
+        """
+        Emit an `INT_MULTIPLY` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_MULTIPLY"])
+
+    def emit_str_add(self):
+        """
+        Emit a `STR_ADD` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["STR_ADD"])
+
+    def emit_int_eq(self):
+        """
+        Emit an `INT_EQ` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_EQ"])
+
+    def emit_int_neq(self):
+        """
+        Emit an `INT_NEQ` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_NEQ"])
+
+    def emit_int_gt(self):
+        """
+        Emit an `INT_GT` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_GT"])
+
+    def emit_int_gteq(self):
+        """
+        Emit an `INT_GTEQ` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_GTEQ"])
+
+    def emit_int_lt(self):
+        """
+        Emit an `INT_LT` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_LT"])
+
+    def emit_int_lteq(self):
+        """
+        Emit an `INT_LTEQ` instruction.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["INT_LTEQ"])
+
     def emit_negate(self):
         """
         Emit a `NEGATE` instruction.
@@ -375,47 +512,76 @@ class Block():
 
         writer.write_int_as_uint8(self.body, instruction_values["JUMP_FORWARD_FALSE"])
         writer.write_int_as_uint16(self.body, offset)
+
+    def emit_jump_if_false_or_pop(self, offset: int):
+        """
+        Emit a `JUMP_IF_FALSE_OR_POP` instruction with the given offset.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["JUMP_IF_FALSE_OR_POP"])
+        writer.write_int_as_uint16(self.body, offset)
+
+    def emit_jump_if_true_or_pop(self, offset: int):
+        """
+        Emit a `JUMP_IF_TRUE_OR_POP` instruction with the given offset.
+        """
+
+        writer.write_int_as_uint8(self.body, instruction_values["JUMP_IF_TRUE_OR_POP"])
+        writer.write_int_as_uint16(self.body, offset)
         
-    def pretty_print(self):
+    def instructions(self) -> Iterator[tuple[int, str, int | None]]:
+        """
+        Decodes the body, yielding the offset, name and operand (or None if
+        it takes none) of each instruction.
+        """
+
         reader = Reader(self.body, debug=False)
         while reader.pos < len(self.body):
-            print(f"{reader.pos:04X}".ljust(8), end="")
-            instruction = reader.read_uint8()
-            name = instruction_names[instruction]
+            offset = reader.pos
+            name, arg = read_instruction(reader)
+            yield offset, name, arg
+
+    def pretty_print(self, hits: dict['Block', dict[int, int]] | None = None):
+        """
+        Prints a disassembly of this block and every function block in its
+        constants. With `hits` (e.g. from a profile), each instruction is
+        prefixed with the number of times it was executed.
+        """
+
+        block_hits = hits.get(self, {}) if hits is not None else None
+        for offset, name, arg in self.instructions():
+            if block_hits is not None:
+                print(str(block_hits.get(offset, 0)).rjust(10), end="  ")
+            print(f"{offset:04X}".ljust(8), end="")
             print(name.ljust(20), end=" ")
 
             if name == "LOAD_CONST" or name == "STORE_CONST":
-                arg = reader.read_uint16()
                 print(arg, end=" ")
                 print(f"({self.consts[arg]})", end="")
             if name == "LOAD_NAME" or name == "STORE_NAME":
-                arg = reader.read_uint16()
                 print(arg, end=" ")
                 print(f"({self.names[arg]})", end="")
             if name == "LOAD_LOCAL" or name == "STORE_LOCAL":
-                arg = reader.read_uint16()
                 print(arg, end=" ")
                 print(f"({self.local_names[arg]})", end="")
             if name == "LOAD_DEREF" or name == "STORE_DEREF":
-                arg = reader.read_uint16()
                 print(arg, end=" ")
                 if arg >= len(self.cell_names):
                     print(f"({self.free_names[arg - len(self.cell_names)]})", end="")
                 else:
                     print(f"({self.cell_names[arg]})", end="")
-            if name == "JUMP_FORWARD" or name == "JUMP_BACKWARD" \
-                or name == "JUMP_FORWARD_TRUE" or name == "JUMP_FORWARD_FALSE":
-                arg = reader.read_uint16()
+            if name.startswith("JUMP_") and name != "JUMP_BACKWARD":
+                print(arg, end=" ")
+                print(f"({offset + arg:04X})", end=" ")
+            elif name == "JUMP_BACKWARD":
                 print(arg, end=" ")
-                print(f"({reader.pos + arg - 3:04X})", end=" ")
-            elif name == "CALL":
-                arg = str(reader.read_uint16())
-                print(arg, end="")
-                pass
+                print(f"({offset - arg:04X})", end=" ")
+            elif name == "CALL" or name == "TAIL_CALL":
+                print(str(arg), end="")
             print()
         
         for i, const in enumerate(self.consts):
             if type(const) is FunctionLiteralConst:
                 print()
-                print(f"FUNCTION CONSTANT AT ({i})")
-                const.block.pretty_print()
+                print(f"FUNCTION CONSTANT AT ({i}): {const.block.name}")
+                const.block.pretty_print(hits)
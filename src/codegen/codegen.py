@@ -1,9 +1,19 @@
-from typing import Literal
+from typing import Callable, Literal
+from functools import partial
+from dataclasses import fields, is_dataclass
+import multiprocessing
+
+from lex.token import Token
 
 from parse.parsenode import *
 from process.binding import Resolver, DeclarationSite
+from process.types import TypeInference
+from lex.diagnostic import LineIndex
 from codegen.block import Block
 from codegen.consts import *
+from codegen.locations import LocationTable
+from codegen.stackdepth import max_stack_depth
+from codegen.instructions import instruction_values
 import codegen.writer as writer
 
 class FunctionContext:
@@ -12,24 +22,244 @@ class FunctionContext:
 class ModuleContext:
     global_slot_assignment = dict['DeclarationSite', int]
 
+def _inline_size(node: Node) -> int | None:
+    """
+    The number of nodes under `node`, or None if it has something an
+    inlined body can't: a `let`, an assignment, or a function or object
+    literal.
+    """
+
+    match node:
+        case NumberLiteralExpressionNode() | StringLiteralExpressionNode() \
+                | BoolLiteralExpressionNode() | IdentifierExpressionNode():
+            return 1
+        case BlockNode():
+            if not all(isinstance(statement, ExpressionStatementNode) for statement in node.statements):
+                return None
+            children = [statement.expr for statement in node.statements]
+        case BinaryExpressionNode():
+            children = [node.left, node.right]
+        case PrefixExpressionNode():
+            children = [node.operand]
+        case CallExpressionNode():
+            children = [node.callee, *(arg.expr for arg in node.arglist.arguments)]
+        case IndexExpressionNode():
+            children = [node.left, node.index]
+        case IfElseExpressionNode():
+            children = [child for case in node.cases for child in case if child is not None]
+        case _:
+            return None
+
+    size = 1
+    for child in children:
+        child_size = _inline_size(child)
+        if child_size is None:
+            return None
+        size += child_size
+    return size
+
+def _block_key(block: Block) -> tuple:
+    """
+    Everything about a finished function block that its behaviour depends
+    on. Nested function blocks are compared by identity, since they have
+    been shared already.
+    """
+
+    consts = tuple(const_key(const) for const in block.consts)
+    return (block.name, block.argument_count, block.max_stack_depth, bytes(block.body), consts,
+        tuple(block.global_names), tuple(block.local_names), tuple(block.cell_names),
+        tuple(block.free_names), tuple(block.copied_names), tuple(block.names))
+
+def _find_functions(
+        node: object,
+        module_functions: list[tuple[FunctionLiteralExpressionNode, str]],
+        literals: dict[int, FunctionLiteralExpressionNode],
+        name: str = "<anonymous>",
+        nested: bool = False):
+    """
+    Adds every function literal under `node` to `literals` by id, and those
+    outside of any function whose bodies were parsed to `module_functions`
+    along with the name their block gets.
+    """
+
+    if isinstance(node, FunctionLiteralExpressionNode):
+        literals[id(node)] = node
+        if not nested and isinstance(node.body, BlockNode):
+            module_functions.append((node, name))
+        _find_functions(node.body, module_functions, literals, nested=True)
+    elif isinstance(node, LetStatementNode) and isinstance(node.value, FunctionLiteralExpressionNode):
+        _find_functions(node.value, module_functions, literals, node.name.token.content, nested)
+    elif isinstance(node, (list, tuple)):
+        for child in node:
+            _find_functions(child, module_functions, literals, nested=nested)
+    elif is_dataclass(node) and not isinstance(node, Token):
+        for field in fields(node):
+            _find_functions(getattr(node, field.name), module_functions, literals, nested=nested)
+
+# The codegen and module-level functions of the module being compiled, as
+# the forked workers of `Codegen._generate_in_workers` see them
+_forked: tuple['Codegen', list[tuple[FunctionLiteralExpressionNode, str]]] | None = None
+
+def _generate_forked(indices: range) -> list[tuple[int, Block, int]]:
+    """
+    Generates the blocks of some of the module-level functions in a worker,
+    returning each with its index and how many function literals it took.
+    """
+
+    codegen, functions = _forked
+    # blocks of earlier chunks have been sent off already
+    codegen.distinct_blocks = {}
+    results = []
+    for index in indices:
+        node, name = functions[index]
+        count = codegen.function_count
+        results.append((index, codegen._generate_function_block(node, name), codegen.function_count - count))
+
+    # rather than sending the syntax tree back, blocks refer to their nodes
+    # by id, which is the same in the parent since this is a fork of it
+    seen = set()
+    for _, block, _ in results:
+        _detach_nodes(block, seen)
+    return results
+
+def _detach_nodes(block: Block, seen: set[Block]):
+    if block in seen:
+        return
+    seen.add(block)
+    block.node = id(block.node)
+    block.shared_nodes = [id(node) for node in block.shared_nodes]
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            _detach_nodes(const.block, seen)
+
+def _attach_nodes(block: Block, literals: dict[int, FunctionLiteralExpressionNode], seen: set[Block]):
+    if block in seen:
+        return
+    seen.add(block)
+    block.node = literals[block.node]
+    block.shared_nodes = [literals[node] for node in block.shared_nodes]
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            _attach_nodes(const.block, literals, seen)
+
 class Codegen():
+    """
+    Generates bytecode for a resolved program.
+
+    When given the `LineIndex` of the source, every generated `Block` also
+    gets a `LocationTable` mapping its instructions back to source lines and
+    columns. Without one no table is built.
+
+    With `tail_calls`, calls whose result a function returns directly are
+    emitted as TAIL_CALL, which runs them in the caller's frame.
+
+    Given the `TypeInference` of the program, arithmetic and comparisons
+    whose operands are known to be ints (or strings, for `+`) are emitted
+    as the typed instructions, like INT_ADD.
+
+    Inside functions, calls to a function bound by an immutable `let` that
+    captures nothing and whose body is a few expressions of at most
+    `inline_budget` nodes are inlined: the arguments are stored in fresh
+    locals and the body is generated in place of the call. Inlined bodies
+    can't declare or assign variables, or contain function or object
+    literals, and a function is never inlined into itself. None disables
+    inlining.
+
+    A function literal whose body the parser skipped gets a placeholder
+    block holding only LAZY_BODY, with `pending` set to generate the real
+    body into it; `parse_body` parses the skipped body for that. Such
+    bodies are generated without types.
+
+    With `share_blocks`, function literals that generate the same block
+    (the same name, body, constants, names and variable layout) share one
+    `Block`, which is also serialized once. The shared block keeps the
+    location table of the first of them. Bodies the parser skipped are
+    never shared. `function_count` counts the other function literals and
+    `distinct_blocks` holds the blocks they ended up with.
+
+    With more than one of `workers`, the blocks of the functions outside
+    of any other function are generated first, by that many forked worker
+    processes, and then put in place in source order, sharing blocks just
+    as generating them in place would have; the module comes out exactly
+    the same. Where processes can't be forked, everything is generated
+    in this one.
+    """
     contexts: list[FunctionContext|ModuleContext]
-    def __init__(self, resolver: Resolver):
+    line_index: LineIndex | None
+    tail_calls: bool
+    types: TypeInference | None
+    inline_budget: int | None
+
+    def __init__(
+            self,
+            resolver: Resolver,
+            line_index: LineIndex | None = None,
+            tail_calls: bool = True,
+            types: TypeInference | None = None,
+            inline_budget: int | None = 16,
+            parse_body: Callable[[LazyBodyNode], BlockNode] | None = None,
+            share_blocks: bool = True,
+            workers: int = 1):
         self.resolver = resolver
+        self.line_index = line_index
+        self.tail_calls = tail_calls
+        self.types = types
+        self.inline_budget = inline_budget
+        self.parse_body = parse_body
+        self.share_blocks = share_blocks
+        self.function_count = 0
+        self.distinct_blocks: dict[tuple, Block] = {}
+        self.workers = workers
         self.contexts = []
         self.blocks = []
+        # the functions being inlined, innermost last, with the locals
+        # their parameters are in
+        self._inlined: list[tuple[FunctionLiteralExpressionNode, dict[str, int]]] = []
+        # sizes of function bodies by id, None if they can't be inlined
+        self._inline_sizes: dict[int, int | None] = {}
+        # blocks generated by workers, with how many function literals each
+        # took, by the id of their function literal
+        self._generated: dict[int, tuple[Block, int]] = {}
 
     # TODO: future optimization: do a first pass on non-function-literals in global scope to increase number of load_global instructions
     def compile_program(self, root: ProgramNode, resolver: Resolver):
         block = Block('module')
         module = ModuleContext()
+        if self.line_index is not None:
+            block.locations = LocationTable()
 
         self.blocks = [block]
         self.contexts = [module]
+        if self.workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            self._generate_in_workers(root)
 
         for statement in root.statements:
             self._generate_bytecode(statement)
+
+        block.max_stack_depth = max_stack_depth(block)
+        if self.line_index is not None:
+            block.locations.resolve(self.line_index)
         return block
+
+    def _mark_location(self, node: Node):
+        """
+        Attributes the next instruction emitted into the current block to
+        the start of `node` in the source.
+        """
+
+        if self.line_index is not None and (token := leading_token(node)) is not None:
+            block = self.blocks[-1]
+            block.locations.add(len(block.body), token.position[0])
+
+    def _mark_token(self, token: Token):
+        """
+        Attributes the next instruction emitted into the current block to
+        the start of `token` in the source.
+        """
+
+        if self.line_index is not None:
+            block = self.blocks[-1]
+            block.locations.add(len(block.body), token.position[0])
     
     def _generate_bytecode(self, node: Node):
         context = self.contexts[-1]
@@ -40,27 +270,28 @@ class Codegen():
                 raise NotImplementedError("Not implemented for ProgramNodes; please use compile_program")
             
             case BlockNode():
+                # a block is an expression: it leaves the value of its last
+                # statement on the stack, or None if that isn't an expression
                 for statement in node.statements[:-1]:
                     self._generate_bytecode(statement)
                 
-                if isinstance(context, FunctionContext):
-                        if len(node.statements) > 0 and type(node.statements[-1]) is ExpressionStatementNode:
-                            self._generate_bytecode(node.statements[-1].expr)
-                            block.emit_return()
-                        else:
-                            if len(node.statements) > 0:
-                                self._generate_bytecode(node.statements[-1])
-                            idx = block.get_const_index(NoneConst())
-                            block.emit_load_const(idx)             
-                            block.emit_return()
+                if len(node.statements) > 0 and isinstance(node.statements[-1], ExpressionStatementNode):
+                    self._generate_bytecode(node.statements[-1].expr)
+                else:
+                    if len(node.statements) > 0:
+                        self._generate_bytecode(node.statements[-1])
+                    idx = block.get_const_index(NoneConst())
+                    block.emit_load_const(idx)             
                         
 
             case NumberLiteralExpressionNode():
-                idx = block.get_const_index(IntegerConst(node.number.token.content))
+                idx = block.get_const_index(self._literal_const(node))
+                self._mark_token(node.token)
                 block.emit_load_const(idx)
 
             case StringLiteralExpressionNode():
-                idx = block.get_const_index(StringConst(node.string.token.content))
+                idx = block.get_const_index(self._literal_const(node))
+                self._mark_token(node.token)
                 block.emit_load_const(idx)
 
             # case NoneLiteralNode():
@@ -68,10 +299,12 @@ class Codegen():
             #     block.emit_load_const(idx)
             
             case BoolLiteralExpressionNode():
-                idx = block.get_const_index(BoolConst(1 if node.bool.get_value() else 0))
+                idx = block.get_const_index(self._literal_const(node))
+                self._mark_token(node.token)
                 block.emit_load_const(idx)
 
             case ObjectLiteralExpressionNode():
+                self._mark_location(node)
                 block.emit_make_object()
 
                 for entry in node.contents:
@@ -85,6 +318,7 @@ class Codegen():
             case ObjectLiteralEntryNode():
                 self._generate_bytecode(node.name)
                 self._generate_bytecode(node.value)
+                self._mark_location(node)
                 block.emit_store_attr()
 
             case IdentifierExpressionNode():
@@ -95,17 +329,34 @@ class Codegen():
                 # - then check if it's a local var
                 # - otherwise load name
                 # TODO: load from global names
-                if context == 'module':
-                    idx = block.get_insert_name_index(node.identifier.token.content)
+                self._mark_token(node.token)
+                if (literal := self.resolver.constant_value(node)) is not None:
+                    # an immutable let of a literal. the Python tier translates
+                    # calls rather than what was inlined, so only uses in
+                    # this function are recorded for it
+                    if not self._inlined:
+                        block.constant_nodes[id(node)] = literal
+                    block.emit_load_const(block.get_const_index(self._literal_const(literal)))
+
+                elif self._inlined:
+                    # an inlined body only refers to its parameters and globals
+                    if (idx := self._inlined[-1][1].get(node.token.content)) is not None:
+                        block.emit_load_local(idx)
+                    else:
+                        idx = block.get_insert_name_index(node.token.content)
+                        block.emit_load_name(idx)
+
+                elif isinstance(context, ModuleContext):
+                    idx = block.get_insert_name_index(node.token.content)
                     block.emit_load_name(idx)
 
-                elif context == "function" or context == "expression":
-                    if (idx := block.get_deref_index(node.identifier.token.content)) != None:
+                elif isinstance(context, FunctionContext):
+                    if (idx := block.get_deref_index(node.token.content)) != None:
                         block.emit_load_deref(idx)
-                    elif (idx := block.get_local_index(node.identifier.token.content)) != None:
+                    elif (idx := block.get_local_index(node.token.content)) != None:
                         block.emit_load_local(idx)
                     else:
-                        idx = block.get_insert_name_index(node.identifier.token.content)
+                        idx = block.get_insert_name_index(node.token.content)
                         block.emit_load_name(idx)
 
                 else:
@@ -114,8 +365,13 @@ class Codegen():
             case LetStatementNode():
                 left = node.name
                 
-                if context == "function":
-                    self._generate_bytecode(node.value)
+                if isinstance(context, FunctionContext):
+                    if id(node) in self.resolver.constants:
+                        # every use loads the literal itself
+                        block.constant_nodes[id(node)] = node.value
+                        return
+                    self._generate_let_value(node)
+                    self._mark_token(left.token)
                     if (idx := block.get_deref_index(left.token.content)) != None:
                         block.emit_store_deref(idx)
                     else:
@@ -124,8 +380,9 @@ class Codegen():
                         idx = block.get_insert_local_index(left.token.content)
                         block.emit_store_local(idx)
                 
-                elif context == "module":
-                    self._generate_bytecode(node.value)
+                elif isinstance(context, ModuleContext):
+                    self._generate_let_value(node)
+                    self._mark_token(left.token)
                     idx = block.get_insert_name_index(left.token.content)
                     block.emit_store_name(idx)
 
@@ -137,6 +394,9 @@ class Codegen():
                 has_else = False
 
                 for i, (cond, body) in enumerate(node.cases):
+                    # the previous condition jumps here when it is false
+                    conditions.append(len(block.body))
+
                     if cond is None:
                         # else case
                         if i != len(node.cases) - 1:
@@ -150,110 +410,138 @@ class Codegen():
                         if has_else:
                             raise Exception("Encountered condition after else")
                         
-                        conditions.append(len(block.body))
-                        self._generate_bytecode(cond)
-                        block.emit_jump_forward_false(0)
+                        # every jump taken when the condition is false
+                        condition_jumps.append(self._generate_condition(cond, False))
+                        self._generate_bytecode(body)
 
-                        # -2 to position at start of jump address (16 bits)
-                        condition_jumps.append(len(block.body) - 2)
-                        self._generate_bytecode(cond)
+                        # jump over the remaining cases, including the
+                        # implicit else when there isn't one
+                        block.emit_jump_forward(0)
+                        end_jumps.append(len(block.body) - 2)
 
-                        # we don't need an end jump if this is the last condition
-                        if i != len(node.cases) - 1:
-                            block.emit_jump_forward(0)
-                            end_jumps.append(len(block.body) - 2)
+                if not has_else:
+                    # an if without an else evaluates to None when no case matches
+                    conditions.append(len(block.body))
+                    idx = block.get_const_index(NoneConst())
+                    block.emit_load_const(idx)
 
                 conditions.append(len(block.body))
-                print("offsets:")
-                print(conditions)
-                print(condition_jumps)
 
                 for i in range(len(condition_jumps)):
-                    jump_location = condition_jumps[i]
-                    # +1 since jump location is positioned at the start of the arg
-                    # INSTR ARG0 ARG1
-                    #       ^ jump_location
-                    offset = conditions[i + 1] - jump_location + 1
-                    writer.overwrite_int_as_uint16(block.body, offset, jump_location)
-
-                for i in range(len(end_jumps)):
-                    jump_location = end_jumps[i]
-                    offset = conditions[-1] - jump_location + 1
-                    writer.overwrite_int_as_uint16(block.body, offset, jump_location)
+                    for jump_location in condition_jumps[i]:
+                        self._patch_jump(jump_location, conditions[i + 1])
+
+                for jump_location in end_jumps:
+                    self._patch_jump(jump_location, conditions[-1])
 
             case ExpressionStatementNode():
                 expr = node.expr
 
+                # the POP can't fail, so it goes with the expression's last
+                # instruction rather than getting a location of its own
                 self._generate_bytecode(expr)
                 block.emit_pop()
 
+            case ErrorNode():
+                raise Exception("cannot generate code for a program with syntax errors")
+
+            case CallExpressionNode() if (function := self._inline_target(node)) is not None:
+                self._generate_inlined_call(node, function)
+
             case CallExpressionNode():
                 self._generate_bytecode(node.callee)
                 for arg in node.arglist.arguments:
                     self._generate_bytecode(arg.expr)
+                self._mark_location(node)
                 block.emit_call(len(node.arglist.arguments))
 
+            case BinaryExpressionNode() if node.operator == 'and' or node.operator == 'or':
+                # the left value is the result if it decides the outcome,
+                # and the right side is only evaluated otherwise
+                self._generate_bytecode(node.left)
+                self._mark_location(node)
+                if node.operator == 'and':
+                    block.emit_jump_if_false_or_pop(0)
+                else:
+                    block.emit_jump_if_true_or_pop(0)
+                jump_location = len(block.body) - 2
+                self._generate_bytecode(node.right)
+                self._patch_jump(jump_location, len(block.body))
+
             case BinaryExpressionNode():
                 self._generate_bytecode(node.left)
                 self._generate_bytecode(node.right)
+                self._mark_location(node)
+                operand_type = self.types.operand_type(node) if self.types is not None else None
+                typed = operand_type == 'int'
                 match node.operator:
                     case 'plus':
-                        block.emit_add()
+                        if typed:
+                            block.emit_int_add()
+                        elif operand_type == 'string':
+                            block.emit_str_add()
+                        else:
+                            block.emit_add()
                     case 'minus':
-                        block.emit_subtract()
+                        block.emit_int_subtract() if typed else block.emit_subtract()
                     case 'asterisk':
-                        block.emit_multiply()
+                        block.emit_int_multiply() if typed else block.emit_multiply()
                     case 'slash':
                         block.emit_divide()
-                    case 'and':
-                        block.emit_and()
-                    case 'or':
-                        block.emit_or()
                     case 'greater':
-                        block.emit_gt()
+                        block.emit_int_gt() if typed else block.emit_gt()
                     case 'greaterequals':
-                        block.emit_gteq()
+                        block.emit_int_gteq() if typed else block.emit_gteq()
                     case 'less':
-                        block.emit_lt()
+                        block.emit_int_lt() if typed else block.emit_lt()
                     case 'lessequals':
-                        block.emit_lteq()
+                        block.emit_int_lteq() if typed else block.emit_lteq()
                     case 'equalsequals':
-                        block.emit_eq()
+                        block.emit_int_eq() if typed else block.emit_eq()
                     case 'bangequals':
-                        block.emit_neq()
+                        block.emit_int_neq() if typed else block.emit_neq()
                     case _:
                         raise NotImplementedError(f"Not implemented for binary operation {node.operator}")
                     
             case PrefixExpressionNode():
                 match node.operator:
                     case 'minus':
-                        generate_bytecode(node.operand, block, resolver, context)
+                        self._generate_bytecode(node.operand)
+                        self._mark_location(node)
                         block.emit_negate()
                     case 'plus':
-                        generate_bytecode(node.operand, block, resolver, context)
+                        self._generate_bytecode(node.operand)
+                        self._mark_location(node)
                         block.emit_positive()
+                    case 'bang':
+                        self._generate_bytecode(node.operand)
+                        self._mark_location(node)
+                        block.emit_not()
 
             case AssignmentExpressionNode():
-                if context == "module":
-                    idx = block.get_insert_name_index(node.left.identifier.token.content)
-                    generate_bytecode(node.value, block, resolver, context)
+                if isinstance(context, ModuleContext):
+                    idx = block.get_insert_name_index(node.left.token.content)
+                    self._generate_bytecode(node.value)
+                    self._mark_location(node)
                     block.emit_store_name(idx)
-                    
-                    # since assignment is an expression we always push None
-                    none_idx = block.get_const_index(NoneConst())
-                    block.emit_load_const(none_idx)
 
-                if context == "function":
-                    if (idx := block.get_deref_index(node.left.identifier.token.content)) != None:
+                elif isinstance(context, FunctionContext):
+                    self._generate_bytecode(node.value)
+                    self._mark_location(node)
+                    if (idx := block.get_deref_index(node.left.token.content)) != None:
                         block.emit_store_deref(idx)
-                    elif (idx := block.get_local_index(node.left.identifier.token.content)) != None:
+                    elif (idx := block.get_local_index(node.left.token.content)) != None:
                         block.emit_store_local(idx)
                     else:
-                        idx = block.get_insert_name_index(node.left.identifier.token.content)
+                        idx = block.get_insert_name_index(node.left.token.content)
                         block.emit_store_name(idx)
 
                 else:
                     raise Exception(f"Not implemented for context {block.context}")
+
+                # since assignment is an expression we always push None
+                none_idx = block.get_const_index(NoneConst())
+                block.emit_load_const(none_idx)
                 
             # case ObjectAssignmentExpressionNode():
             #     generate_bytecode(node.left.object, block)
@@ -266,43 +554,311 @@ class Codegen():
             #     block.emit_load_const(none_idx)
 
             case FunctionLiteralExpressionNode():
-                function_block = Block(context='function')
-                bound_names = set()
-
-                for param in node.paramlist.parameters:
-                    if param.name.token.content in bound_names:
-                        raise Exception(f"Param {param.name.token.content} declared more than once!")
-                    bound_names.add(param.name.token.content)
-                    function_block.get_insert_local_index(param.name.token.content)
-
-                free_vars = self.resolver.free_variables.get(node)
-                if free_vars is not None:
-                    for freevar in free_vars:
-                        if freevar in bound_names:
-                            raise Exception(f"Captured variable {freevar} conflicts with parameter of same name (should be impossible)")
-                        bound_names.add(freevar)
-                        function_block.free_names.append(freevar)
-                    function_block.emit_copy_free_vars()
-
-                cell_vars = self.resolver.cell_variables.get(node)
-                if cell_vars is not None:
-                    for cellvar in cell_vars:
-                        if cellvar in bound_names:
-                            raise Exception("Cell var conflicts with param or free var (should be unreachable)")
-                        bound_names.add(cellvar)
-                        function_block.cell_names.append(cellvar)
-
-                ctx = FunctionContext()
-                
-                self._generate_bytecode(node.body)
-
-                idx = block.get_const_index(FunctionLiteralConst(function_block))
-                block.emit_load_const(idx)
+                self._generate_function_literal(node, "<anonymous>")
 
             case IndexExpressionNode():
                 self._generate_bytecode(node.left)
                 self._generate_bytecode(node.index)
+                self._mark_location(node)
                 block.emit_load_attr()
 
             case _:
-                raise NotImplementedError(f"Not implemented for {type(node)}")
\ No newline at end of file
+                raise NotImplementedError(f"Not implemented for {type(node)}")
+
+    def _generate_condition(self, node: Node, jump_if: bool) -> list[int]:
+        """
+        Generates `node` as a condition: code that jumps when its value's
+        truth is `jump_if` and otherwise falls through, leaving nothing on
+        the stack. `and`, `or` and `!` become jumps rather than values.
+        Returns the locations of the jumps' operands, to be patched with
+        `_patch_jump` once the target is known.
+        """
+
+        block = self.blocks[-1]
+        match node:
+            case BinaryExpressionNode() if node.operator == 'and' or node.operator == 'or':
+                # the operator whose left side alone can decide to jump
+                deciding = 'or' if jump_if else 'and'
+                if node.operator == deciding:
+                    return self._generate_condition(node.left, jump_if) \
+                        + self._generate_condition(node.right, jump_if)
+                # otherwise the left side can only decide not to jump
+                skips = self._generate_condition(node.left, not jump_if)
+                jumps = self._generate_condition(node.right, jump_if)
+                for jump_location in skips:
+                    self._patch_jump(jump_location, len(block.body))
+                return jumps
+            case PrefixExpressionNode() if node.operator == 'bang':
+                return self._generate_condition(node.operand, not jump_if)
+            case _:
+                self._generate_bytecode(node)
+                if jump_if:
+                    block.emit_jump_forward_true(0)
+                else:
+                    block.emit_jump_forward_false(0)
+                # -2 to position at start of jump address (16 bits)
+                return [len(block.body) - 2]
+
+    def _inline_target(self, node: CallExpressionNode) -> FunctionLiteralExpressionNode | None:
+        """
+        The function `node` calls, if the call can be inlined, or None.
+        """
+
+        if self.inline_budget is None or not isinstance(self.contexts[-1], FunctionContext) \
+                or not isinstance(node.callee, IdentifierExpressionNode):
+            return None
+        info = self.resolver.bindings.get(node.callee)
+        if info is None or not info.immutable or not isinstance(info.decl, LetStatementNode):
+            return None
+        function = info.decl.value
+        if not isinstance(function, FunctionLiteralExpressionNode) \
+                or len(function.paramlist.parameters) != len(node.arglist.arguments):
+            return None
+        if self.resolver.free_variables.get(function) or self.resolver.copied_variables.get(function):
+            return None
+        # not into itself, whether it is being generated or inlined
+        if any(block.node is function for block in self.blocks) \
+                or any(inlined is function for inlined, _ in self._inlined):
+            return None
+
+        if id(function) not in self._inline_sizes:
+            self._inline_sizes[id(function)] = _inline_size(function.body)
+        size = self._inline_sizes[id(function)]
+        return function if size is not None and size <= self.inline_budget else None
+
+    def _generate_inlined_call(self, node: CallExpressionNode, function: FunctionLiteralExpressionNode):
+        """
+        Generates the body of `function` in place of `node`, a call to it,
+        with its parameters in fresh locals.
+        """
+
+        block = self.blocks[-1]
+        for arg in node.arglist.arguments:
+            self._generate_bytecode(arg.expr)
+
+        # SPY names can't start with a digit, so these never clash with
+        # one. Inlined bodies at the same depth never overlap, so they
+        # share them.
+        depth = len(self._inlined)
+        parameters = {
+            param.name.token.content: block.get_insert_local_index(f"{depth}_{param.name.token.content}")
+            for param in function.paramlist.parameters
+        }
+        for idx in reversed(parameters.values()):
+            block.emit_store_local(idx)
+
+        self._inlined.append((function, parameters))
+        self._generate_bytecode(function.body)
+        self._inlined.pop()
+
+    def _literal_const(self, node: Expression) -> Const:
+        match node:
+            case NumberLiteralExpressionNode():
+                return IntegerConst(node.token.content)
+            case StringLiteralExpressionNode():
+                return StringConst(node.token.content)
+            case BoolLiteralExpressionNode():
+                return BoolConst(1 if node.get_value() else 0)
+            case _:
+                raise NotImplementedError(f"Not implemented for {type(node)}")
+
+    def _patch_jump(self, jump_location: int, target: int):
+        """
+        Points the forward jump whose operand is at `jump_location` in the
+        current block at `target`.
+        """
+
+        # +1 since jump location is positioned at the start of the arg
+        # INSTR ARG0 ARG1
+        #       ^ jump_location
+        offset = target - jump_location + 1
+        writer.overwrite_int_as_uint16(self.blocks[-1].body, offset, jump_location)
+
+    def _generate_function_literal(self, node: FunctionLiteralExpressionNode, name: str):
+        """
+        Generates a function literal's body into a new `Block` and loads it
+        as a constant. `name` is only used for debugging and profiling.
+        """
+
+        block = self.blocks[-1]
+        generated = self._generated.pop(id(node), None)
+        if generated is not None:
+            function_block, count = generated
+            self.function_count += count
+            function_block = self._share_generated(function_block, {})
+        else:
+            function_block = self._generate_function_block(node, name)
+
+        idx = block.get_const_index(FunctionLiteralConst(function_block))
+        self._mark_location(node)
+        block.emit_load_const(idx)
+
+    def _generate_function_block(self, node: FunctionLiteralExpressionNode, name: str) -> Block:
+        function_block = Block(context='function', name=name)
+        function_block.node = node
+        function_block.argument_count = len(node.paramlist.parameters)
+        if isinstance(node.body, LazyBodyNode):
+            function_block.emit_lazy_body()
+            function_block.pending = partial(self.compile_lazy, function_block)
+            return function_block
+
+        self._generate_function_body(function_block, node)
+        self.function_count += 1
+        return self._share(function_block)
+
+    def _share(self, block: Block) -> Block:
+        """
+        The block identical to `block` that was generated first, if
+        `share_blocks` is on and there is one, or else `block`.
+        """
+
+        if not self.share_blocks:
+            return block
+        shared = self.distinct_blocks.setdefault(_block_key(block), block)
+        if shared is not block:
+            shared.shared_nodes.append(block.node)
+            shared.shared_nodes.extend(block.shared_nodes)
+            shared.constant_nodes.update(block.constant_nodes)
+        return shared
+
+    def _share_generated(self, block: Block, shared: dict[Block, Block]) -> Block:
+        """
+        Shares `block`, generated by a worker, and the blocks nested in it,
+        innermost first, as if they had been generated here. `shared` maps
+        the blocks done so far, since the worker may have shared some.
+        """
+
+        if block in shared:
+            return shared[block]
+        for i, const in enumerate(block.consts):
+            if isinstance(const, FunctionLiteralConst):
+                block.consts[i] = FunctionLiteralConst(self._share_generated(const.block, shared))
+        # keyed by the blocks that were just replaced
+        block._const_indices.clear()
+        shared[block] = result = self._share(block)
+        return result
+
+    def _generate_in_workers(self, root: ProgramNode):
+        """
+        Generates the blocks of the module-level functions of `root` in
+        forked worker processes, for `_generate_function_literal` to pick
+        up in source order.
+        """
+
+        global _forked
+        functions: list[tuple[FunctionLiteralExpressionNode, str]] = []
+        literals: dict[int, FunctionLiteralExpressionNode] = {}
+        _find_functions(root.statements, functions, literals)
+        if len(functions) < 2:
+            return
+
+        # a few chunks per worker, so that they finish close together
+        size = -(-len(functions) // (self.workers * 4))
+        chunks = [range(start, min(start + size, len(functions))) for start in range(0, len(functions), size)]
+        _forked = (self, functions)
+        try:
+            with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+                seen = set()
+                for results in pool.imap(_generate_forked, chunks):
+                    for index, block, count in results:
+                        _attach_nodes(block, literals, seen)
+                        self._generated[id(functions[index][0])] = (block, count)
+        finally:
+            _forked = None
+
+    def compile_lazy(self, block: Block):
+        """
+        Parses, resolves and generates the skipped body of the function
+        literal `block` was generated from, replacing the placeholder.
+        """
+
+        lazy = block.node
+        node = FunctionLiteralExpressionNode(lazy.paramlist, self.parse_body(lazy.body))
+        self.resolver.resolve_lazy(node, lazy)
+        block.body = bytearray()
+        block.node = node
+        self._generate_function_body(block, node)
+        block.pending = None
+
+    def _generate_function_body(self, function_block: Block, node: FunctionLiteralExpressionNode):
+        bound_names = set()
+
+        for param in node.paramlist.parameters:
+            if param.name.token.content in bound_names:
+                raise Exception(f"Param {param.name.token.content} declared more than once!")
+            bound_names.add(param.name.token.content)
+            function_block.get_insert_local_index(param.name.token.content)
+
+        free_vars = self.resolver.free_variables.get(node, [])
+        copied_vars = self.resolver.copied_variables.get(node, [])
+        for freevar in free_vars + copied_vars:
+            if freevar in bound_names:
+                raise Exception(f"Captured variable {freevar} conflicts with parameter of same name (should be impossible)")
+            bound_names.add(freevar)
+        function_block.free_names.extend(free_vars)
+        for copiedvar in copied_vars:
+            # copies live in the locals right after the parameters
+            function_block.copied_names.append(copiedvar)
+            function_block.get_insert_local_index(copiedvar)
+        if free_vars or copied_vars:
+            function_block.emit_copy_free_vars()
+
+        cell_vars = self.resolver.cell_variables.get(node)
+        if cell_vars is not None:
+            for cellvar in cell_vars:
+                if cellvar in function_block.free_names:
+                    raise Exception("Cell var conflicts with free var (should be unreachable)")
+                function_block.cell_names.append(cellvar)
+
+                # captured parameters arrive as locals like any other
+                # argument, so move them into their cell up front
+                if (local_idx := function_block.get_local_index(cellvar)) is not None:
+                    function_block.emit_load_local(local_idx)
+                    function_block.emit_store_deref(function_block.get_deref_index(cellvar))
+
+        ctx = FunctionContext()
+        
+        self.blocks.append(function_block)
+        self.contexts.append(ctx)
+        if self.line_index is not None:
+            function_block.locations = LocationTable()
+
+        self._generate_bytecode(node.body)
+        function_block.emit_return()
+        if self.tail_calls:
+            self._mark_tail_calls(function_block)
+
+        self.blocks.pop()
+        self.contexts.pop()
+        function_block.max_stack_depth = max_stack_depth(function_block)
+        if self.line_index is not None:
+            function_block.locations.resolve(self.line_index)
+
+    def _generate_let_value(self, node: LetStatementNode):
+        """
+        Generates the value of a let statement. Function literals take the
+        name they are bound to.
+        """
+
+        if isinstance(node.value, FunctionLiteralExpressionNode):
+            self._generate_function_literal(node.value, node.name.token.content)
+        else:
+            self._generate_bytecode(node.value)
+
+    def _mark_tail_calls(self, block: Block):
+        """
+        Turns every CALL in `block` whose result goes straight to a RETURN,
+        possibly through forward jumps (as at the end of an if case), into
+        a TAIL_CALL. Both take the same operand, so no offsets move.
+        """
+
+        decoded = list(block.instructions())
+        instructions = {offset: (name, arg) for offset, name, arg in decoded}
+        for i, (offset, name, _) in enumerate(decoded[:-1]):
+            if name != "CALL":
+                continue
+            following = decoded[i + 1][0]
+            while following in instructions and instructions[following][0] == "JUMP_FORWARD":
+                following += instructions[following][1]
+            if following in instructions and instructions[following][0] == "RETURN":
+                block.body[offset] = instruction_values["TAIL_CALL"]
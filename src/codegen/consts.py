@@ -25,4 +25,14 @@ class NoneConst:
 
 @dataclass
 class FunctionLiteralConst:
-    block: 'Block'
\ No newline at end of file
+    block: 'Block'
+
+def const_key(const: Const) -> tuple:
+    """
+    A hashable stand-in for `const`, equal for equal constants. Function
+    literals are only equal if they have the same block.
+    """
+
+    if isinstance(const, FunctionLiteralConst):
+        return FunctionLiteralConst, id(const.block)
+    return type(const), getattr(const, "value", None)
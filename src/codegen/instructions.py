@@ -18,21 +18,38 @@ instruction_names = {
     0x1A: "MAKE_OBJECT",
     0x1B: "FREEZE",
     0x1C: "SEAL",
+    0x1D: "STORE_ATTR",
 
     0x20: "JUMP_FORWARD",
     0x21: "JUMP_BACKWARD",
     0x22: "JUMP_FORWARD_TRUE",
     0x23: "JUMP_FORWARD_FALSE",
+    0x24: "JUMP_IF_FALSE_OR_POP",
+    0x25: "JUMP_IF_TRUE_OR_POP",
 
     0x30: "CALL",
     0x31: "RETURN",
     0x32: "COPY_FREE_VARS",
+    0x33: "TAIL_CALL",
+    0x34: "LAZY_BODY",
 
     0x40: "ADD",
     0x41: "SUBTRACT",
     0x42: "MULTIPLY",
     0x43: "DIVIDE",
 
+    # Typed forms; see `typed_instructions`
+    0x44: "INT_ADD",
+    0x45: "INT_SUBTRACT",
+    0x46: "INT_MULTIPLY",
+    0x47: "STR_ADD",
+    0x48: "INT_EQ",
+    0x49: "INT_NEQ",
+    0x4A: "INT_GT",
+    0x4B: "INT_GTEQ",
+    0x4C: "INT_LT",
+    0x4D: "INT_LTEQ",
+
     0x50: "NEGATE",
     0x51: "POSITIVE",
     
@@ -46,7 +63,180 @@ instruction_names = {
     0x67: "AND",
     0x68: "OR",
 
-    0x70: "LOCAL_SLOTS"
+    0x70: "LOCAL_SLOTS",
+
+    # Quickened forms; see `quickened_instructions`
+    0x80: "SPECIALIZE",
+    0x81: "LOAD_CONST_VALUE",
+    # guarded forms, comparisons first, then arithmetic on ints, then
+    # ADD_STR, as the VM tells them apart by range
+    0x82: "EQ_INT",
+    0x83: "NEQ_INT",
+    0x84: "GT_INT",
+    0x85: "GTEQ_INT",
+    0x86: "LT_INT",
+    0x87: "LTEQ_INT",
+    0x88: "ADD_INT",
+    0x89: "SUBTRACT_INT",
+    0x8A: "MULTIPLY_INT",
+    0x8B: "DIVIDE_INT",
+    0x8C: "ADD_STR",
+}
+
+# Instructions codegen emits instead of the generic one where type
+# inference (see `process.types`) shows both operands are ints, or strings
+# for STR_ADD, keyed by the generic one. They do just what the generic
+# instruction does, without checking anything, so they are correct for
+# any operands; the types only say where it pays to use them. There is no
+# INT_DIVIDE since int division floors, and that would be wrong for a
+# float passed in from Python.
+typed_instructions = {
+    "ADD": {"int": "INT_ADD", "string": "STR_ADD"},
+    "SUBTRACT": {"int": "INT_SUBTRACT"},
+    "MULTIPLY": {"int": "INT_MULTIPLY"},
+    "EQ": {"int": "INT_EQ"},
+    "NEQ": {"int": "INT_NEQ"},
+    "GT": {"int": "INT_GT"},
+    "GTEQ": {"int": "INT_GTEQ"},
+    "LT": {"int": "INT_LT"},
+    "LTEQ": {"int": "INT_LTEQ"},
+}
+
+# Instructions the VM rewrites others into while running (see
+# `vm.quicken`). They only ever appear in a `Code`'s copy of a block's
+# body, never in blocks or modules, and each one stands in for the
+# instruction at the same offset in the block.
+quickened_instructions = frozenset(
+    name for opcode, name in instruction_names.items() if opcode >= 0x80)
+
+instruction_values = { v: k for k, v in instruction_names.items() }
+
+# Size in bytes of the operand that follows each instruction. All operands
+# are big-endian uint16s; instructions not listed here take no operand.
+instruction_operand_sizes = {
+    "LOAD_LOCAL": 2,
+    "LOAD_GLOBAL": 2,
+    "LOAD_NAME": 2,
+    "LOAD_CONST": 2,
+    "LOAD_DEREF": 2,
+    "STORE_LOCAL": 2,
+    "STORE_GLOBAL": 2,
+    "STORE_NAME": 2,
+    "STORE_DEREF": 2,
+
+    "JUMP_FORWARD": 2,
+    "JUMP_BACKWARD": 2,
+    "JUMP_FORWARD_TRUE": 2,
+    "JUMP_FORWARD_FALSE": 2,
+    "JUMP_IF_FALSE_OR_POP": 2,
+    "JUMP_IF_TRUE_OR_POP": 2,
+
+    "CALL": 2,
+    "TAIL_CALL": 2,
+
+    "LOCAL_SLOTS": 2,
+
+    "LOAD_CONST_VALUE": 2,
+}
+
+# Total size in bytes of each instruction, keyed by opcode.
+instruction_sizes = {
+    opcode: 1 + instruction_operand_sizes.get(name, 0)
+    for opcode, name in instruction_names.items()
 }
 
-instruction_values = { v: k for k, v in instruction_names.items() }
\ No newline at end of file
+# Number of values each instruction pops and then pushes. CALL and
+# TAIL_CALL are missing since their effect depends on their operand; see
+# `stack_effect`.
+instruction_stack_effects = {
+    "NOP": (0, 0),
+    "POP": (1, 0),
+    "DUP": (1, 2),
+    "SWAP": (2, 2),
+
+    "LOAD_LOCAL": (0, 1),
+    "LOAD_GLOBAL": (0, 1),
+    "LOAD_NAME": (0, 1),
+    "LOAD_ATTR": (2, 1),
+    "LOAD_CONST": (0, 1),
+    "LOAD_DEREF": (0, 1),
+    "STORE_LOCAL": (1, 0),
+    "STORE_GLOBAL": (1, 0),
+    "STORE_NAME": (1, 0),
+    "STORE_DEREF": (1, 0),
+
+    "MAKE_OBJECT": (0, 1),
+    "FREEZE": (1, 1),
+    "SEAL": (1, 1),
+    "STORE_ATTR": (3, 1),
+
+    "JUMP_FORWARD": (0, 0),
+    "JUMP_BACKWARD": (0, 0),
+    "JUMP_FORWARD_TRUE": (1, 0),
+    "JUMP_FORWARD_FALSE": (1, 0),
+    # when they fall through; when they jump the value stays on the stack
+    "JUMP_IF_FALSE_OR_POP": (1, 0),
+    "JUMP_IF_TRUE_OR_POP": (1, 0),
+
+    "RETURN": (1, 0),
+    "COPY_FREE_VARS": (0, 0),
+    "LAZY_BODY": (0, 0),
+
+    "ADD": (2, 1),
+    "SUBTRACT": (2, 1),
+    "MULTIPLY": (2, 1),
+    "DIVIDE": (2, 1),
+
+    "INT_ADD": (2, 1),
+    "INT_SUBTRACT": (2, 1),
+    "INT_MULTIPLY": (2, 1),
+    "STR_ADD": (2, 1),
+    "INT_EQ": (2, 1),
+    "INT_NEQ": (2, 1),
+    "INT_GT": (2, 1),
+    "INT_GTEQ": (2, 1),
+    "INT_LT": (2, 1),
+    "INT_LTEQ": (2, 1),
+
+    "NEGATE": (1, 1),
+    "POSITIVE": (1, 1),
+
+    "EQ": (2, 1),
+    "NEQ": (2, 1),
+    "GT": (2, 1),
+    "GTEQ": (2, 1),
+    "LT": (2, 1),
+    "LTEQ": (2, 1),
+    "NOT": (1, 1),
+    "AND": (2, 1),
+    "OR": (2, 1),
+
+    "LOCAL_SLOTS": (0, 0),
+
+    "SPECIALIZE": (2, 1),
+    "LOAD_CONST_VALUE": (0, 1),
+    "EQ_INT": (2, 1),
+    "NEQ_INT": (2, 1),
+    "GT_INT": (2, 1),
+    "GTEQ_INT": (2, 1),
+    "LT_INT": (2, 1),
+    "LTEQ_INT": (2, 1),
+    "ADD_INT": (2, 1),
+    "SUBTRACT_INT": (2, 1),
+    "MULTIPLY_INT": (2, 1),
+    "DIVIDE_INT": (2, 1),
+    "ADD_STR": (2, 1),
+}
+
+def stack_effect(name: str, arg: int | None) -> tuple[int, int]:
+    """
+    Gets the number of values the instruction pops and then pushes.
+    """
+
+    if name == "CALL":
+        # the callee and its arguments, replaced by the result
+        return arg + 1, 1
+    if name == "TAIL_CALL":
+        # like CALL, but the result is returned rather than pushed
+        return arg + 1, 0
+    return instruction_stack_effects[name]
@@ -0,0 +1,138 @@
+from array import array
+from bisect import bisect_right
+
+import codegen.writer as writer
+from codegen.reader import Reader
+from lex.diagnostic import LineIndex
+
+class LocationTable:
+    """
+    Maps instruction offsets in a `Block`'s body to the source (line, column)
+    they were generated from.
+
+    An entry covers every instruction from its offset up to the next
+    entry's offset. Entries are kept in parallel arrays sorted by offset, so
+    a lookup is a binary search. In a serialized module the table is
+    delta-encoded: each entry is stored as the offset delta, the zigzagged
+    line delta and the column, each as a varint, so most entries take 3
+    bytes.
+
+    While a block is being generated, entries record offsets into the
+    source in plain lists, which keeps `add`, run for most instructions
+    during code generation, as cheap as possible. Once the block is
+    finished, `resolve` gives the table the source's `LineIndex`, and
+    lookups convert the one entry they find. Entries are only converted to
+    lines and columns wholesale, and merged, when the table is serialized
+    (or its length is asked for), so code generation doesn't pay for that.
+    """
+    offsets: array
+    lines: array
+    columns: array
+
+    def __init__(self):
+        self.offsets = array('I')
+        self.lines = array('I')
+        self.columns = array('I')
+        self._pending_offsets = []
+        self._pending_positions = []
+        self._line_index: LineIndex | None = None
+
+    def __len__(self):
+        self._convert()
+        return len(self.offsets)
+
+    def __getstate__(self):
+        # converted first, so that the source's line index isn't copied along
+        self._convert()
+        return self.__dict__
+
+    def add(self, offset: int, position: int):
+        """
+        Attributes the instructions starting at `offset` to the given offset
+        into the source. Offsets must be added in increasing order; adding
+        the same offset again replaces its location, since no instruction
+        was emitted in between.
+        """
+
+        self._pending_offsets.append(offset)
+        self._pending_positions.append(position)
+
+    def resolve(self, line_index: LineIndex):
+        """
+        Finishes the table, whose source offsets are converted with
+        `line_index`.
+        """
+
+        self._line_index = line_index
+
+    def _convert(self):
+        """
+        Converts the source offsets recorded by `add` into lines and columns,
+        merging consecutive entries that end up with the same location.
+        """
+
+        if self._line_index is None:
+            return
+        # this works on whole lists rather than calling `line_col` for each
+        # entry. the last entry added at an offset is the one kept, and
+        # since equal positions give equal locations, entries are merged
+        # before converting
+        offsets, positions = self._pending_offsets, self._pending_positions
+        last = len(offsets) - 1
+        kept = [i for i in range(last) if offsets[i] != offsets[i + 1]]
+        if offsets:
+            kept.append(last)
+        kept = [i for n, i in enumerate(kept) if n == 0 or positions[i] != positions[kept[n - 1]]]
+        starts = self._line_index.line_starts
+        lines = [bisect_right(starts, positions[i]) for i in kept]
+        self.offsets.extend([offsets[i] for i in kept])
+        self.lines.extend(lines)
+        self.columns.extend([positions[i] - starts[line - 1] + 1 for i, line in zip(kept, lines)])
+        self._pending_offsets = []
+        self._pending_positions = []
+        self._line_index = None
+
+    def lookup(self, offset: int) -> tuple[int, int] | None:
+        """
+        Gets the (line, column) of the instruction at `offset`, or None if
+        it has no location.
+        """
+
+        if self._line_index is not None:
+            # the last entry added at an offset is the one that counts
+            i = bisect_right(self._pending_offsets, offset) - 1
+            return self._line_index.line_col(self._pending_positions[i]) if i >= 0 else None
+        i = bisect_right(self.offsets, offset) - 1
+        if i < 0:
+            return None
+        return (self.lines[i], self.columns[i])
+
+    def encode(self) -> bytes:
+        self._convert()
+        data = bytearray()
+        last_offset, last_line = 0, 0
+        for offset, line, column in zip(self.offsets, self.lines, self.columns):
+            writer.write_varint(data, offset - last_offset)
+            writer.write_varint(data, zigzag(line - last_line))
+            writer.write_varint(data, column)
+            last_offset, last_line = offset, line
+        return bytes(data)
+
+    @staticmethod
+    def decode(data: bytes) -> 'LocationTable':
+        table = LocationTable()
+        reader = Reader(data, debug=False)
+        offset, line = 0, 0
+        while reader.pos < len(data):
+            offset += reader.read_varint()
+            line += unzigzag(reader.read_varint())
+            table.offsets.append(offset)
+            table.lines.append(line)
+            table.columns.append(reader.read_varint())
+        return table
+
+def zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if value & 1 == 0 else -((value + 1) >> 1)
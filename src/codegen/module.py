@@ -0,0 +1,288 @@
+import codegen.writer as writer
+from codegen.reader import Reader
+from codegen.block import Block
+from codegen.verify import verify_block
+from codegen.consts import *
+from codegen.locations import LocationTable
+
+# Serialized module layout:
+#
+#   magic       "SPYC"
+#   version     uint16
+#   flags       uint8, FLAG_LOCATIONS if blocks carry location tables and
+#               FLAG_POOLED if they share a pool
+#   pool        (only with FLAG_POOLED) varsize1632 count followed by that
+#               many utf8 strings, then varsize1632 count followed by that
+#               many tagged consts, other than functions
+#   block       the module block
+#
+# where each block is:
+#
+#   context     uint8, 0 for module and 1 for function
+#   name        utf8
+#   argc        varsize1632 number of parameters
+#   stack       varsize1632 max stack depth
+#   names       for each of global, local, cell, free, copied and plain names:
+#               varsize1632 count followed by that many utf8 strings
+#   consts      varsize1632 count followed by that many tagged consts; a
+#               function block that was already written, as when several
+#               literals share one, is CONST_FUNCTION_REF followed by a
+#               varint index into the function blocks in the order they
+#               were written
+#   body        varsize1632 length followed by the bytecode
+#   locations   (only with FLAG_LOCATIONS) varsize1632 length followed by
+#               the encoded `LocationTable`, empty if the block has none
+#
+# utf8 strings are a varsize1632 byte length followed by the bytes. The
+# local, cell, free and copied counts are the lengths of their name lists.
+#
+# With FLAG_POOLED every distinct string and constant in the module is
+# written once, in the pool. Names, and the values of the consts in the
+# pool, are then varint indices into its strings, and a block's consts
+# other than functions are CONST_POOLED followed by a varint index into
+# its consts.
+#
+# Loaded modules are verified with `verify_block`, so malformed bytecode is
+# rejected here rather than when it runs.
+
+MAGIC = b"SPYC"
+VERSION = 6
+
+FLAG_LOCATIONS = 0x01
+FLAG_POOLED = 0x02
+
+CONST_INTEGER = 0x01
+CONST_STRING = 0x02
+CONST_BOOL = 0x03
+CONST_NONE = 0x04
+CONST_FUNCTION = 0x05
+CONST_POOLED = 0x06
+CONST_FUNCTION_REF = 0x07
+
+class _Pool:
+    """
+    The distinct strings and constants of a module, in the order they
+    were first seen.
+    """
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self.consts: list[Const] = []
+        self._string_indices: dict[str, int] = {}
+        self._const_indices: dict[tuple, int] = {}
+        self._blocks: set[Block] = set()
+
+    def add_block(self, block: Block):
+        if block in self._blocks:
+            # shared by several function literals
+            return
+        self._blocks.add(block)
+        if block.pending is not None:
+            block.pending()
+        for names in (block.global_names, block.local_names, block.cell_names, block.free_names, block.copied_names, block.names):
+            for name in names:
+                self.string_index(name)
+        self.string_index(block.name)
+        for const in block.consts:
+            if isinstance(const, FunctionLiteralConst):
+                self.add_block(const.block)
+            else:
+                self.const_index(const)
+
+    def string_index(self, string: str) -> int:
+        index = self._string_indices.get(string)
+        if index is None:
+            index = self._string_indices[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def const_index(self, const: Const) -> int:
+        key = const_key(const)
+        index = self._const_indices.get(key)
+        if index is None:
+            if isinstance(const, (IntegerConst, StringConst)):
+                self.string_index(const.value)
+            index = self._const_indices[key] = len(self.consts)
+            self.consts.append(const)
+        return index
+
+def dump_module(block: Block, strip_locations: bool = False, pooled: bool = False) -> bytes:
+    """
+    Serializes a module block and every function block nested in its
+    constants. With `strip_locations`, location tables are left out. With
+    `pooled`, each distinct string and constant is written once for the
+    whole module, and loading creates each of them once. That pays off
+    when functions share names, strings and numbers: the module shrinks
+    and fewer constants are materialized. Loading is never slower than
+    without the pool, but most of it is verification, which is the same
+    either way (see `bench.pool`).
+    Function bodies that haven't been generated yet are generated first.
+    """
+
+    data = bytearray(MAGIC)
+    writer.write_int_as_uint16(data, VERSION)
+    flags = (0 if strip_locations else FLAG_LOCATIONS) | (FLAG_POOLED if pooled else 0)
+    writer.write_int_as_uint8(data, flags)
+
+    pool = None
+    if pooled:
+        pool = _Pool()
+        pool.add_block(block)
+        writer.write_varsize1632(data, len(pool.strings))
+        for string in pool.strings:
+            writer.write_utf8(data, string)
+        writer.write_varsize1632(data, len(pool.consts))
+        for const in pool.consts:
+            _dump_const(data, const, pool)
+
+    _dump_block(data, block, flags, pool, {})
+    return bytes(data)
+
+def load_module(data: bytes) -> Block:
+    """
+    Deserializes and verifies a module written by `dump_module`. Raises
+    `VerifyError` if its bytecode is malformed.
+    """
+
+    reader = Reader(data, debug=False)
+    if reader.read_bytes(4) != MAGIC:
+        raise ValueError("not a SPY module")
+    version = reader.read_uint16()
+    if version != VERSION:
+        raise ValueError(f"unsupported SPY module version {version}")
+    flags = reader.read_uint8()
+    if flags & ~(FLAG_LOCATIONS | FLAG_POOLED):
+        raise ValueError(f"unknown SPY module flags {flags:#04x}")
+
+    pool = None
+    if flags & FLAG_POOLED:
+        pool = _Pool()
+        for _ in range(reader.read_varsize1632()):
+            pool.strings.append(reader.read_utf8(reader.read_varsize1632()))
+        for _ in range(reader.read_varsize1632()):
+            pool.consts.append(_load_const(reader, reader.read_uint8(), pool))
+
+    block = _load_block(reader, flags, pool, [])
+    verify_block(block)
+    return block
+
+def _dump_string(data: bytearray, string: str, pool: _Pool | None):
+    if pool is None:
+        writer.write_utf8(data, string)
+    else:
+        writer.write_varint(data, pool.string_index(string))
+
+def _load_string(reader: Reader, pool: _Pool | None) -> str:
+    if pool is None:
+        return reader.read_utf8(reader.read_varsize1632())
+    return _pooled(pool.strings, reader.read_varint(), "string")
+
+def _pooled(items: list, index: int, kind: str):
+    try:
+        return items[index]
+    except IndexError:
+        raise ValueError(f"{kind} {index} is not in the pool") from None
+
+def _loaded_block(loaded: list[Block | None], index: int) -> Block:
+    # a block can only refer to ones that were finished before it started
+    if index >= len(loaded) or loaded[index] is None:
+        raise ValueError(f"function block {index} has not been loaded")
+    return loaded[index]
+
+def _dump_const(data: bytearray, const: Const, pool: _Pool | None):
+    match const:
+        case IntegerConst():
+            writer.write_int_as_uint8(data, CONST_INTEGER)
+            _dump_string(data, const.value, pool)
+        case StringConst():
+            writer.write_int_as_uint8(data, CONST_STRING)
+            _dump_string(data, const.value, pool)
+        case BoolConst():
+            writer.write_int_as_uint8(data, CONST_BOOL)
+            writer.write_int_as_uint8(data, const.value)
+        case NoneConst():
+            writer.write_int_as_uint8(data, CONST_NONE)
+        case _:
+            raise NotImplementedError(f"Not implemented for {type(const)}")
+
+def _load_const(reader: Reader, tag: int, pool: _Pool | None) -> Const:
+    if tag == CONST_INTEGER:
+        return IntegerConst(_load_string(reader, pool))
+    elif tag == CONST_STRING:
+        return StringConst(_load_string(reader, pool))
+    elif tag == CONST_BOOL:
+        return BoolConst(reader.read_uint8())
+    elif tag == CONST_NONE:
+        return NoneConst()
+    raise ValueError(f"unknown constant tag {tag}")
+
+def _dump_block(data: bytearray, block: Block, flags: int, pool: _Pool | None, written: dict[Block, int]):
+    if block.pending is not None:
+        block.pending()
+    writer.write_int_as_uint8(data, 0 if block.context == 'module' else 1)
+    _dump_string(data, block.name, pool)
+    writer.write_varsize1632(data, block.argument_count)
+    writer.write_varsize1632(data, block.max_stack_depth)
+
+    for names in (block.global_names, block.local_names, block.cell_names, block.free_names, block.copied_names, block.names):
+        writer.write_varsize1632(data, len(names))
+        for name in names:
+            _dump_string(data, name, pool)
+
+    writer.write_varsize1632(data, len(block.consts))
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst) and const.block in written:
+            writer.write_int_as_uint8(data, CONST_FUNCTION_REF)
+            writer.write_varint(data, written[const.block])
+        elif isinstance(const, FunctionLiteralConst):
+            writer.write_int_as_uint8(data, CONST_FUNCTION)
+            written[const.block] = len(written)
+            _dump_block(data, const.block, flags, pool, written)
+        elif pool is not None:
+            writer.write_int_as_uint8(data, CONST_POOLED)
+            writer.write_varint(data, pool.const_index(const))
+        else:
+            _dump_const(data, const, pool)
+
+    writer.write_varsize1632(data, len(block.body))
+    data.extend(block.body)
+
+    if flags & FLAG_LOCATIONS:
+        locations = block.locations.encode() if block.locations is not None else b""
+        writer.write_varsize1632(data, len(locations))
+        data.extend(locations)
+
+def _load_block(reader: Reader, flags: int, pool: _Pool | None, loaded: list[Block]) -> Block:
+    block = Block('module' if reader.read_uint8() == 0 else 'function')
+    block.name = _load_string(reader, pool)
+    block.argument_count = reader.read_varsize1632()
+    block.max_stack_depth = reader.read_varsize1632()
+
+    for names in (block.global_names, block.local_names, block.cell_names, block.free_names, block.copied_names, block.names):
+        for _ in range(reader.read_varsize1632()):
+            names.append(_load_string(reader, pool))
+
+    for _ in range(reader.read_varsize1632()):
+        tag = reader.read_uint8()
+        if tag == CONST_FUNCTION:
+            # numbered before its nested blocks, as when written
+            index = len(loaded)
+            loaded.append(None)
+            loaded[index] = _load_block(reader, flags, pool, loaded)
+            block.consts.append(FunctionLiteralConst(loaded[index]))
+        elif tag == CONST_FUNCTION_REF:
+            block.consts.append(FunctionLiteralConst(_loaded_block(loaded, reader.read_varint())))
+        elif tag == CONST_POOLED and pool is not None:
+            # the same object for every use, so it is created only once
+            block.consts.append(_pooled(pool.consts, reader.read_varint(), "constant"))
+        else:
+            block.consts.append(_load_const(reader, tag, None))
+
+    block.body = bytearray(reader.read_bytes(reader.read_varsize1632()))
+
+    if flags & FLAG_LOCATIONS:
+        locations = reader.read_bytes(reader.read_varsize1632())
+        if locations:
+            block.locations = LocationTable.decode(locations)
+
+    return block
@@ -72,6 +72,28 @@ class Reader:
             value = self._read("!I", 4, annotation)
         return value
 
+    def read_varint(self, annotation="") -> int:
+        """
+        Read an unsigned integer stored 7 bits per byte, least significant
+        group first, with the high bit set on every byte but the last.
+        """
+        value = self.bytes[self.pos]
+        self.pos += 1
+        if value >= 0x80:
+            # most values fit in the first byte
+            value &= 0x7F
+            shift = 7
+            while True:
+                byte = self.bytes[self.pos]
+                self.pos += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        if self.debug:
+            print(f"read varint {annotation} - {value}")
+        return value
+
     def read_utf8(self, length: int, annotation="") -> str:
         """Read a UTF-8 encoded string of the specified length and advance the stream by that length."""
         unpacked = self.bytes[self.pos: self.pos + length].decode("utf-8")
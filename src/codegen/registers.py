@@ -0,0 +1,310 @@
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.stackdepth import stack_depths
+from codegen.instructions import typed_instructions
+
+# Instructions of the register backend. Every instruction is a tuple of an
+# opcode and three operands (unused ones are 0), most of them registers:
+#
+#   MOVE a b            r[a] = r[b]
+#   LOAD_NAME a n       r[a] = the global or builtin named names[n]
+#   STORE_NAME n b      names[n] = r[b]
+#   LOAD_DEREF a i      r[a] = derefs[i]
+#   STORE_DEREF i b     derefs[i] = r[b]
+#   CLOSURE a k         r[a] = a new function from the template consts[k]
+#   MAKE_OBJECT a       r[a] = {}
+#   LOAD_ATTR a b c     r[a] = r[b][r[c]]
+#   STORE_ATTR a b c    r[a][r[b]] = r[c]
+#   <binary> a b c      r[a] = r[b] <op> r[c]
+#   <unary> a b         r[a] = <op> r[b]
+#   JUMP t              continue at instruction t
+#   JUMP_FALSE a t      continue at instruction t if r[a] is falsy
+#   JUMP_TRUE a t       continue at instruction t if r[a] is truthy
+#   CALL a b c          r[a] = r[b](r[b + 1], ..., r[b + c])
+#   TAIL_CALL a b       return r[a](r[a + 1], ..., r[a + b]), reusing the frame
+#   RETURN a            return r[a]
+#   COPY_FREE_VARS      copy the closure into the free variable cells and
+#                       the copied locals
+register_instruction_names = {
+    0x00: "MOVE",
+    0x01: "LOAD_NAME",
+    0x02: "STORE_NAME",
+    0x03: "LOAD_DEREF",
+    0x04: "STORE_DEREF",
+    0x05: "CLOSURE",
+    0x06: "MAKE_OBJECT",
+    0x07: "LOAD_ATTR",
+    0x08: "STORE_ATTR",
+
+    0x10: "JUMP",
+    0x11: "JUMP_FALSE",
+    0x12: "JUMP_TRUE",
+
+    0x20: "CALL",
+    0x21: "RETURN",
+    0x22: "COPY_FREE_VARS",
+    0x23: "TAIL_CALL",
+
+    0x40: "ADD",
+    0x41: "SUBTRACT",
+    0x42: "MULTIPLY",
+    0x43: "DIVIDE",
+
+    0x50: "NEGATE",
+    0x51: "POSITIVE",
+
+    0x60: "EQ",
+    0x61: "NEQ",
+    0x62: "GT",
+    0x63: "GTEQ",
+    0x64: "LT",
+    0x65: "LTEQ",
+    0x66: "NOT",
+    0x67: "AND",
+    0x68: "OR",
+}
+
+register_instruction_values = { v: k for k, v in register_instruction_names.items() }
+
+# stack instructions that map one-to-one onto a register instruction
+_binary = {"ADD", "SUBTRACT", "MULTIPLY", "DIVIDE", "EQ", "NEQ", "GT", "GTEQ", "LT", "LTEQ", "AND", "OR"}
+_unary = {"NEGATE", "POSITIVE", "NOT"}
+# typed instructions run as the generic register instruction
+_typed = {typed: generic for generic, forms in typed_instructions.items() for typed in forms.values()}
+_jumps = {"JUMP_FORWARD", "JUMP_BACKWARD", "JUMP_FORWARD_TRUE", "JUMP_FORWARD_FALSE"}
+# jumps that keep their condition on the stack when they are taken
+_jumps_or_pop = {"JUMP_IF_FALSE_OR_POP": "JUMP_FALSE", "JUMP_IF_TRUE_OR_POP": "JUMP_TRUE"}
+
+class RegisterBlock:
+    """
+    A `Block` lowered to the register instruction set.
+
+    Registers are laid out as the block's locals, then one temporary per
+    stack slot, then one scratch register, then the block's constants, so
+    a frame is created by concatenating the arguments, `register_count -
+    argument_count - len(consts)` Nones and the constants.
+    """
+    block: Block
+    instructions: list[tuple[int, int, int, int]]
+    register_count: int
+    const_base: int
+
+    def __init__(self, block: Block, instructions: list[tuple[int, int, int, int]]):
+        self.block = block
+        self.instructions = instructions
+        self.const_base = len(block.local_names) + block.max_stack_depth + 1
+        self.register_count = self.const_base + len(block.consts)
+
+    def pretty_print(self):
+        """
+        Prints a disassembly of this block.
+        """
+
+        for index, (op, a, b, c) in enumerate(self.instructions):
+            name = register_instruction_names[op]
+            print(f"{index:04}".ljust(8), end="")
+            print(name.ljust(20), end=" ")
+            print(a, b, c)
+
+class RegisterLowering:
+    """
+    Lowers a block's stack bytecode to register instructions.
+
+    The lowering simulates the value stack with the register each slot's
+    value lives in. Loading a local or a constant emits nothing and just
+    pushes that register, so `a + b` becomes a single ADD of the two
+    locals. Everything else computes into the temporary for its stack
+    slot, or straight into the local when it is immediately stored to one.
+
+    Where control flow merges every slot is moved into its own temporary,
+    so all paths agree on where the stack lives.
+    """
+
+    def __init__(self, block: Block):
+        self.block = block
+        self.local_count = len(block.local_names)
+        self.scratch = self.local_count + block.max_stack_depth
+        self.const_base = self.scratch + 1
+
+        self.instructions: list[tuple[int, int, int, int]] = []
+        self.stack: list[int] = []
+
+    def temp(self, depth: int) -> int:
+        return self.local_count + depth
+
+    def emit(self, name: str, a: int = 0, b: int = 0, c: int = 0):
+        self.instructions.append((register_instruction_values[name], a, b, c))
+
+    def materialize(self, start: int = 0):
+        """
+        Moves the stack slots from `start` on into their own temporaries.
+        """
+
+        stack = self.stack
+        for depth in range(start, len(stack)):
+            if stack[depth] != self.temp(depth):
+                self.emit("MOVE", self.temp(depth), stack[depth])
+                stack[depth] = self.temp(depth)
+
+    def lower(self) -> RegisterBlock:
+        block = self.block
+        depths = stack_depths(block)
+        decoded = list(block.instructions())
+
+        targets = set()
+        for offset, name, arg in decoded:
+            if name == "JUMP_BACKWARD":
+                targets.add(offset - arg)
+            elif name in _jumps or name in _jumps_or_pop:
+                targets.add(offset + arg)
+
+        indices: dict[int, int] = {}
+        patches: list[tuple[int, int]] = []
+        fused = set()
+        terminated = False
+
+        for i, (offset, name, arg) in enumerate(decoded):
+            if offset not in depths:
+                # unreachable
+                continue
+            if offset in fused:
+                indices[offset] = len(self.instructions)
+                continue
+
+            if terminated:
+                # only reachable by a jump, which left the stack in temporaries
+                self.stack = [self.temp(depth) for depth in range(depths[offset])]
+                terminated = False
+            elif offset in targets:
+                # the moves are for the path falling through to here, so
+                # jumps land after them
+                self.materialize()
+            indices[offset] = len(self.instructions)
+
+            following = decoded[i + 1] if i + 1 < len(decoded) else None
+            stack = self.stack
+
+            def result(name: str, b: int = 0, c: int = 0):
+                # a value stored to a local right away is computed into it
+                if following is not None and following[1] == "STORE_LOCAL" \
+                        and following[0] not in targets and following[2] not in stack:
+                    fused.add(following[0])
+                    self.emit(name, following[2], b, c)
+                else:
+                    register = self.temp(len(stack))
+                    self.emit(name, register, b, c)
+                    stack.append(register)
+
+            if name in _binary or name in _typed:
+                right = stack.pop()
+                left = stack.pop()
+                result(_typed.get(name, name), left, right)
+            elif name in _unary:
+                result(name, stack.pop())
+
+            elif name == "LOAD_LOCAL":
+                stack.append(arg)
+            elif name == "LOAD_CONST":
+                if type(block.consts[arg]) is FunctionLiteralConst:
+                    result("CLOSURE", arg)
+                else:
+                    stack.append(self.const_base + arg)
+            elif name == "LOAD_DEREF":
+                result("LOAD_DEREF", arg)
+            elif name == "LOAD_NAME":
+                result("LOAD_NAME", arg)
+            elif name == "STORE_LOCAL":
+                value = stack.pop()
+                # slots still holding the local's old value keep a copy
+                for depth, register in enumerate(stack):
+                    if register == arg:
+                        self.emit("MOVE", self.temp(depth), arg)
+                        stack[depth] = self.temp(depth)
+                if value != arg:
+                    self.emit("MOVE", arg, value)
+            elif name == "STORE_DEREF":
+                self.emit("STORE_DEREF", arg, stack.pop())
+            elif name == "STORE_NAME":
+                self.emit("STORE_NAME", arg, stack.pop())
+
+            elif name == "MAKE_OBJECT":
+                result("MAKE_OBJECT")
+            elif name == "LOAD_ATTR":
+                key = stack.pop()
+                result("LOAD_ATTR", stack.pop(), key)
+            elif name == "STORE_ATTR":
+                value = stack.pop()
+                key = stack.pop()
+                self.emit("STORE_ATTR", stack[-1], key, value)
+
+            elif name == "CALL":
+                # the callee and its arguments have to be in consecutive registers
+                callee_depth = len(stack) - arg - 1
+                self.materialize(callee_depth)
+                del stack[callee_depth:]
+                result("CALL", self.temp(callee_depth), arg)
+            elif name == "TAIL_CALL":
+                callee_depth = len(stack) - arg - 1
+                self.materialize(callee_depth)
+                del stack[callee_depth:]
+                self.emit("TAIL_CALL", self.temp(callee_depth), arg)
+                terminated = True
+            elif name == "RETURN":
+                self.emit("RETURN", stack.pop())
+                terminated = True
+            elif name == "COPY_FREE_VARS":
+                self.emit("COPY_FREE_VARS")
+
+            elif name in _jumps:
+                if name == "JUMP_FORWARD" or name == "JUMP_BACKWARD":
+                    condition = 0
+                    target = offset + arg if name == "JUMP_FORWARD" else offset - arg
+                    terminated = True
+                else:
+                    condition = stack.pop()
+                    target = offset + arg
+                self.materialize()
+                patches.append((len(self.instructions), target))
+                jump = {"JUMP_FORWARD": "JUMP", "JUMP_BACKWARD": "JUMP",
+                        "JUMP_FORWARD_TRUE": "JUMP_TRUE", "JUMP_FORWARD_FALSE": "JUMP_FALSE"}[name]
+                self.emit(jump, condition)
+
+            elif name in _jumps_or_pop:
+                # the value is in its temporary on both paths, and only
+                # popped from the simulated stack when the jump isn't taken
+                self.materialize()
+                patches.append((len(self.instructions), offset + arg))
+                self.emit(_jumps_or_pop[name], stack.pop())
+
+            elif name == "POP":
+                stack.pop()
+            elif name == "DUP":
+                stack.append(stack[-1])
+            elif name == "SWAP":
+                below, top = stack[-2], stack[-1]
+                self.emit("MOVE", self.scratch, below)
+                self.emit("MOVE", self.temp(len(stack) - 2), top)
+                self.emit("MOVE", self.temp(len(stack) - 1), self.scratch)
+                stack[-2], stack[-1] = self.temp(len(stack) - 2), self.temp(len(stack) - 1)
+            elif name == "NOP" or name == "LOCAL_SLOTS":
+                pass
+            else:
+                raise NotImplementedError(f"Not implemented for {name}")
+
+        indices[len(block.body)] = len(self.instructions)
+        for index, target in patches:
+            op, condition, _, _ = self.instructions[index]
+            if register_instruction_names[op] == "JUMP":
+                self.instructions[index] = (op, indices[target], 0, 0)
+            else:
+                self.instructions[index] = (op, condition, indices[target], 0)
+
+        return RegisterBlock(block, self.instructions)
+
+def lower_block(block: Block) -> RegisterBlock:
+    """
+    Lowers `block` (but not the function blocks in its constants) to the
+    register instruction set.
+    """
+
+    return RegisterLowering(block).lower()
@@ -0,0 +1,77 @@
+from codegen.block import Block
+from codegen.instructions import stack_effect
+
+def stack_depths(block: Block) -> dict[int, int]:
+    """
+    Computes the stack depth on entry to every reachable instruction of
+    `block` by following all jump paths from its start. If the end of the
+    body is reachable, its offset is included too. Raises ValueError
+    if two paths reach an instruction with different depths, or if an
+    instruction would pop more values than there are.
+    """
+
+    instructions = {offset: (name, arg) for offset, name, arg in block.instructions()}
+    next_offsets = {}
+    previous = None
+    for offset in instructions:
+        if previous is not None:
+            next_offsets[previous] = offset
+        previous = offset
+    if previous is not None:
+        next_offsets[previous] = len(block.body)
+
+    depths = {}
+    pending = [(0, 0)]
+    while pending:
+        offset, depth = pending.pop()
+        if offset in depths:
+            if depths[offset] != depth:
+                raise ValueError(
+                    f"{block.name}+{offset:04X} is reached with stack depths {depths[offset]} and {depth}")
+            continue
+        depths[offset] = depth
+        if offset == len(block.body):
+            # running off the end of the body, as modules do
+            continue
+
+        name, arg = instructions[offset]
+        pops, pushes = stack_effect(name, arg)
+        if pops > depth:
+            raise ValueError(f"{block.name}+{offset:04X} {name} pops {pops} values but the stack holds {depth}")
+        depth = depth - pops + pushes
+
+        match name:
+            case "JUMP_FORWARD":
+                pending.append((offset + arg, depth))
+            case "JUMP_BACKWARD":
+                pending.append((offset - arg, depth))
+            case "JUMP_FORWARD_TRUE" | "JUMP_FORWARD_FALSE":
+                pending.append((offset + arg, depth))
+                pending.append((next_offsets[offset], depth))
+            case "JUMP_IF_FALSE_OR_POP" | "JUMP_IF_TRUE_OR_POP":
+                # the value is only popped when they don't jump
+                pending.append((offset + arg, depth + 1))
+                pending.append((next_offsets[offset], depth))
+            case "RETURN" | "TAIL_CALL":
+                pass
+            case _:
+                pending.append((next_offsets[offset], depth))
+
+    return depths
+
+def max_stack_depth(block: Block, depths: dict[int, int] | None = None) -> int:
+    """
+    Computes the most values `block` ever holds on its stack at once,
+    reusing `depths` from `stack_depths` if they are already known.
+    """
+
+    if depths is None:
+        depths = stack_depths(block)
+    deepest = 0
+    for offset, name, arg in block.instructions():
+        depth = depths.get(offset)
+        if depth is None:
+            continue
+        pops, pushes = stack_effect(name, arg)
+        deepest = max(deepest, depth, depth - pops + pushes)
+    return deepest
@@ -0,0 +1,98 @@
+import json
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.instructions import instruction_operand_sizes
+
+class OpcodeStats:
+    """
+    Frequencies of single opcodes and of adjacent opcode pairs, plus the
+    widths of their operands, for picking superinstructions and operand
+    encodings.
+
+    For each operand two widths are tracked: the bytes it is encoded in and
+    the fewest bytes its value would fit in.
+    """
+    counts: dict[str, int]
+    pairs: dict[tuple[str, str], int]
+    operand_bytes: dict[str, int]
+    operand_min_bytes: dict[str, int]
+
+    def __init__(self):
+        self.counts = {}
+        self.pairs = {}
+        self.operand_bytes = {}
+        self.operand_min_bytes = {}
+
+    def add(self, name: str, arg: int | None, previous: str | None):
+        """
+        Counts one instruction. `previous` is the instruction before it in
+        the same block, if any.
+        """
+
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if previous is not None:
+            pair = (previous, name)
+            self.pairs[pair] = self.pairs.get(pair, 0) + 1
+        if arg is not None:
+            self.operand_bytes[name] = self.operand_bytes.get(name, 0) + instruction_operand_sizes[name]
+            min_bytes = max(1, (arg.bit_length() + 7) // 8)
+            self.operand_min_bytes[name] = self.operand_min_bytes.get(name, 0) + min_bytes
+
+    def add_block(self, block: Block):
+        """
+        Counts every instruction in `block` and in the function blocks in
+        its constants, in layout order.
+        """
+
+        previous = None
+        for _, name, arg in block.instructions():
+            self.add(name, arg, previous)
+            previous = name
+
+        for const in block.consts:
+            if type(const) is FunctionLiteralConst:
+                self.add_block(const.block)
+
+    def merge(self, other: 'OpcodeStats'):
+        for target, source in (
+                (self.counts, other.counts),
+                (self.pairs, other.pairs),
+                (self.operand_bytes, other.operand_bytes),
+                (self.operand_min_bytes, other.operand_min_bytes)):
+            for key, value in source.items():
+                target[key] = target.get(key, 0) + value
+
+    def to_json(self) -> str:
+        """
+        Formats the statistics as JSON with sorted keys, so that the output
+        for two compiler versions can be diffed directly.
+        """
+
+        total = sum(self.counts.values())
+        total_pairs = sum(self.pairs.values())
+
+        opcodes = {}
+        for name, count in self.counts.items():
+            entry = {
+                "count": count,
+                "frequency": round(count / total, 6),
+            }
+            if name in self.operand_bytes:
+                entry["avg_operand_bytes"] = round(self.operand_bytes[name] / count, 3)
+                entry["avg_operand_min_bytes"] = round(self.operand_min_bytes[name] / count, 3)
+            opcodes[name] = entry
+
+        pairs = {
+            f"{first} {second}": {
+                "count": count,
+                "frequency": round(count / total_pairs, 6),
+            }
+            for (first, second), count in self.pairs.items()
+        }
+
+        return json.dumps({
+            "instructions": total,
+            "opcodes": opcodes,
+            "pairs": pairs,
+        }, indent=2, sort_keys=True)
@@ -0,0 +1,96 @@
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.instructions import instruction_names, instruction_operand_sizes, quickened_instructions
+from codegen.stackdepth import stack_depths, max_stack_depth
+
+class VerifyError(ValueError):
+    """
+    Raised for bytecode that can't be run safely. The message names the
+    block and, where there is one, the offending instruction.
+    """
+
+def _fail(block: Block, message: str, offset: int | None = None):
+    location = block.name if offset is None else f"{block.name}+{offset:04X}"
+    raise VerifyError(f"{location}: {message}")
+
+def verify_block(block: Block, recursive: bool = True):
+    """
+    Checks that `block` is well formed, so that the VM never has to:
+
+    - every opcode exists, isn't one only the VM creates, and its operand
+      is complete,
+    - the body isn't a placeholder for one that was never generated,
+    - every local, constant, name and deref operand is in range,
+    - every jump lands on an instruction or the end of the body,
+    - variables copied into the closure are the locals right after the
+      arguments,
+    - all paths agree on the stack depth, never pop an empty stack, and
+      the deepest point matches `max_stack_depth`,
+    - function blocks return rather than run off the end of their body.
+
+    With `recursive`, the function blocks in its constants are checked too.
+    """
+
+    body = block.body
+    offsets = []
+    pos = 0
+    while pos < len(body):
+        offsets.append(pos)
+        name = instruction_names.get(body[pos])
+        if name is None:
+            _fail(block, f"unknown opcode {body[pos]:#04x}", pos)
+        if name in quickened_instructions:
+            _fail(block, f"{name} is only created by the VM", pos)
+        if name == "LAZY_BODY":
+            _fail(block, "function body was never generated", pos)
+        size = 1 + instruction_operand_sizes.get(name, 0)
+        if pos + size > len(body):
+            _fail(block, f"{name} is missing its operand", pos)
+        pos += size
+    boundaries = set(offsets)
+    boundaries.add(len(body))
+
+    deref_count = len(block.cell_names) + len(block.free_names)
+    operand_limits = {
+        "LOAD_LOCAL": len(block.local_names),
+        "STORE_LOCAL": len(block.local_names),
+        "LOAD_GLOBAL": len(block.global_names),
+        "STORE_GLOBAL": len(block.global_names),
+        "LOAD_CONST": len(block.consts),
+        "LOAD_NAME": len(block.names),
+        "STORE_NAME": len(block.names),
+        "LOAD_DEREF": deref_count,
+        "STORE_DEREF": deref_count,
+    }
+
+    for offset, name, arg in block.instructions():
+        if name in operand_limits and arg >= operand_limits[name]:
+            _fail(block, f"{name} operand {arg} is out of range", offset)
+        if name == "JUMP_BACKWARD":
+            target = offset - arg
+        elif name.startswith("JUMP_"):
+            target = offset + arg
+        else:
+            continue
+        if target not in boundaries:
+            _fail(block, f"{name} jumps to {target:04X}, which isn't an instruction", offset)
+
+    if block.context == 'function' and block.argument_count > len(block.local_names):
+        _fail(block, f"{block.argument_count} arguments but only {len(block.local_names)} locals")
+    copied = block.local_names[block.argument_count:block.argument_count + len(block.copied_names)]
+    if copied != block.copied_names:
+        _fail(block, "copied variables aren't the locals right after the arguments")
+
+    try:
+        depths = stack_depths(block)
+    except ValueError as error:
+        raise VerifyError(str(error)) from error
+    if block.context == 'function' and len(body) in depths:
+        _fail(block, "function body can run off its end without returning")
+    if (depth := max_stack_depth(block, depths)) != block.max_stack_depth:
+        _fail(block, f"max stack depth is {depth}, not {block.max_stack_depth}")
+
+    if recursive:
+        for const in block.consts:
+            if type(const) is FunctionLiteralConst:
+                verify_block(const.block)
@@ -8,4 +8,26 @@ def write_int_as_uint32(bytes: bytearray, to_write: int):
     bytes.extend(to_write.to_bytes(4, byteorder='big', signed=False))
 
 def overwrite_int_as_uint16(bytes: bytearray, to_write: int, index: int):
-    bytes[index:index+2] = to_write.to_bytes(2, byteorder='big', signed=False)
\ No newline at end of file
+    bytes[index:index+2] = to_write.to_bytes(2, byteorder='big', signed=False)
+
+def write_varint(bytes: bytearray, to_write: int):
+    """
+    Write an unsigned integer 7 bits at a time, least significant group
+    first, setting the high bit of every byte except the last.
+    """
+    while to_write >= 0x80:
+        bytes.append((to_write & 0x7F) | 0x80)
+        to_write >>= 7
+    bytes.append(to_write)
+
+def write_varsize1632(bytes: bytearray, to_write: int):
+    if to_write < 65535:
+        write_int_as_uint16(bytes, to_write)
+    else:
+        write_int_as_uint16(bytes, 65535)
+        write_int_as_uint32(bytes, to_write)
+
+def write_utf8(bytes: bytearray, to_write: str):
+    encoded = to_write.encode("utf-8")
+    write_varsize1632(bytes, len(encoded))
+    bytes.extend(encoded)
@@ -0,0 +1,76 @@
+from typing import Collection
+
+from lex.lexer import Lexer
+from lex.diagnostic import Diagnostic
+from parse.parser import Parser
+from parse.parsenode import BlockNode, LazyBodyNode
+from process.binding import Resolver
+from process.types import TypeInference
+from codegen.codegen import Codegen
+from codegen.block import Block
+from vm.builtins import builtins
+
+class CompileError(Exception):
+    """
+    Raised when a source file has lex or parse errors; `diagnostics` holds
+    all of them, in source order.
+    """
+    diagnostics: list[Diagnostic]
+
+    def __init__(self, diagnostics: list[Diagnostic]):
+        super().__init__("\n".join(map(str, diagnostics)))
+        self.diagnostics = diagnostics
+
+def compile_source(
+        source: str,
+        locations: bool = True,
+        builtin_names: Collection[str] = builtins.keys(),
+        tail_calls: bool = True,
+        infer_types: bool = True,
+        inline_budget: int | None = 16,
+        lazy_functions: bool = False,
+        share_blocks: bool = True,
+        workers: int = 1) -> Block:
+    """
+    Compiles SPY source into a module block. With `locations`, blocks carry
+    location tables mapping their bytecode back to the source. With
+    `tail_calls`, calls in tail position reuse their caller's frame. With
+    `infer_types`, operations on values of known types are emitted as
+    typed instructions. Calls to small functions are inlined up to
+    `inline_budget`; see `Codegen`.
+
+    With `lazy_functions`, the bodies of functions outside of any other
+    block are only parsed, resolved and generated when they are first
+    called, so errors in them are only raised by that call. Those bodies
+    get no typed instructions. With `share_blocks`, identical function
+    literals share one block. With more than one of `workers`, functions
+    are generated in that many processes; see `Codegen`.
+    """
+
+    lexer = Lexer(source)
+    tokens = lexer.lex()
+    parser = Parser(tokens, lexer.line_index, lazy_functions)
+    root = parser.parse_program()
+
+    diagnostics = lexer.diagnostics + parser.diagnostics
+    if diagnostics:
+        raise CompileError(sorted(diagnostics, key=lambda d: d.position))
+
+    resolver = Resolver(root, builtin_names)
+    resolver.resolve()
+
+    types = None
+    if infer_types:
+        types = TypeInference(resolver)
+        types.infer()
+
+    def parse_body(body: LazyBodyNode) -> BlockNode:
+        parser.diagnostics = []
+        block = parser.parse_lazy_body(body)
+        if parser.diagnostics:
+            raise CompileError(parser.diagnostics)
+        return block
+
+    codegen = Codegen(resolver, lexer.line_index if locations else None, tail_calls, types, inline_budget, parse_body,
+        share_blocks, workers)
+    return codegen.compile_program(root, resolver)
@@ -0,0 +1,38 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Literal
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """
+    A single error reported while lexing or parsing. `line` and `column`
+    are 1-based.
+    """
+    stage: Literal['lex', 'parse']
+    message: str
+    position: tuple[int, int]
+    line: int
+    column: int
+
+    def __str__(self):
+        return f"{self.line}:{self.column}: {self.stage} error: {self.message}"
+
+class LineIndex:
+    """
+    Maps offsets into a source string to 1-based (line, column) pairs.
+
+    The start offset of every line is computed once up front, so each
+    lookup is a binary search rather than a rescan of the source.
+    """
+    line_starts: list[int]
+
+    def __init__(self, source: str):
+        self.line_starts = [0]
+        newline = source.find('\n')
+        while newline != -1:
+            self.line_starts.append(newline + 1)
+            newline = source.find('\n', newline + 1)
+
+    def line_col(self, offset: int) -> tuple[int, int]:
+        line = bisect_right(self.line_starts, offset)
+        return (line, offset - self.line_starts[line - 1] + 1)
@@ -1,7 +1,10 @@
 from lex.token import Token, TokenType, Keywords
+from lex.diagnostic import Diagnostic, LineIndex
 
 class Lexer():
     tokens: list[Token]
+    diagnostics: list[Diagnostic]
+    line_index: LineIndex
     pos: int
     whitespace_before: bool
 
@@ -9,10 +12,13 @@ class Lexer():
         self.source = source
         self.pos = 0
         self.tokens = []
+        self.diagnostics = []
+        self.line_index = LineIndex(source)
     
     def lex(self) -> list[Token]:
         self.pos = 0
         self.tokens = []
+        self.diagnostics = []
         self.whitespace_before = False
 
         while (next := self.peek()) is not None:
@@ -109,7 +115,11 @@ class Lexer():
                     self.consume()
 
                 case _:
-                    raise Exception("lexer: unrecognized character")
+                    # skip the character and keep going so that every bad
+                    # character in the source gets reported in one pass
+                    self.error(f"unrecognized character {next!r}", 1)
+                    self.whitespace_before = True
+                    self.consume()
         
         self.emit('eof', 0)
         return self.tokens
@@ -147,7 +157,8 @@ class Lexer():
             offset += 1
         
         if self.peek(offset) is None:
-            raise Exception("unterminated string literal")
+            self.error("unterminated string literal", offset)
+            return self.emit('string', offset)
         
         offset += 1
         return self.emit('string', offset)
@@ -167,6 +178,16 @@ class Lexer():
         else:
             self.emit('identifier', offset)
 
+    def error(self, message: str, length: int):
+        line, column = self.line_index.line_col(self.pos)
+        self.diagnostics.append(Diagnostic(
+            stage='lex',
+            message=message,
+            position=(self.pos, self.pos + length),
+            line=line,
+            column=column,
+        ))
+
     def peek(self, offset = 0):
         if self.pos + offset < len(self.source):
             return self.source[self.pos + offset]
@@ -4,6 +4,7 @@ from parse.prettyprint import pretty_print
 from process.binding import Resolver
 from parse.idintern import IdIntern
 from codegen.block import Block
+from vm.builtins import builtins
 
 from time import perf_counter_ns
 
@@ -28,7 +29,8 @@ overall_start = perf_counter_ns()
 
 print("lexing", end="")
 start = perf_counter_ns()
-lexed = Lexer(program).lex()
+lexer = Lexer(program)
+lexed = lexer.lex()
 end = perf_counter_ns()
 print(f" - done! took {format_time_ns(end - start)}")
 
@@ -38,10 +40,19 @@ print("\n".join(map(lambda l: str(l), lexed)))
 
 print("parsing", end="")
 start = perf_counter_ns()
-root = Parser(lexed).parse_program()
+parser = Parser(lexed, lexer.line_index)
+root = parser.parse_program()
 end = perf_counter_ns()
 print(f" - done! took {format_time_ns(end - start)}")
 
+diagnostics = lexer.diagnostics + parser.diagnostics
+if diagnostics:
+    print()
+    print(f"{len(diagnostics)} error(s):")
+    for diagnostic in sorted(diagnostics, key=lambda d: d.position):
+        print(diagnostic)
+    exit(1)
+
 intern = IdIntern()
 print()
 print("AST:")
@@ -49,7 +60,7 @@ pretty_print(root, "", True, intern)
 
 print("binding", end="")
 start = perf_counter_ns()
-resolver = Resolver(root)
+resolver = Resolver(root, builtins.keys())
 resolver.resolve()
 end = perf_counter_ns()
 print(f" - done! took {format_time_ns(end - start)}")
@@ -60,7 +71,7 @@ for key, value in resolver.bindings.items():
     key_id = intern.get_id_or_none(id(key))
     val_id = intern.get_id_or_none(id(value.decl))
 
-    print(f"{key_id} `{key.identifier.token.content}` bound to declaration {val_id}")
+    print(f"{key_id} `{key.token.content}` bound to declaration {val_id}")
 
 # block = compile_program(root, resolver)
 
@@ -0,0 +1,297 @@
+from array import array
+from typing import get_args
+
+from lex.token import Token
+from parse.parsenode import *
+
+# How the fields of each node type are stored. Child fields become the
+# node's children, in this order:
+#
+#   one       a single child
+#   optional  a child that may be None, stored as an absent node
+#   many      a tuple of children, running to the last child
+#   cases     (condition or None, block) pairs, running to the last child
+#
+# and the rest live in the node's own columns:
+#
+#   token     the index of the token in `token`
+#   tokens    the index of the first token in `token` and the count in `extra`
+#   flag      0 or 1 in `extra`
+#   binary, prefix, postfix
+#             the index of the operator in `extra`
+_layouts: dict[type, tuple[tuple[str, str], ...]] = {
+    ProgramNode: (("statements", "many"),),
+    LetStatementNode: (("name", "one"), ("value", "one"), ("mutable", "flag")),
+    ExpressionStatementNode: (("expr", "one"),),
+    ErrorNode: (("tokens", "tokens"),),
+    NumberLiteralExpressionNode: (("token", "token"),),
+    IdentifierExpressionNode: (("token", "token"),),
+    IdentifierNode: (("token", "token"),),
+    ObjectLiteralExpressionNode: (("contents", "many"),),
+    ObjectLiteralEntryNode: (("name", "one"), ("value", "one"), ("mutable", "flag")),
+    StringLiteralExpressionNode: (("token", "token"),),
+    BoolLiteralExpressionNode: (("token", "token"),),
+    BinaryExpressionNode: (("left", "one"), ("right", "one"), ("operator", "binary")),
+    AssignmentExpressionNode: (("left", "one"), ("value", "one")),
+    PrefixExpressionNode: (("operand", "one"), ("operator", "prefix")),
+    PostfixExpressionNode: (("operand", "one"), ("operator", "postfix")),
+    BlockNode: (("statements", "many"),),
+    IfElseExpressionNode: (("cases", "cases"),),
+    LoopExpressionNode: (("body", "one"),),
+    BreakExpressionNode: (("expr", "optional"),),
+    ContinueExpressionNode: (),
+    CallExpressionNode: (("callee", "one"), ("arglist", "one")),
+    IndexExpressionNode: (("left", "one"), ("index", "one")),
+    ArgumentListNode: (("arguments", "many"),),
+    ArgumentNode: (("expr", "one"),),
+    FunctionLiteralExpressionNode: (("paramlist", "one"), ("body", "one")),
+    ParameterListNode: (("parameters", "many"),),
+    ParameterNode: (("name", "one"),),
+}
+
+_operators = {
+    "binary": get_args(BinaryOperator),
+    "prefix": get_args(PrefixOperator),
+    "postfix": get_args(PostfixOperator),
+}
+
+# Kind 0 is an absent optional child; node types are numbered from 1
+_ABSENT = 0
+_node_types: list[type | None] = [None, *_layouts]
+_kinds = {node_type: kind for kind, node_type in enumerate(_node_types) if node_type is not None}
+
+class AstArena:
+    """
+    A syntax tree stored as flat columns instead of one object per node.
+
+    Each node is an index into `kinds`, `first_child`, `next_sibling`,
+    `token` and `extra`, in preorder, so the root is node 0. Children are
+    linked through `first_child` and `next_sibling`, with -1 for none.
+    `token` indexes `tokens` for nodes that hold a token, and `extra` holds
+    the flag, operator or token count of nodes that have one.
+
+    `node` returns a view of a node that can be used in place of the
+    dataclass from `parse.parsenode`: it is an instance of that class and
+    computes its fields from the columns. Each node has a single view,
+    created on first use, so views can be compared by identity like the
+    nodes they stand for.
+    """
+    tokens: list[Token]
+    kinds: array
+    first_child: array
+    next_sibling: array
+    token: array
+    extra: array
+
+    def __init__(self, tokens: list[Token]):
+        self.tokens = list(tokens)
+        self.kinds = array('B')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.token = array('i')
+        self.extra = array('i')
+        self._views: list['NodeView | None'] = []
+        self._token_indices: dict[int, int] = {}
+
+    @classmethod
+    def from_tree(cls, root: ProgramNode, tokens: list[Token]) -> 'AstArena':
+        """
+        Flattens the tree under `root`, whose tokens come from `tokens`.
+        The tree can be dropped afterwards.
+        """
+
+        arena = cls(tokens)
+        arena._token_indices = {id(token): index for index, token in enumerate(arena.tokens)}
+        arena._add(root)
+        arena._token_indices = {}
+        arena._views = [None] * len(arena.kinds)
+        return arena
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @property
+    def root(self) -> ProgramNode:
+        return self.node(0)
+
+    def _token_index(self, token: Token) -> int:
+        index = self._token_indices.get(id(token))
+        if index is None:
+            # a token the parser made up rather than read
+            index = len(self.tokens)
+            self.tokens.append(token)
+            self._token_indices[id(token)] = index
+        return index
+
+    def _new(self, kind: int) -> int:
+        self.kinds.append(kind)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.token.append(-1)
+        self.extra.append(0)
+        return len(self.kinds) - 1
+
+    def _add(self, node: Node | None) -> int:
+        if node is None:
+            return self._new(_ABSENT)
+
+        node_type = type(node)
+        index = self._new(_kinds[node_type])
+        children = []
+        for name, shape in _layouts[node_type]:
+            value = getattr(node, name)
+            match shape:
+                case "one" | "optional":
+                    children.append(value)
+                case "many":
+                    children.extend(value)
+                case "cases":
+                    for condition, body in value:
+                        children.append(condition)
+                        children.append(body)
+                case "token":
+                    self.token[index] = self._token_index(value)
+                case "tokens":
+                    # the skipped tokens are consecutive in the source
+                    if value:
+                        self.token[index] = self._token_index(value[0])
+                    self.extra[index] = len(value)
+                case "flag":
+                    self.extra[index] = int(value)
+                case _:
+                    self.extra[index] = _operators[shape].index(value)
+
+        previous = -1
+        for child in children:
+            child_index = self._add(child)
+            if previous == -1:
+                self.first_child[index] = child_index
+            else:
+                self.next_sibling[previous] = child_index
+            previous = child_index
+        return index
+
+    def node(self, index: int) -> Node | None:
+        """
+        Gets the view of node `index`, or None if it is an absent child.
+        """
+
+        view = self._views[index]
+        if view is None:
+            kind = self.kinds[index]
+            if kind == _ABSENT:
+                return None
+            view = object.__new__(_view_types[kind])
+            object.__setattr__(view, "_arena", self)
+            object.__setattr__(view, "_index", index)
+            self._views[index] = view
+        return view
+
+    def children(self, index: int, start: int = 0) -> list[int]:
+        """
+        The indices of node `index`'s children, from the `start`th on.
+        """
+
+        children = []
+        child = self.first_child[index]
+        while child != -1:
+            if start > 0:
+                start -= 1
+            else:
+                children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def child(self, index: int, position: int) -> int:
+        child = self.first_child[index]
+        for _ in range(position):
+            child = self.next_sibling[child]
+        return child
+
+    def leading_token(self, index: int) -> Token | None:
+        """
+        The first token of node `index` in the source, as
+        `parse.parsenode.leading_token` finds it.
+        """
+
+        while True:
+            node_type = _node_types[self.kinds[index]]
+            if self.token[index] != -1:
+                return self.tokens[self.token[index]]
+            if node_type is ArgumentListNode or node_type is ParameterListNode:
+                return None
+            if node_type is FunctionLiteralExpressionNode:
+                # its first parameter, or its body if it has none
+                paramlist = self.first_child[index]
+                first_parameter = self.first_child[paramlist]
+                index = first_parameter if first_parameter != -1 else self.next_sibling[paramlist]
+                continue
+            index = self.first_child[index]
+            if index != -1 and self.kinds[index] == _ABSENT:
+                # an if without a condition starts at its block
+                index = self.next_sibling[index]
+            if index == -1:
+                return None
+
+class NodeView:
+    """
+    Base of the arena views. Views are compared and hashed by identity,
+    which for views is the same as by node.
+    """
+    __slots__ = ()
+    _arena: AstArena
+    _index: int
+
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def leading_token(self) -> Token | None:
+        return self._arena.leading_token(self._index)
+
+    def __repr__(self):
+        return f"<{type(self).__bases__[1].__name__} view {self._index}>"
+
+def _field_property(name: str, shape: str, position: int) -> property:
+    match shape:
+        case "one" | "optional":
+            def get(self):
+                arena = self._arena
+                return arena.node(arena.child(self._index, position))
+        case "many":
+            def get(self):
+                arena = self._arena
+                return tuple(arena.node(child) for child in arena.children(self._index, position))
+        case "cases":
+            def get(self):
+                arena = self._arena
+                nodes = [arena.node(child) for child in arena.children(self._index, position)]
+                return tuple(zip(nodes[0::2], nodes[1::2]))
+        case "token":
+            def get(self):
+                arena = self._arena
+                return arena.tokens[arena.token[self._index]]
+        case "tokens":
+            def get(self):
+                arena = self._arena
+                start = arena.token[self._index]
+                return tuple(arena.tokens[start:start + arena.extra[self._index]]) if start != -1 else ()
+        case "flag":
+            def get(self):
+                return self._arena.extra[self._index] == 1
+        case _:
+            operators = _operators[shape]
+            def get(self):
+                return operators[self._arena.extra[self._index]]
+    get.__name__ = name
+    return property(get)
+
+def _view_type(node_type: type) -> type:
+    namespace = {"__slots__": ("_arena", "_index")}
+    position = 0
+    for name, shape in _layouts[node_type]:
+        namespace[name] = _field_property(name, shape, position)
+        if shape in ("one", "optional"):
+            position += 1
+    return type(f"{node_type.__name__}View", (NodeView, node_type), namespace)
+
+_view_types: list[type | None] = [None, *(_view_type(node_type) for node_type in _layouts)]
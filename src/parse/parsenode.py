@@ -10,44 +10,53 @@ Node = Union[
     'NumberLiteralExpressionNode',
     'IdentifierExpressionNode',
     'IdentifierNode',
-    'NumberLiteralNode',
-    'StringLiteralNode',
-    'BoolLiteralNode',
     'Expression',
     'AtomicExpression',
     'ArgumentListNode',
     'ParameterListNode',
     'BlockNode',
+    'LazyBodyNode',
     'ObjectLiteralEntryNode',
     'AssignmentExpressionNode',
     'ArgumentNode',
     'ParameterNode',
+    'ErrorNode',
 ]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ProgramNode():
     statements: list['TopLevelStatement']
 
 TopLevelStatement = Union[
     'LetStatementNode',
     'ExpressionStatementNode',
+    'ErrorNode',
 ]
 
 Statement = Union [
     'LetStatementNode',
     'ExpressionStatementNode',
+    'ErrorNode',
 ]
 
-@dataclass(frozen=True) 
+@dataclass(frozen=True, slots=True)
 class LetStatementNode():
     name: 'IdentifierNode'
     value: 'Expression'
     mutable: bool
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ExpressionStatementNode():
     expr: 'Expression'
 
+@dataclass(frozen=True, slots=True)
+class ErrorNode():
+    """
+    Stands in for a statement that failed to parse. `tokens` are the tokens
+    that were skipped while recovering from the error.
+    """
+    tokens: tuple[Token, ...]
+
 Expression = Union[
     'PrefixExpressionNode',
     'PostfixExpressionNode',
@@ -71,23 +80,23 @@ AtomicExpression = Union[
     'FunctionLiteralExpressionNode',
 ]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class NumberLiteralExpressionNode():
-    number: 'NumberLiteralNode'
-
-@dataclass(frozen=True)
-class NumberLiteralNode():
     token: Token
 
     def __init__(self, token: Token):
         assert token.type == 'number'
         object.__setattr__(self, "token", token)
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IdentifierExpressionNode():
-    identifier: 'IdentifierNode'
+    token: Token
 
-@dataclass(frozen=True)
+    def __init__(self, token: Token):
+        assert token.type == 'identifier'
+        object.__setattr__(self, "token", token)
+
+@dataclass(frozen=True, slots=True)
 class IdentifierNode():
     token: Token
 
@@ -95,34 +104,26 @@ class IdentifierNode():
         assert token.type == 'identifier'
         object.__setattr__(self, "token", token)
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ObjectLiteralExpressionNode():
-    contents: 'list[ObjectLiteralEntryNode]'
+    contents: 'tuple[ObjectLiteralEntryNode, ...]'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ObjectLiteralEntryNode():
     name: Expression
     value: Expression
     mutable: bool
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StringLiteralExpressionNode():
-    string: 'StringLiteralNode'
-
-@dataclass(frozen=True)
-class StringLiteralNode():
     token: Token
 
     def __init__(self, token: Token):
         assert token.type == 'string'
         object.__setattr__(self, "token", token)
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BoolLiteralExpressionNode():
-    bool: 'BoolLiteralNode'
-
-@dataclass(frozen=True)
-class BoolLiteralNode():
     token: Token
 
     def __init__(self, token: Token):
@@ -133,13 +134,13 @@ class BoolLiteralNode():
     def get_value(self):
         return True if self.token.content == Keyword_true else False 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BinaryExpressionNode():
     left: Expression
     right: Expression
     operator: 'BinaryOperator'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AssignmentExpressionNode():
     left: IdentifierExpressionNode
     value: Expression
@@ -169,63 +170,137 @@ PostfixOperator = Literal[
     None,
 ]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PrefixExpressionNode():
     operand: Expression
     operator: PrefixOperator
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PostfixExpressionNode():
     operand: Expression
     operator: PostfixOperator
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BlockNode():
     statements: tuple[Statement, ...]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IfElseExpressionNode():
     cases: tuple[tuple[Expression | None, BlockNode]]
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class LoopExpressionNode():
     body: BlockNode
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BreakExpressionNode():
     expr: Expression|None
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ContinueExpressionNode():
     pass
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CallExpressionNode():
     callee: Expression
     arglist: 'ArgumentListNode'
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class IndexExpressionNode():
     left: Expression
     index: Expression
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ArgumentListNode():
     arguments: tuple['ArgumentNode']
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ArgumentNode():
     expr: Expression
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FunctionLiteralExpressionNode():
     paramlist: 'ParameterListNode'
-    body: BlockNode
-
-@dataclass(frozen=True)
+    body: 'BlockNode | LazyBodyNode'
+
+@dataclass(frozen=True, slots=True)
+class LazyBodyNode():
+    """
+    The body of a function literal the parser skipped; see `Parser`.
+    `start` and `end` are the indices of its first token and of the `end`
+    closing it. `names` are the identifiers it mentions and `assigned`
+    those it may assign to, so the rest of the program can be analysed
+    without it.
+    """
+    start: int
+    end: int
+    names: frozenset[str]
+    assigned: frozenset[str]
+
+@dataclass(frozen=True, slots=True)
 class ParameterListNode():
     parameters: tuple['ParameterNode']
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ParameterNode():
-    name: IdentifierNode
\ No newline at end of file
+    name: IdentifierNode
+
+def leading_token(node: Node) -> Token | None:
+    """
+    Returns the first token of `node` in the source, or None if `node` has
+    no tokens of its own (e.g. an empty block).
+
+    Nodes don't keep their own spans, so this follows the leftmost child
+    down to a node that holds a token. Code generation calls this for most
+    nodes, so it dispatches on exact types, most common first, rather than
+    using `match`.
+    """
+
+    while True:
+        kind = type(node)
+        if kind is IdentifierExpressionNode or kind is NumberLiteralExpressionNode:
+            return node.token
+        elif kind is BinaryExpressionNode or kind is IndexExpressionNode or kind is AssignmentExpressionNode:
+            node = node.left
+        elif kind is CallExpressionNode:
+            node = node.callee
+        elif kind is ExpressionStatementNode or kind is ArgumentNode:
+            node = node.expr
+        elif kind is LetStatementNode:
+            return node.name.token
+        elif kind is StringLiteralExpressionNode or kind is BoolLiteralExpressionNode \
+                or kind is IdentifierNode:
+            return node.token
+        elif kind is PrefixExpressionNode or kind is PostfixExpressionNode:
+            node = node.operand
+        elif kind is IfElseExpressionNode:
+            cond, body = node.cases[0]
+            node = cond if cond is not None else body
+        elif kind is BlockNode or kind is ProgramNode:
+            if not node.statements:
+                return None
+            node = node.statements[0]
+        elif kind is LoopExpressionNode:
+            node = node.body
+        elif kind is BreakExpressionNode:
+            if node.expr is None:
+                return None
+            node = node.expr
+        elif kind is ObjectLiteralExpressionNode:
+            if not node.contents:
+                return None
+            node = node.contents[0]
+        elif kind is ObjectLiteralEntryNode:
+            node = node.name
+        elif kind is FunctionLiteralExpressionNode:
+            if node.paramlist.parameters:
+                node = node.paramlist.parameters[0].name
+            else:
+                node = node.body
+        elif kind is ErrorNode:
+            return node.tokens[0] if node.tokens else None
+        elif hasattr(node, "leading_token"):
+            # nodes stored some other way (see `parse.arena`) find it themselves
+            return node.leading_token()
+        else:
+            return None
@@ -1,15 +1,49 @@
-from typing import get_args, cast
+from typing import Callable, get_args, cast
 
 from lex.token import *
+from lex.diagnostic import Diagnostic, LineIndex
 from parse.parsenode import *
 
+class ParseError(Exception):
+    """
+    Raised while parsing a statement; caught at the nearest statement
+    boundary, which records it as a diagnostic and resynchronizes.
+    """
+    token: Token
+
+    def __init__(self, message: str, token: Token):
+        super().__init__(message)
+        self.token = token
+
 class Parser:
+    """
+    Parses a token stream into a `ProgramNode`.
+
+    Syntax errors do not abort the parse. Each one is recorded in
+    `diagnostics`, the offending statement is replaced by an `ErrorNode` and
+    parsing resumes at the next synchronization point (`end`, `let`, or
+    another token that can only start a statement), so a single pass
+    reports every error in the input. Without a `line_index`, positions
+    are reported as columns on line 1.
+
+    With `lazy_functions`, the bodies of function literals outside of any
+    other block are only scanned for their `end`, and left as a
+    `LazyBodyNode` to be parsed by `parse_lazy_body` when they are needed.
+    Errors in such a body are only found then.
+    """
     tokens: list[Token]
+    diagnostics: list[Diagnostic]
     pos: int
+    lazy_functions: bool
 
-    def __init__(self, tokens: list[Token]):
+    def __init__(self, tokens: list[Token], line_index: LineIndex | None = None, lazy_functions: bool = False):
         self.pos = 0
         self.tokens = tokens
+        self.diagnostics = []
+        self.line_index = line_index if line_index is not None else LineIndex("")
+        self.lazy_functions = lazy_functions
+        # Number of blocks being parsed the current token is in
+        self.depth = 0
 
     precedence_assignment = 0
     precedence_or = 1
@@ -33,34 +67,36 @@ class Parser:
     def unary_power(power):
         return (power + 1) * 2
     
-    @staticmethod
-    def get_prefix_precedence(token: Token):        
-        if token.type == 'minus' or token.type == 'plus':
-            return Parser.unary_power(Parser.precedence_unary_minus)
-        if token.type == 'bang':
-            return Parser.unary_power(Parser.precedence_not)
-        else: return 0
-
-    @staticmethod
-    def get_postfix_precedence(token: Token):
-        if token.type == 'lbracket' or token.type == 'lparen':
-            return Parser.unary_power(Parser.precedence_index_call)
-        return 0
-    
-    @staticmethod
-    def get_binary_precedence(token: Token): 
-        if token.type == "asterisk" or token.type == "slash":
-            return Parser.binary_left_associative_powers(Parser.precedence_multiplicative)
-        elif token.type == "plus" or token.type == "minus":
-            return Parser.binary_left_associative_powers(Parser.precedence_additive)
-        elif token.type == "period":
-            return Parser.binary_left_associative_powers(Parser.precedence_index_call)
-        elif token.type in {'less', 'greater', 'lessequals', 'greaterequals', 'equalsequals', 'bangequals'}:
-            return Parser.binary_left_associative_powers(Parser.precedence_comparison)
-        elif token.type == "equals":
-            return Parser.binary_left_associative_powers(Parser.precedence_assignment)
-        else:
-            return (0, 0)
+    # the precedence of each operator, by token type; see the tables built
+    # from these at the end of the module
+    prefix_precedences = {
+        'minus': precedence_unary_minus,
+        'plus': precedence_unary_minus,
+        'bang': precedence_not,
+    }
+    postfix_precedences = {
+        'lbracket': precedence_index_call,
+        'lparen': precedence_index_call,
+    }
+    binary_precedences = {
+        'asterisk': precedence_multiplicative,
+        'slash': precedence_multiplicative,
+        'plus': precedence_additive,
+        'minus': precedence_additive,
+        'period': precedence_index_call,
+        'less': precedence_comparison,
+        'greater': precedence_comparison,
+        'lessequals': precedence_comparison,
+        'greaterequals': precedence_comparison,
+        'equalsequals': precedence_comparison,
+        'bangequals': precedence_comparison,
+        'equals': precedence_assignment,
+    }
+    # binary operators that are keywords, by their content
+    binary_keyword_precedences = {
+        Keyword_and: precedence_and,
+        Keyword_or: precedence_or,
+    }
 
     def parse_program(self) -> ProgramNode:
         # program = top-level-statement+;
@@ -70,16 +106,103 @@ class Parser:
         return ProgramNode(statements)
 
     def parse_top_level_statement(self) -> TopLevelStatement:
-        if self.peek_is('keyword', Keyword_let):
-            return self.parse_let_statement()
-        else:
-            return self.parse_expression_statement()
+        start = self.pos
+        # a statement that failed may have left blocks open
+        self.depth = 0
+        try:
+            if self.peek_is('keyword', Keyword_let):
+                return self.parse_let_statement()
+            else:
+                return self.parse_expression_statement()
+        except ParseError as error:
+            return self.recover(error, start)
         
     def parse_statement(self) -> Statement:
-        if self.peek_is('keyword', Keyword_let):
-            return self.parse_let_statement()
-        else:
-            return self.parse_expression_statement()
+        start = self.pos
+        try:
+            if self.peek_is('keyword', Keyword_let):
+                return self.parse_let_statement()
+            else:
+                return self.parse_expression_statement()
+        except ParseError as error:
+            return self.recover(error, start)
+
+    # tokens at which a skipped statement is considered over when they
+    # appear outside of any block opened by that statement
+    synchronizing_keywords = {
+        Keyword_let,
+        Keyword_end,
+        Keyword_elif,
+        Keyword_else,
+        Keyword_if,
+        Keyword_loop,
+        Keyword_break,
+        Keyword_continue,
+    }
+
+    def recover(self, error: ParseError, start: int) -> ErrorNode:
+        """
+        Records `error` and skips forward to the next synchronization point,
+        returning an `ErrorNode` covering the statement that began at `start`.
+
+        Blocks opened between `start` and the error are tracked so that their
+        `end`s are skipped too, rather than being mistaken for the end of the
+        enclosing block.
+        """
+
+        line, column = self.line_index.line_col(error.token.position[0])
+        self.diagnostics.append(Diagnostic(
+            stage='parse',
+            message=str(error),
+            position=error.token.position,
+            line=line,
+            column=column,
+        ))
+
+        depth = 0
+        for i in range(start, self.pos):
+            if self.opens_block(i):
+                depth += 1
+            elif self.tokens[i].type == 'keyword' and self.tokens[i].content == Keyword_end:
+                depth -= 1
+
+        # always make progress, otherwise a token that cannot start a
+        # statement would be retried forever
+        if self.pos == start and not self.peek_is('eof'):
+            if self.opens_block(self.pos):
+                depth += 1
+            self.consume()
+
+        while not self.peek_is('eof'):
+            token = self.peek()
+            if token.type == 'keyword' and token.content == Keyword_end:
+                if depth <= 0:
+                    break
+                self.consume()
+                depth -= 1
+                if depth == 0:
+                    break
+                continue
+
+            if depth <= 0 and token.type == 'keyword' and token.content in Parser.synchronizing_keywords:
+                break
+            if self.opens_block(self.pos):
+                depth += 1
+            self.consume()
+
+        return ErrorNode(tuple(self.tokens[start:self.pos]))
+
+    def opens_block(self, index: int) -> bool:
+        """
+        Whether the token at `index` opens a block that is closed by `end`:
+        `if`, `loop`, or the `|:` ending a function literal's parameters.
+        """
+
+        token = self.tokens[index]
+        if token.type == 'keyword':
+            return token.content == Keyword_if or token.content == Keyword_loop
+        return token.type == 'pipe' and index + 1 < len(self.tokens) \
+            and self.tokens[index + 1].type == 'colon'
         
     def parse_let_statement(self) -> LetStatementNode:
         self.expect('keyword', Keyword_let)
@@ -98,81 +221,79 @@ class Parser:
         return ExpressionStatementNode(expr)
     
     def parse_expression(self, min_bp: int = 0) -> Expression:
-        if self.peek_is('keyword', Keyword_if):
-            return self.parse_if_else_expression()
-        elif self.peek_is('keyword', Keyword_loop):
-            return self.parse_loop_expression()
-        elif self.peek_is('keyword', Keyword_break):
-            return self.parse_break_expression()
-        elif self.peek_is('keyword', Keyword_continue):
-            return self.parse_continue_expression()
-        
-        pre_bp = Parser.get_prefix_precedence(self.peek())
-
-        if pre_bp != 0 and pre_bp > min_bp:
-            op = self.consume()
-            if self.peek().whitespace_before:
-                raise Exception("while parsing prefix operator: unexpected whitespace")
-            if op.type not in get_args(PrefixOperator):
-                raise Exception(f"while parsing prefix operator: invalid operator {op}")
-            
-            op = cast(PrefixOperator, op.type)
+        token = self.tokens[self.pos]
+        if token.type == 'keyword':
+            if token.content == Keyword_if:
+                return self.parse_if_else_expression()
+            elif token.content == Keyword_loop:
+                return self.parse_loop_expression()
+            elif token.content == Keyword_break:
+                return self.parse_break_expression()
+            elif token.content == Keyword_continue:
+                return self.parse_continue_expression()
+
+        prefix = _prefix_table.get(token.type)
+        if prefix is not None and prefix[0] > min_bp:
+            pre_bp, op = prefix
+            self.consume()
+            if self.tokens[self.pos].whitespace_before:
+                raise ParseError("while parsing prefix operator: unexpected whitespace", self.tokens[self.pos])
+            if op is None:
+                raise ParseError(f"while parsing prefix operator: invalid operator {token.content}", token)
+
             expr = self.parse_expression(pre_bp)
-            
+
             left = PrefixExpressionNode(expr, op)
         else:
             left = self.parse_atomic_expression()
         
         while True:
-            post_bp = Parser.get_postfix_precedence(self.peek())
+            token = self.tokens[self.pos]
+            postfix = _postfix_table.get(token.type)
 
-            if post_bp == 0 or post_bp < min_bp:
+            if postfix is None or postfix[0] < min_bp:
                 break
 
-            op = self.consume()
+            self.consume()
             expr = left
 
-            if op.type == 'lparen':
+            if token.type == 'lparen':
                 # Call operator
                 args = self.parse_argument_list()
                 self.expect('rparen')
                 
                 left = CallExpressionNode(expr, args)
-            elif op.type == "lbracket":
+            elif token.type == "lbracket":
                 # Index operator
                 expr = self.parse_expression()
                 self.expect('rbracket')
 
                 left = IndexExpressionNode(left, expr)
             else:
-                if op.whitespace_before:
-                    raise Exception("while parsing postfix operator: unexpected whitespace")
-                if op.type not in get_args(PostfixOperator):
-                    raise Exception(f"while parsing postfix operator: invalid operator {op}")
+                if token.whitespace_before:
+                    raise ParseError("while parsing postfix operator: unexpected whitespace", token)
+                op = postfix[1]
+                if op is None:
+                    raise ParseError(f"while parsing postfix operator: invalid operator {token.content}", token)
                 
-                op = cast(PostfixOperator, op.type)
                 left = PostfixExpressionNode(expr, op)
 
         while True:
-            (left_bp, right_bp) = Parser.get_binary_precedence(self.peek())
+            token = self.tokens[self.pos]
+            if token.type == 'keyword':
+                binary = _binary_keyword_table.get(token.content)
+            else:
+                binary = _binary_table.get(token.type)
 
-            if self.peek().whitespace_before != self.peek().whitespace_after:
-                left_bp, right_bp = 0, 0
-            if left_bp == 0 or left_bp < min_bp:
+            if binary is None or token.whitespace_before != token.whitespace_after:
+                break
+            left_bp, right_bp, build = binary
+            if left_bp < min_bp:
                 break
 
-            op = self.consume()
+            self.consume()
             right = self.parse_expression(right_bp)
-
-            if op.type == 'equals':
-                if not isinstance(left, IdentifierExpressionNode):
-                    raise Exception("left side of assignment must be identifier")
-                left = AssignmentExpressionNode(left, right)
-            elif op.type not in get_args(BinaryOperator):
-                raise Exception(f"while parsing binary operator: invalid operator {op}")
-            else:
-                op = cast(BinaryOperator, op.type)
-                left = BinaryExpressionNode(left, right, op)
+            left = build(left, right, token)
         
         return left
 
@@ -225,43 +346,35 @@ class Parser:
                 self.peek_is('keyword', Keyword_false):
             return self.parse_bool_literal_expression()
         else:
-            raise Exception(f"while parsing atomic: encountered unexpected token {self.peek()}")
+            raise ParseError(f"while parsing atomic: encountered unexpected token {self.peek().content!r}", self.peek())
 
     def parse_number_literal_expression(self) -> NumberLiteralExpressionNode:
-        number = self.parse_number_literal()
+        number = self.expect('number')
         return NumberLiteralExpressionNode(number)
     
     def parse_identifier_expression(self) -> IdentifierExpressionNode:
-        ident = self.parse_identifier()
+        ident = self.expect('identifier')
         return IdentifierExpressionNode(ident)
     
     def parse_string_literal_expression(self) -> StringLiteralExpressionNode:
-        string = self.parse_string_literal()
+        string = self.expect('string')
         return StringLiteralExpressionNode(string)
     
     def parse_bool_literal_expression(self) -> BoolLiteralExpressionNode:
-        bool = self.parse_bool_literal()
-        return BoolLiteralExpressionNode(bool)
-    
-    def parse_string_literal(self) -> StringLiteralNode:
-        string = self.expect('string')
-        return StringLiteralNode(string)
-    
-    def parse_bool_literal(self) -> BoolLiteralNode:
         bool = self.expect('keyword')
 
         if bool.content != Keyword_true and bool.content != Keyword_false:
-            raise Exception(f"parse error: got wrong keyword for boolean. expected {Keyword_true} or {Keyword_false} but got {bool.content}")
-        return BoolLiteralNode(bool)
+            raise ParseError(f"got wrong keyword for boolean. expected {Keyword_true} or {Keyword_false} but got {bool.content}", bool)
+        return BoolLiteralExpressionNode(bool)
     
     def parse_object_literal_expression(self) -> ObjectLiteralExpressionNode:
         self.expect('lcurly')
         entries = []
-        while not self.peek_is('rcurly'):
+        while not (self.peek_is('rcurly') or self.peek_is('eof')):
             entry = self.parse_object_literal_entry()
             entries.append(entry)
         self.expect('rcurly')
-        return ObjectLiteralExpressionNode(entries)
+        return ObjectLiteralExpressionNode(tuple(entries))
     
     def parse_object_literal_entry(self) -> ObjectLiteralEntryNode:
         mutable = True
@@ -278,10 +391,6 @@ class Parser:
         right = self.parse_expression()
         return ObjectLiteralEntryNode(left, right, mutable)
         
-    def parse_number_literal(self) -> NumberLiteralNode:
-        number = self.expect('number')
-        return NumberLiteralNode(number)
-    
     def parse_identifier(self) -> IdentifierNode:
         ident = self.expect('identifier')
         return IdentifierNode(ident)
@@ -291,22 +400,75 @@ class Parser:
         params = self.parse_parameter_list()
         self.expect('pipe')
         self.expect('colon')
+        if self.lazy_functions and self.depth == 0 and (lazy := self.skip_body()) is not None:
+            return FunctionLiteralExpressionNode(params, lazy)
+        self.depth += 1
         statements = []
-        while not self.peek_is('keyword', Keyword_end):
+        while not (self.peek_is('keyword', Keyword_end) or self.peek_is('eof')):
             statements.append(self.parse_statement())
         self.expect('keyword', Keyword_end)
+        self.depth -= 1
         return FunctionLiteralExpressionNode(params, BlockNode(tuple(statements)))
+
+    def skip_body(self) -> LazyBodyNode | None:
+        """
+        Skips a function body, from just after its `|:` to past its `end`.
+        Returns None, having skipped nothing, if the body is never closed,
+        so that parsing it reports the error.
+        """
+
+        tokens = self.tokens
+        start = self.pos
+        depth = 1
+        names = set()
+        assigned = set()
+        for i in range(start, len(tokens)):
+            token = tokens[i]
+            if token.type == 'identifier':
+                names.add(token.content)
+                # an assignment, as opposed to a `let` or `let var`
+                previous = tokens[i - 1]
+                if tokens[i + 1].type == 'equals' and not (previous.type == 'keyword' \
+                        and (previous.content == Keyword_let or previous.content == Keyword_var)):
+                    assigned.add(token.content)
+            elif token.type == 'keyword' and token.content == Keyword_end:
+                depth -= 1
+                if depth == 0:
+                    self.pos = i + 1
+                    return LazyBodyNode(start, i, frozenset(names), frozenset(assigned))
+            elif self.opens_block(i):
+                depth += 1
+        return None
+
+    def parse_lazy_body(self, body: LazyBodyNode) -> BlockNode:
+        """
+        Parses a body skipped by `skip_body`, recording any errors in it in
+        `diagnostics`.
+        """
+
+        self.pos = body.start
+        self.depth = 1
+        statements = []
+        while not (self.peek_is('keyword', Keyword_end) or self.peek_is('eof')):
+            statements.append(self.parse_statement())
+        try:
+            self.expect('keyword', Keyword_end)
+        except ParseError as error:
+            self.recover(error, self.pos)
+        return BlockNode(tuple(statements))
     
     def parse_if_else_expression(self) -> IfElseExpressionNode:
         cases = []
         
         self.expect('keyword', Keyword_if)
+        self.depth += 1
         cond = self.parse_expression()
         self.expect('colon')
         statements = []
         while not (self.peek_is("keyword", Keyword_elif) 
                 or self.peek_is("keyword", Keyword_else)
-                or self.peek_is("keyword", Keyword_end)):
+                or self.peek_is("keyword", Keyword_end)
+                or self.peek_is("eof")):
             statements.append(self.parse_statement())
         
         cases.append((cond, BlockNode(tuple(statements))))
@@ -318,7 +480,8 @@ class Parser:
             statements = []
             while not (self.peek_is("keyword", Keyword_elif) 
                     or self.peek_is("keyword", Keyword_else)
-                    or self.peek_is("keyword", Keyword_end)):
+                    or self.peek_is("keyword", Keyword_end)
+                    or self.peek_is("eof")):
                 statements.append(self.parse_statement())
             cases.append((cond, BlockNode(tuple(statements))))
 
@@ -326,22 +489,25 @@ class Parser:
             self.expect('keyword', Keyword_else)
             self.expect('colon')
             statements = []
-            while not self.peek_is("keyword", "end"):
+            while not (self.peek_is("keyword", "end") or self.peek_is("eof")):
                 statements.append(self.parse_statement())
             cases.append((None, BlockNode(tuple(statements))))
         self.expect('keyword', Keyword_end)
+        self.depth -= 1
 
         return IfElseExpressionNode(tuple(cases))
     
     def parse_loop_expression(self) -> LoopExpressionNode:
         self.expect('keyword', Keyword_loop)
         self.expect('colon')
+        self.depth += 1
 
         statements: list[Statement] = []
 
-        while not self.peek_is('keyword', Keyword_end):
+        while not (self.peek_is('keyword', Keyword_end) or self.peek_is('eof')):
             statements.append(self.parse_statement())
         self.expect('keyword', Keyword_end)
+        self.depth -= 1
         return LoopExpressionNode(BlockNode(tuple(statements)))
     
     def parse_break_expression(self) -> BreakExpressionNode:
@@ -359,13 +525,12 @@ class Parser:
         return ContinueExpressionNode()
     
     def peek(self):
-        if self.pos < len(self.tokens) - 1:
-            return self.tokens[self.pos]
-        else:
-            return self.tokens[-1]
+        # `consume` never moves past the final eof token, so this is always
+        # in bounds
+        return self.tokens[self.pos]
         
     def peek_is(self, type: TokenType, value: str|None = None):
-        peeked = self.peek()
+        peeked = self.tokens[self.pos]
         if peeked.type != type:
             return False
         elif value is not None and peeked.content != value:
@@ -379,13 +544,57 @@ class Parser:
             self.pos += 1
             return current
         else:
-            raise Exception("consumed beyond end of token stream")
+            raise ParseError("unexpected end of input", self.tokens[-1])
     
     def expect(self, type: TokenType, value: str|None = None):
-        peeked = self.peek()
+        peeked = self.tokens[self.pos]
         if peeked.type != type:
-            raise Exception(f"Expected token of type {type}, but got token of type {peeked.type}")
+            expected = repr(value) if value is not None else type
+            raise ParseError(f"expected {expected}, but got {peeked.type} {peeked.content!r}", peeked)
         elif value is not None and peeked.content != value:
-            raise Exception(f"Expected token of type {peeked} to have value '{value}', but got value '{peeked.content}'")
+            raise ParseError(f"expected {value!r}, but got {peeked.type} {peeked.content!r}", peeked)
         else:
-            return self.consume()
\ No newline at end of file
+            return self.consume()
+
+def _binary_node(left: Expression, right: Expression, op: Token) -> BinaryExpressionNode:
+    return BinaryExpressionNode(left, right, cast(BinaryOperator, op.type))
+
+def _keyword_binary_node(left: Expression, right: Expression, op: Token) -> BinaryExpressionNode:
+    return BinaryExpressionNode(left, right, cast(BinaryOperator, op.content))
+
+def _assignment_node(left: Expression, right: Expression, op: Token) -> AssignmentExpressionNode:
+    if not isinstance(left, IdentifierExpressionNode):
+        raise ParseError("left side of assignment must be identifier", op)
+    return AssignmentExpressionNode(left, right)
+
+def _invalid_binary_node(left: Expression, right: Expression, op: Token) -> Expression:
+    raise ParseError(f"while parsing binary operator: invalid operator {op.content}", op)
+
+# The Pratt tables, by token type. Prefix and postfix entries are the
+# binding power and the operator, or None for a token that has a
+# precedence but isn't a valid operator; binary entries are the left and
+# right binding powers and the function that builds the node.
+_prefix_table: dict[str, tuple[int, PrefixOperator | None]] = {
+    type: (Parser.unary_power(precedence), type if type in get_args(PrefixOperator) else None)
+    for type, precedence in Parser.prefix_precedences.items()
+}
+
+_postfix_table: dict[str, tuple[int, PostfixOperator | None]] = {
+    type: (Parser.unary_power(precedence), type if type in get_args(PostfixOperator) else None)
+    for type, precedence in Parser.postfix_precedences.items()
+}
+
+_binary_table: dict[str, tuple[int, int, Callable[[Expression, Expression, Token], Expression]]] = {
+    type: (
+        *Parser.binary_left_associative_powers(precedence),
+        _assignment_node if type == 'equals'
+        else _binary_node if type in get_args(BinaryOperator)
+        else _invalid_binary_node)
+    for type, precedence in Parser.binary_precedences.items()
+}
+
+_binary_keyword_table: dict[str, tuple[int, int, Callable[[Expression, Expression, Token], Expression]]] = {
+    keyword: (*Parser.binary_left_associative_powers(precedence), _keyword_binary_node)
+    for keyword, precedence in Parser.binary_keyword_precedences.items()
+    if keyword in get_args(BinaryOperator)
+}
@@ -12,6 +12,11 @@ def __with_last(iterable: Collection[T]) -> Generator[tuple[T, bool], None, None
     for i, elem in enumerate(iterable):
         yield (elem, i >= len(iterable) - 1)
 
+def __print_token(label: str, token: Token, indent: str, intern: IdIntern):
+    # literal and identifier expressions hold their token directly, but
+    # are still printed with the token as a child of its own
+    print(f"{indent}╰── ({intern.intern_id(id(token))}) {_c}{label}:{_o} {_y}{token.content}{_o}")
+
 def pretty_print(node: Node, indent: str, is_last: bool, intern: IdIntern):
     print(indent, end="")
     print("╰── " if is_last else "├── ", end="")
@@ -29,26 +34,20 @@ def pretty_print(node: Node, indent: str, is_last: bool, intern: IdIntern):
             pretty_print(node.name, indent, False, intern)
             pretty_print(node.value, indent, True, intern)
         
-        case NumberLiteralNode():
-            print(f"{_c}number-literal:{_o} {_y}{node.token.content}{_o}")
-
         case IdentifierNode():
             print(f"{_c}identifier:{_o} {_y}{node.token.content}{_o}")
 
-        case StringLiteralNode():
-            print(f"{_c}string-literal:{_o} {_y}{node.token.content}{_o}")
-
         case IdentifierExpressionNode():
             print(f"{_c}identifier-expression{_o}:")
-            pretty_print(node.identifier, indent, True, intern)
+            __print_token("identifier", node.token, indent, intern)
 
         case NumberLiteralExpressionNode():
             print(f"{_c}number-literal-expression:{_o}")
-            pretty_print(node.number, indent, True, intern)
+            __print_token("number-literal", node.token, indent, intern)
 
         case StringLiteralExpressionNode():
             print(f"{_c}string-literal-expression:{_o}")
-            pretty_print(node.string, indent, True, intern)
+            __print_token("string-literal", node.token, indent, intern)
 
         case ObjectLiteralExpressionNode():
             print(f"{_c}object-literal-expression:{_o}")
@@ -62,10 +61,7 @@ def pretty_print(node: Node, indent: str, is_last: bool, intern: IdIntern):
 
         case BoolLiteralExpressionNode():
             print(f"{_c}bool-literal-expression:{_o}")
-            pretty_print(node.bool, indent, True, intern)
-        
-        case BoolLiteralNode():
-            print(f"{_c}bool-literal:{_o} {_y}{node.token.content}{_o}")
+            __print_token("bool-literal", node.token, indent, intern)
 
         case FunctionLiteralExpressionNode():
             print(f"{_c}function-literal-expression{_o}:")
@@ -111,6 +107,9 @@ def pretty_print(node: Node, indent: str, is_last: bool, intern: IdIntern):
             for statement, is_last in __with_last(node.statements):
                 pretty_print(statement, indent, is_last, intern)
 
+        case LazyBodyNode():
+            print(f"{_c}lazy-body:{_o} tokens {node.start}-{node.end}")
+
         case ExpressionStatementNode():
             print(f"{_c}expression-statement:{_o}")
             pretty_print(node.expr, indent, True, intern)
@@ -134,5 +133,9 @@ def pretty_print(node: Node, indent: str, is_last: bool, intern: IdIntern):
             print(f"{_c}argument:{_o}")
             pretty_print(node.expr, indent, True, intern)
 
+        case ErrorNode():
+            skipped = " ".join(token.content for token in node.tokens)
+            print(f"{_c}error:{_o} {_y}{skipped}{_o}")
+
         case _:
             print(f"Not implemented for {type(node)}")
\ No newline at end of file
@@ -1,4 +1,5 @@
-from typing import Literal
+from typing import Collection, Literal
+from dataclasses import field
 
 from parse.parsenode import *
 
@@ -7,56 +8,263 @@ type DeclarationSite = LetStatementNode | ParameterNode
 @dataclass
 class Scope:
     type: Literal['global', 'block']
-    names: dict[str, DeclarationSite]
+    # names declared in this scope, in declaration order. used to pop
+    # the matching entries off `Resolver.names` when the scope exits.
+    declared: list[str]
     parent: FunctionLiteralExpressionNode | None
 
 @dataclass
 class BindingInfo:
     decl: DeclarationSite
     type: Literal['global', 'block', 'parameter']
+    # the function the declaration belongs to, or None at module level
+    function: FunctionLiteralExpressionNode | None = field(default=None, repr=False)
+    # cleared for `var` declarations, for anything assigned to and for
+    # globals declared more than once, so once resolution is done it says
+    # whether the variable keeps the value it was first given
+    immutable: bool = True
+    # set when a closure that refers to the variable is created before the
+    # variable is, as with a function that calls itself
+    captured_before_set: bool = False
 
 class Resolver():
+    """
+    Binds every identifier expression to its declaration site.
+
+    Rather than walking the scope chain for every reference, the resolver
+    keeps a single flat map from each name to a stack of the bindings that
+    are currently visible for it. Declaring a name pushes onto its stack
+    and leaving a scope pops everything that scope declared, so the top of
+    each stack is always the innermost binding and lookups are O(1)
+    regardless of nesting depth.
+
+    Along the way it works out which variables are captured by closures:
+    `cell_variables` lists, per function, its own variables that inner
+    functions refer to, and `free_variables` lists, per function, the
+    variables of enclosing functions it refers to (directly or through a
+    function nested in it). Module-level bindings are looked up by name and
+    are never captured.
+
+    A variable that never changes once set doesn't need a cell: it is
+    listed in `copied_variables` of the functions that refer to it instead,
+    and copied into their closures by value when they are created. And an
+    immutable `let` of a literal isn't captured at all, since `constants`
+    has every use load the literal instead. Whether a variable changes is
+    only known once every assignment has been seen, so captures are sorted
+    into these lists at the end of `resolve`.
+
+    A function literal whose body the parser skipped (see `LazyBodyNode`)
+    is left alone until `resolve_lazy` is given it with its body. Any global
+    such a body may assign to counts as changing.
+
+    Names in `builtins` may be referenced without a declaration; they are
+    left out of `bindings` and looked up by name at run time.
+    """
     scopes: list[Scope]
+    names: dict[str, list[BindingInfo]]
     bindings: dict[IdentifierExpressionNode, BindingInfo]
+    functions: list[FunctionLiteralExpressionNode]
+    cell_variables: dict[FunctionLiteralExpressionNode, list[str]]
+    free_variables: dict[FunctionLiteralExpressionNode, list[str]]
+    copied_variables: dict[FunctionLiteralExpressionNode, list[str]]
+    # ids of the immutable lets bound to a literal
+    constants: set[int]
     root: ProgramNode
 
-    def __init__(self, root: ProgramNode):
+    def __init__(self, root: ProgramNode, builtins: Collection[str] = ()):
         self.scopes = []
+        self.names = {}
         self.bindings = {}
+        self.functions = []
+        self.cell_variables = {}
+        self.free_variables = {}
+        self.copied_variables = {}
+        self.constants = set()
+        self.builtins = builtins
         self.root = root
+        # every capture, as the variable, its binding and the functions
+        # between its declaration and the use, innermost first
+        self._captures: list[tuple[str, BindingInfo, list[FunctionLiteralExpressionNode]]] = []
+        self._declarations: list[BindingInfo] = []
+        # how many module-level lets there are of each global
+        self._global_counts: dict[str, int] = {}
+        # ids of the lets whose function literal is being resolved
+        self._setting: set[int] = set()
+        # for each function literal with a skipped body, by id, how many
+        # declarations had been made when it was reached
+        self._lazy_functions: dict[int, int] = {}
+        # names skipped bodies may assign to
+        self._lazily_assigned: set[str] = set()
 
     def resolve(self):
         self._resolve(self.root)
+        self._finish(0, 0)
+
+    def resolve_lazy(self, node: FunctionLiteralExpressionNode, lazy: FunctionLiteralExpressionNode):
+        """
+        Resolves `node`, the function literal `lazy` with its body parsed,
+        seeing the globals `lazy` saw where it was.
+        """
+
+        declarations = len(self._declarations)
+        captures = len(self._captures)
+
+        self.names = {}
+        for info in self._declarations[:self._lazy_functions[id(lazy)]]:
+            if info.type == 'global':
+                # a later let of a name rebinds it
+                self.names[info.decl.name.token.content] = [info]
+        self.scopes = [Scope('global', declared = [], parent = None)]
+        self._resolve(node)
+
+        self._finish(declarations, captures)
+
+    def _finish(self, declarations: int, captures: int):
+        """
+        Finds the constants among the declarations and sorts the captures
+        made since there were `declarations` and `captures` of them.
+        """
+
+        for info in self._declarations[declarations:]:
+            if info.function is None:
+                name = info.decl.name.token.content
+                if self._global_counts[name] > 1 or name in self._lazily_assigned:
+                    # each of them rebinds the global
+                    info.immutable = False
+            if info.immutable and isinstance(info.decl, LetStatementNode) and isinstance(info.decl.value, (
+                    NumberLiteralExpressionNode, StringLiteralExpressionNode, BoolLiteralExpressionNode)):
+                self.constants.add(id(info.decl))
+
+        for name, info, functions in self._captures[captures:]:
+            self._sort_capture(name, info, functions)
+
+    def constant_value(self, node: IdentifierExpressionNode) -> Expression | None:
+        """
+        The literal `node` always evaluates to, if it refers to an
+        immutable `let` of one, or None.
+        """
+
+        info = self.bindings.get(node)
+        if info is None or id(info.decl) not in self.constants:
+            return None
+        return info.decl.value
+
+    def _push_scope(self, scope: Scope):
+        self.scopes.append(scope)
+
+    def _pop_scope(self):
+        scope = self.scopes.pop()
+        for name in reversed(scope.declared):
+            stack = self.names[name]
+            stack.pop()
+            if not stack:
+                del self.names[name]
+
+    def _declare(self, name: str, decl: DeclarationSite, type: Literal['parameter'] | None = None):
+        scope = self.scopes[-1]
+        info = BindingInfo(
+            decl = decl,
+            type = type if type is not None else scope.type,
+            function = scope.parent,
+        )
+
+        if isinstance(decl, LetStatementNode) and decl.mutable:
+            info.immutable = False
+        if info.function is None:
+            self._global_counts[name] = self._global_counts.get(name, 0) + 1
+        self._declarations.append(info)
+
+        stack = self.names.get(name)
+        if stack is None:
+            self.names[name] = [info]
+        else:
+            stack.append(info)
+        scope.declared.append(name)
+
+    def _capture(self, name: str, info: BindingInfo):
+        """
+        Records that `name`, bound by `info` in a function, is used from a
+        function nested inside it.
+        """
+
+        if id(info.decl) in self._setting:
+            info.captured_before_set = True
+
+        functions = []
+        for function in reversed(self.functions):
+            if function is info.function:
+                break
+            functions.append(function)
+        self._captures.append((name, info, functions))
+
+    def _sort_capture(self, name: str, info: BindingInfo, functions: list[FunctionLiteralExpressionNode]):
+        """
+        Adds a capture recorded by `_capture` to the lists of the functions
+        involved.
+        """
+
+        if id(info.decl) in self.constants:
+            return
+
+        if info.immutable and not info.captured_before_set:
+            # every function between the owner and the use gets a copy, so
+            # that it can pass it on
+            for function in functions:
+                copied = self.copied_variables.setdefault(function, [])
+                if name not in copied:
+                    copied.append(name)
+            return
+
+        cells = self.cell_variables.setdefault(info.function, [])
+        if name not in cells:
+            cells.append(name)
+
+        # every function between the owner and the use needs the variable
+        # as a free variable so that it can pass it on
+        for function in functions:
+            free = self.free_variables.setdefault(function, [])
+            if name not in free:
+                free.append(name)
 
     def _resolve(self, node: Node):
         match node:
             case ProgramNode():
-                global_scope = Scope('global', names = {}, parent = None)
-                self.scopes.append(global_scope)
+                global_scope = Scope('global', declared = [], parent = None)
+                self._push_scope(global_scope)
 
                 for statement in node.statements:
                     self._resolve(statement)
 
             case LetStatementNode():
-                self._resolve(node.value)
-                name = node.name.token.content
-                self.scopes[-1].names[name] = node
+                if isinstance(node.value, FunctionLiteralExpressionNode):
+                    # declare first so that the function can refer to itself
+                    self._declare(node.name.token.content, node)
+                    self._setting.add(id(node))
+                    self._resolve(node.value)
+                    self._setting.discard(id(node))
+                else:
+                    self._resolve(node.value)
+                    self._declare(node.name.token.content, node)
 
             case ExpressionStatementNode():
                 self._resolve(node.expr)
 
+            case ErrorNode():
+                pass
+
             case IdentifierExpressionNode():
-                name = node.identifier.token.content
+                name = node.token.content
 
-                for scope in reversed(self.scopes):
-                    if name in scope.names:
-                        self.bindings[node] = BindingInfo(
-                            decl = scope.names[name],
-                            type = scope.type,
-                        )
-                        break
-                else:
+                stack = self.names.get(name)
+                if stack is None:
+                    if name in self.builtins:
+                        return
                     raise NameError(f"Name {name} cannot be resolved.")
+                
+                info = stack[-1]
+                self.bindings[node] = info
+                if info.function is not None and info.function is not self.scopes[-1].parent:
+                    self._capture(name, info)
 
             case ObjectLiteralExpressionNode():
                 for entry in node.contents:
@@ -74,14 +282,14 @@ class Resolver():
 
             case AssignmentExpressionNode():
                 self._resolve(node.value)
+                self._resolve(node.left)
+                if (info := self.bindings.get(node.left)) is not None:
+                    info.immutable = False
 
             case (NumberLiteralExpressionNode() 
-                | NumberLiteralNode() 
                 | IdentifierNode()
                 | StringLiteralExpressionNode()
-                | StringLiteralNode()
-                | BoolLiteralExpressionNode()
-                | BoolLiteralNode()):
+                | BoolLiteralExpressionNode()):
                 pass
 
             case BlockNode():
@@ -95,17 +303,17 @@ class Resolver():
                     if condition is not None:
                         self._resolve(condition)
                     
-                    self.scopes.append(
+                    self._push_scope(
                         Scope(
                             type = 'block',
-                            names = {},
+                            declared = [],
                             parent = self.scopes[-1].parent
                         )
                     )
 
                     self._resolve(block)
 
-                    self.scopes.pop()
+                    self._pop_scope()
             
             case LoopExpressionNode():
                 # introduce scope
@@ -122,6 +330,10 @@ class Resolver():
                 self._resolve(node.left)
                 self._resolve(node.index)
 
+            case CallExpressionNode():
+                self._resolve(node.callee)
+                self._resolve(node.arglist)
+
             case ArgumentListNode():
                 for arg in node.arguments:
                     self._resolve(arg)
@@ -129,11 +341,30 @@ class Resolver():
             case ArgumentNode():
                 self._resolve(node.expr)
 
+            case FunctionLiteralExpressionNode() if isinstance(node.body, LazyBodyNode):
+                # resolved by `resolve_lazy` once the body is parsed
+                self._lazy_functions[id(node)] = len(self._declarations)
+                self._lazily_assigned.update(node.body.assigned)
+
             case FunctionLiteralExpressionNode():
-                raise NotImplementedError()
+                self.functions.append(node)
+                self._push_scope(
+                    Scope(
+                        type = 'block',
+                        declared = [],
+                        parent = node,
+                    )
+                )
+
+                self._resolve(node.paramlist)
+                self._resolve(node.body)
+
+                self._pop_scope()
+                self.functions.pop()
             
             case ParameterListNode():
-                raise NotImplementedError()
+                for param in node.parameters:
+                    self._resolve(param)
             
             case ParameterNode():
-                raise NotImplementedError()
\ No newline at end of file
+                self._declare(node.name.token.content, node, type = 'parameter')
\ No newline at end of file
@@ -0,0 +1,323 @@
+from typing import Literal
+
+from parse.parsenode import *
+from process.binding import Resolver
+
+type SpyType = Literal['int', 'string', 'bool', 'function', 'object']
+
+class _Unseen:
+    """
+    The type of a variable no value has reached yet, below every other
+    type. Joined with any type it gives that type.
+    """
+
+    def __repr__(self):
+        return "<unseen>"
+
+_UNSEEN = _Unseen()
+
+def _join(a, b):
+    if a is _UNSEEN:
+        return b
+    if b is _UNSEEN or a == b:
+        return a
+    return None
+
+# Operators whose result is an int when both operands are ints
+_int_operators = {'plus', 'minus', 'asterisk', 'slash'}
+_comparison_operators = {'less', 'lessequals', 'greater', 'greaterequals', 'equalsequals', 'bangequals'}
+
+class TypeInference:
+    """
+    Works out, before the program runs, which of its values are always an
+    int, a string, a bool, a function or an object. Anything else, or
+    anything the analysis can't follow (builtins, calls through values,
+    indexing, attributes), has the type None.
+
+    The analysis is flow-insensitive: a variable has one type, the join of
+    everything ever stored in it, so a `let` that is never assigned to
+    simply has the type of its value. The parameters of a function have
+    the join of the arguments of every call to it, as long as the function
+    is bound by an immutable `let` and that name is only ever called, so
+    that every call is known; other parameters have the type None.
+
+    Parameters and the results of calls depend on each other, so the
+    program is walked until nothing changes, starting from parameters that
+    have seen no arguments at all. Variables are keyed by the identity of
+    their declaration, except at module level, where all the `let`s of a
+    name share one global.
+
+    A function body the parser skipped (see `LazyBodyNode`) is compiled
+    without types, so it only counts as using every name it mentions and
+    as storing unknown values in every name it may assign to.
+    """
+    resolver: Resolver
+    root: ProgramNode
+
+    def __init__(self, resolver: Resolver):
+        self.resolver = resolver
+        self.root = resolver.root
+        # nodes are hashed by value, which walks their whole subtree, so
+        # everything here is keyed by id()
+        self._variables: dict[int | str, object] = {}
+        self._results: dict[int, object] = {}
+        self._expressions: dict[int, object] = {}
+        self._known: dict[int, FunctionLiteralExpressionNode] = {}
+
+    def infer(self):
+        self._find_known_functions()
+        while True:
+            variables = dict(self._variables)
+            results = dict(self._results)
+            self._walk(self.root)
+            if variables == self._variables and results == self._results:
+                break
+
+    def type_of(self, node: Expression) -> SpyType | None:
+        """
+        The type of the value of `node`.
+        """
+
+        value = self._expressions.get(id(node))
+        return None if value is _UNSEEN else value
+
+    def operand_type(self, node: BinaryExpressionNode) -> SpyType | None:
+        """
+        The type both operands of `node` have, or None if they differ or
+        either isn't known.
+        """
+
+        left = self.type_of(node.left)
+        return left if left is not None and left == self.type_of(node.right) else None
+
+    def _key(self, decl: LetStatementNode | ParameterNode) -> int | str:
+        # module-level lets of the same name are all the same global
+        if isinstance(decl, LetStatementNode) and id(decl) in self._globals:
+            return decl.name.token.content
+        return id(decl)
+
+    def _find_known_functions(self):
+        """
+        Finds the functions whose every call is known, and gives the
+        parameters of all other functions the type None.
+        """
+
+        self._globals: set[int] = set()
+        self._functions: list[FunctionLiteralExpressionNode] = []
+        self._uses: dict[int | str, int] = {}
+        self._lets: dict[int | str, list[LetStatementNode]] = {}
+        self._function_depth = 0
+        self._collect(self.root)
+
+        for key, lets in self._lets.items():
+            let = lets[0]
+            if len(lets) == 1 and not let.mutable and isinstance(let.value, FunctionLiteralExpressionNode) \
+                    and self._uses.get(key, 0) == 0:
+                self._known[id(let.value)] = let.value
+
+        for function in self._functions:
+            if id(function) not in self._known:
+                for parameter in function.paramlist.parameters:
+                    self._variables[id(parameter)] = None
+
+    def _collect(self, node: Node | None):
+        """
+        Records the module-level lets and, for every variable, how often it
+        is used other than as the callee of a call.
+        """
+
+        match node:
+            case LetStatementNode():
+                if self._function_depth == 0:
+                    self._globals.add(id(node))
+                self._lets.setdefault(self._key(node), []).append(node)
+                self._collect(node.value)
+            case CallExpressionNode() if isinstance(node.callee, IdentifierExpressionNode):
+                for argument in node.arglist.arguments:
+                    self._collect(argument.expr)
+            case IdentifierExpressionNode():
+                info = self.resolver.bindings.get(node)
+                if info is not None:
+                    key = self._key(info.decl)
+                    self._uses[key] = self._uses.get(key, 0) + 1
+            case AssignmentExpressionNode():
+                self._collect(node.left)
+                self._collect(node.value)
+            case LazyBodyNode():
+                # only globals are visible to a skipped body, and those are
+                # keyed by name
+                for name in node.names:
+                    self._uses[name] = self._uses.get(name, 0) + 1
+            case FunctionLiteralExpressionNode():
+                self._functions.append(node)
+                self._function_depth += 1
+                self._collect(node.body)
+                self._function_depth -= 1
+            case _:
+                for child in _children(node):
+                    self._collect(child)
+
+    def _assign(self, key: int | str, value):
+        self._variables[key] = _join(self._variables.get(key, _UNSEEN), value)
+
+    def _walk(self, node: Node | None):
+        """
+        Walks the statements under `node`, updating the types of the
+        variables, parameters and function results they affect.
+        """
+
+        match node:
+            case ProgramNode() | BlockNode():
+                for statement in node.statements:
+                    self._walk(statement)
+            case LetStatementNode():
+                self._assign(self._key(node), self._type(node.value))
+            case ExpressionStatementNode():
+                self._type(node.expr)
+            case _:
+                pass
+
+    def _type(self, node: Expression):
+        value = self._compute(node)
+        self._expressions[id(node)] = value
+        return value
+
+    def _compute(self, node: Expression):
+        """
+        The type of `node`, or `_UNSEEN` if it depends on values that
+        haven't been reached yet.
+        """
+
+        match node:
+            case NumberLiteralExpressionNode():
+                return 'int'
+            case StringLiteralExpressionNode():
+                return 'string'
+            case BoolLiteralExpressionNode():
+                return 'bool'
+            case ObjectLiteralExpressionNode():
+                for entry in node.contents:
+                    self._type(entry.name)
+                    self._type(entry.value)
+                return 'object'
+
+            case FunctionLiteralExpressionNode():
+                result = self._type(node.body)
+                self._results[id(node)] = _join(self._results.get(id(node), _UNSEEN), result)
+                return 'function'
+
+            case IdentifierExpressionNode():
+                info = self.resolver.bindings.get(node)
+                if info is None:
+                    # a builtin
+                    return None
+                return self._variables.get(self._key(info.decl), _UNSEEN)
+
+            case BinaryExpressionNode():
+                left = self._type(node.left)
+                right = self._type(node.right)
+                if node.operator == 'and' or node.operator == 'or':
+                    # the result is one of the operands
+                    return _join(left, right)
+                if node.operator in _comparison_operators:
+                    return 'bool'
+                if left is _UNSEEN or right is _UNSEEN:
+                    return _UNSEEN
+                if left == 'int' and right == 'int' and node.operator in _int_operators:
+                    return 'int'
+                if left == 'string' and right == 'string' and node.operator == 'plus':
+                    return 'string'
+                return None
+
+            case PrefixExpressionNode():
+                operand = self._type(node.operand)
+                if node.operator == 'bang':
+                    return 'bool'
+                return operand if operand is _UNSEEN or operand == 'int' else None
+
+            case AssignmentExpressionNode():
+                value = self._type(node.value)
+                info = self.resolver.bindings.get(node.left)
+                if info is not None:
+                    self._assign(self._key(info.decl), value)
+                # an assignment evaluates to None
+                return None
+
+            case LazyBodyNode():
+                for name in node.assigned:
+                    self._assign(name, None)
+                return None
+
+            case BlockNode():
+                for statement in node.statements[:-1]:
+                    self._walk(statement)
+                if node.statements and isinstance(node.statements[-1], ExpressionStatementNode):
+                    return self._type(node.statements[-1].expr)
+                if node.statements:
+                    self._walk(node.statements[-1])
+                return None
+
+            case IfElseExpressionNode():
+                result = _UNSEEN
+                for condition, body in node.cases:
+                    if condition is not None:
+                        self._type(condition)
+                    result = _join(result, self._type(body))
+                if node.cases[-1][0] is not None:
+                    # no case may match, giving None
+                    result = None
+                return result
+
+            case CallExpressionNode():
+                arguments = [self._type(argument.expr) for argument in node.arglist.arguments]
+                callee = node.callee
+                info = self.resolver.bindings.get(callee) if isinstance(callee, IdentifierExpressionNode) else None
+                function = None
+                if info is not None and isinstance(info.decl, LetStatementNode):
+                    function = self._known.get(id(info.decl.value))
+                if function is None:
+                    self._type(callee)
+                    return None
+                parameters = function.paramlist.parameters
+                if len(parameters) != len(arguments):
+                    # fails at run time
+                    for parameter in parameters:
+                        self._assign(id(parameter), None)
+                    return None
+                for parameter, argument in zip(parameters, arguments):
+                    self._assign(id(parameter), argument)
+                return self._results.get(id(function), _UNSEEN)
+
+            case _:
+                # indexing and anything else the analysis doesn't follow,
+                # though calls inside still count
+                for child in _children(node):
+                    self._type(child)
+                return None
+
+def _children(node: Node | None) -> list[Node]:
+    match node:
+        case ProgramNode() | BlockNode():
+            return list(node.statements)
+        case LetStatementNode():
+            return [node.value]
+        case ExpressionStatementNode():
+            return [node.expr]
+        case ObjectLiteralExpressionNode():
+            return [child for entry in node.contents for child in (entry.name, entry.value)]
+        case BinaryExpressionNode():
+            return [node.left, node.right]
+        case PrefixExpressionNode() | PostfixExpressionNode():
+            return [node.operand]
+        case IfElseExpressionNode():
+            return [child for case in node.cases for child in case if child is not None]
+        case CallExpressionNode():
+            return [node.callee, *(argument.expr for argument in node.arglist.arguments)]
+        case IndexExpressionNode():
+            return [node.left, node.index]
+        case LoopExpressionNode():
+            return [node.body]
+        case BreakExpressionNode():
+            return [node.expr] if node.expr is not None else []
+        case _:
+            return []
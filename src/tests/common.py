@@ -0,0 +1,29 @@
+from codegen.block import Block
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins, spy_str
+
+# VM options for each execution tier, each reached as soon as possible
+tiers = {
+    "bytecode": dict(tier_up_threshold=None, transpile_threshold=None, quicken_threshold=None),
+    "quickened": dict(tier_up_threshold=None, transpile_threshold=None, quicken_threshold=1),
+    "threaded": dict(tier_up_threshold=1, transpile_threshold=None, quicken_threshold=None),
+    "transpiled": dict(tier_up_threshold=None, transpile_threshold=1, quicken_threshold=None),
+}
+
+def run(source: str, compile_options: dict = {}, **vm_options) -> list[str]:
+    """
+    Compiles and runs `source`, returning the lines it prints.
+    """
+
+    return run_block(compile_source(source, **compile_options), **vm_options)
+
+def run_block(block: Block, **vm_options) -> list[str]:
+    """
+    Runs the module `block`, returning the lines it prints.
+    """
+
+    lines = []
+    quiet = {**builtins, "print": lambda *values: lines.append(" ".join(map(spy_str, values)))}
+    VM(quiet, **vm_options).run_module(block)
+    return lines
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+
+from codegen.block import Block
+from codegen.consts import IntegerConst
+from codegen.instructions import instruction_values
+from compiler import compile_source
+from vm.asyncvm import AsyncVM, BudgetExceeded
+from vm.builtins import builtins, spy_str
+from tests.common import run, tiers
+from tests.test_tiers import programs
+
+def countdown_block() -> Block:
+    """
+    A module block that counts `x` down from 3 with a back edge, since SPY
+    has no loops of its own:
+
+        0000 LOAD_CONST 0
+        0003 STORE_NAME 0
+        0006 LOAD_NAME 0
+        0009 LOAD_CONST 1
+        000C SUBTRACT
+        000D DUP
+        000E STORE_NAME 0
+        0011 JUMP_FORWARD_FALSE 6
+        0014 JUMP_BACKWARD 14
+    """
+
+    block = Block('module')
+    block.consts = [IntegerConst("3"), IntegerConst("1")]
+    block.names = ["x"]
+    for name, arg in [("LOAD_CONST", 0), ("STORE_NAME", 0), ("LOAD_NAME", 0), ("LOAD_CONST", 1),
+                      ("SUBTRACT", None), ("DUP", None), ("STORE_NAME", 0),
+                      ("JUMP_FORWARD_FALSE", 6), ("JUMP_BACKWARD", 14)]:
+        block.body.append(instruction_values[name])
+        if arg is not None:
+            block.body.extend(arg.to_bytes(2, "big"))
+    block.max_stack_depth = 2
+    return block
+
+class TestAsyncVM(unittest.TestCase):
+    """
+    The asyncio VM prints what the stack VM prints, however often it
+    yields, and stops at its budgets.
+    """
+
+    def test_programs(self):
+        for label, source in programs.items():
+            with self.subTest(program=label):
+                lines = []
+                quiet = {**builtins, "print": lambda *values: lines.append(" ".join(map(spy_str, values)))}
+                vm = AsyncVM(quiet, yield_every=10, yield_on_back_edges=True)
+                asyncio.run(vm.run_module_async(compile_source(source)))
+                self.assertEqual(lines, run(source, **tiers["bytecode"]))
+
+    def test_instruction_budget(self):
+        vm = AsyncVM({**builtins, "print": lambda value: None}, instruction_budget=100)
+        with self.assertRaises(BudgetExceeded):
+            asyncio.run(vm.run_module_async(compile_source(programs["recursion"])))
+        self.assertEqual(vm.executed, 101)
+
+    def test_resumes_past_the_suspending_instruction(self):
+        block = compile_source("print(1 + 2)")
+        for yield_every in (1000, 3, 2, 1):
+            with self.subTest(yield_every=yield_every):
+                lines = []
+                vm = AsyncVM({**builtins, "print": lambda value: lines.append(spy_str(value))},
+                             yield_every=yield_every, instruction_budget=100)
+                asyncio.run(vm.run_module_async(block))
+                self.assertEqual(lines, ["3"])
+                self.assertEqual(vm.executed, 6)
+
+    def test_back_edges(self):
+        block = countdown_block()
+        for yield_every in (1000, 2, 1):
+            for yield_on_back_edges in (False, True):
+                with self.subTest(yield_every=yield_every, yield_on_back_edges=yield_on_back_edges):
+                    vm = AsyncVM(yield_every=yield_every, yield_on_back_edges=yield_on_back_edges,
+                                 instruction_budget=100)
+                    asyncio.run(vm.run_module_async(block))
+                    self.assertEqual(vm.globals["x"], 0)
+                    # three times round the loop, less the last JUMP_BACKWARD
+                    self.assertEqual(vm.executed, 2 + 3 * 7 - 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from tests.common import run, tiers
+
+class TestConstants(unittest.TestCase):
+    """
+    Immutable lets of a literal, whose uses load the literal.
+    """
+
+    def assert_same_on_every_tier(self, source: str, expected: list[str]):
+        for tier, options in tiers.items():
+            with self.subTest(tier=tier):
+                self.assertEqual(run(source, **options), expected)
+
+    def test_shadowed_by_inner_constant(self):
+        self.assert_same_on_every_tier("""
+let f = |x|:
+    let a = x + 1
+    let r = if x > 0: let a = 2 a else: 0 end
+    r + a
+end
+print(f(3))
+print(f(2))
+print(f(1))
+""", ["6", "5", "4"])
+
+    def test_global_shadowed_by_inner_variable(self):
+        self.assert_same_on_every_tier("""
+let a = 5
+let f = |x|:
+    let r = if x > 0:
+        let a = x + 1
+        a
+    else: 0 end
+    r + a
+end
+print(f(3))
+print(f(2))
+print(f(1))
+""", ["9", "8", "7"])
+
+    def test_captured_constant(self):
+        self.assert_same_on_every_tier("""
+let make = |x|:
+    let step = 3
+    |y|: x + y * step end
+end
+let add = make(10)
+print(add(1))
+print(add(2))
+""", ["13", "16"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from compiler import compile_source
+from tests.common import run, tiers
+
+def find_block(block: Block, name: str) -> Block:
+    """
+    `block` if it is called `name`, or else the block of the function
+    called `name` in it, however deeply nested.
+    """
+
+    if block.name == name:
+        return block
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            try:
+                return find_block(const.block, name)
+            except KeyError:
+                pass
+    raise KeyError(name)
+
+def call_count(source: str, function: str, **compile_options) -> int:
+    """
+    The number of calls, tail or not, left in the block of `function`.
+    """
+
+    block = find_block(compile_source(source, **compile_options), function)
+    return sum(name in ("CALL", "TAIL_CALL") for _, name, _ in block.instructions())
+
+class TestInlining(unittest.TestCase):
+    """
+    Which calls the codegen inlines, and that inlining doesn't change what
+    programs do.
+    """
+
+    def test_small_functions(self):
+        source = """
+let double = |x|: x * 2 end
+let f = |n|: double(n) + double(n + 1) end
+print(f(3))
+"""
+        self.assertEqual(call_count(source, "f"), 0)
+        self.assertEqual(call_count(source, "f", inline_budget=None), 2)
+        # not at the top level
+        self.assertEqual(call_count(source, "<module>"), 2)
+
+    def test_recursion(self):
+        source = """
+let countdown = |n|: if n > 0: countdown(n - 1) else: 0 end end
+let start = |n|: countdown(n) end
+print(start(5))
+"""
+        # never into itself, and the copy inlined into `start` calls the
+        # real function rather than inlining itself again
+        self.assertEqual(call_count(source, "countdown"), 1)
+        self.assertEqual(call_count(source, "start"), 1)
+
+    def test_mutual_recursion(self):
+        source = """
+let mod = |n, m|: if n < m: n else: mod(n - m, m) end end
+let even = |n|: if mod(n, 2) > 0: false else: true end end
+let check = |n|: even(n) end
+print(check(10), check(7))
+"""
+        self.assertEqual(run(source), ["true false"])
+        self.assertEqual(run(source), run(source, dict(inline_budget=None)))
+
+    def test_budget(self):
+        # the body is the block, the `+` and its two operands
+        source = """
+let add = |a, b|: a + b end
+let f = |n|: add(n, 1) end
+print(f(1))
+"""
+        self.assertEqual(call_count(source, "f", inline_budget=4), 0)
+        self.assertEqual(call_count(source, "f", inline_budget=3), 1)
+        self.assertEqual(call_count(source, "f", inline_budget=0), 1)
+
+    def test_uninlinable_bodies(self):
+        source = """
+let declares = |x|:
+    let y = x
+    y
+end
+let makes = |x|: { value: x } end
+let f = |n|: declares(n) + makes(n)["value"] end
+print(f(1))
+"""
+        self.assertEqual(call_count(source, "f", inline_budget=1000), 2)
+
+    def test_captured_variables(self):
+        source = """
+let make = |k|:
+    let add_k = |x|: x + k end
+    let g = |n|: add_k(n) end
+    g
+end
+print(make(10)(5))
+"""
+        self.assertEqual(call_count(source, "g"), 1)
+        self.assertEqual(run(source), ["15"])
+
+    def test_rebound_callee(self):
+        source = """
+let var op = |x|: x + 1 end
+let f = |n|: op(n) end
+print(f(1))
+op = |x|: x * 10 end
+print(f(1))
+"""
+        self.assertEqual(call_count(source, "f"), 1)
+        self.assertEqual(run(source), ["2", "10"])
+
+    def test_arity_mismatch(self):
+        source = """
+let one = |x|: x end
+let f = |n|: one(n, n) end
+"""
+        self.assertEqual(call_count(source, "f"), 1)
+
+    def test_same_output_without_inlining(self):
+        sources = [
+            """
+let double = |x|: x * 2 end
+let add = |a, b|: a + b end
+let pick = |c, a, b|: if c: a else: b end end
+let f = |n|: add(double(n), pick(n > 2, double(add(n, 1)), n)) end
+print(f(1), f(2), f(3), f(10))
+let greet = |name|: "hi " + name end
+let g = |a, b|: greet(a) + ", " + greet(b) end
+print(g("a", "b"))
+""",
+            """
+let inc = |x|: x + 1 end
+let add_inc = |a, b|: inc(a + b) end
+let sum_to = |n, acc|: if n > 0: sum_to(n - 1, add_inc(acc, n)) else: acc end end
+print(sum_to(10, 0))
+""",
+            """
+let var total = 0
+let get = ||: total end
+let bump = |n|:
+    total = total + n
+    get()
+end
+print(bump(1), bump(2), bump(get()))
+""",
+        ]
+        for source in sources:
+            expected = run(source, dict(inline_budget=None), **tiers["bytecode"])
+            for tier, options in tiers.items():
+                with self.subTest(tier=tier):
+                    self.assertEqual(run(source, **options), expected)
+
+if __name__ == "__main__":
+    unittest.main()
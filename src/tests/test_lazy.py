@@ -0,0 +1,66 @@
+import unittest
+
+from codegen.consts import FunctionLiteralConst
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins, spy_str
+from vm.objects import SpyRuntimeError
+from tests.common import run, run_block, tiers
+from tests.test_tiers import programs
+
+class TestLazyFunctions(unittest.TestCase):
+    """
+    Function bodies the parser skips and generates on their first call.
+    """
+
+    def test_same_results(self):
+        for label, source in programs.items():
+            expected = run(source, **tiers["bytecode"])
+            for tier, options in tiers.items():
+                with self.subTest(program=label, tier=tier):
+                    self.assertEqual(run(source, dict(lazy_functions=True), **options), expected)
+
+    def test_only_called_bodies_are_generated(self):
+        block = compile_source("""
+let called = |x|: x + 1 end
+let uncalled = |x|: x + 2 end
+print(called(1))
+""", lazy_functions=True)
+        self.assertEqual(run_block(block), ["2"])
+        pending = {const.block.name: const.block.pending is not None
+                   for const in block.consts if isinstance(const, FunctionLiteralConst)}
+        self.assertEqual(pending, {"called": False, "uncalled": True})
+
+    def test_errors_wait_for_the_first_call(self):
+        source = """
+let broken = |x|: missing(x) end
+print("before")
+broken(1)
+"""
+        lines = []
+        vm = VM({**builtins, "print": lines.append})
+        with self.assertRaisesRegex(SpyRuntimeError, "missing"):
+            vm.run_module(compile_source(source, lazy_functions=True))
+        self.assertEqual(lines, ["before"])
+        with self.assertRaises(NameError):
+            compile_source(source)
+
+    def test_module_run_in_two_vms(self):
+        block = compile_source("""
+let f = |x|:
+    x * 2
+end
+print(f(21))
+""", lazy_functions=True)
+        lines = []
+        vms = [VM({**builtins, "print": lambda value: lines.append(spy_str(value))}) for _ in range(2)]
+        # each VM's Code is made from the placeholder, and the first call
+        # generates the body for both
+        for vm in vms:
+            vm.code_for(block)
+        for vm in vms:
+            vm.run_module(block)
+        self.assertEqual(lines, ["42", "42"])
+
+if __name__ == "__main__":
+    unittest.main()
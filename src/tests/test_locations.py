@@ -0,0 +1,56 @@
+import unittest
+
+from compiler import compile_source
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.locations import LocationTable
+from codegen.module import dump_module, load_module
+from vm.objects import SpyRuntimeError
+from tests.common import run
+
+source = """
+let f = |x|:
+    let y = x * 2
+    if y > 10:
+        y(1)
+    else:
+        y + 1
+    end
+end
+print(f(2))
+print(f(6))
+"""
+
+def blocks(block: Block) -> list[Block]:
+    found = [block]
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst):
+            found += blocks(const.block)
+    return found
+
+class TestLocations(unittest.TestCase):
+    def test_error_location(self):
+        with self.assertRaisesRegex(SpyRuntimeError, "at f:5"):
+            run(source)
+
+    def test_lookup_same_before_and_after_conversion(self):
+        for block in blocks(compile_source(source)):
+            offsets = [offset for offset, _, _ in block.instructions()]
+            before = [block.locations.lookup(offset) for offset in offsets]
+            len(block.locations)
+            self.assertEqual([block.locations.lookup(offset) for offset in offsets], before)
+            self.assertNotIn(None, before)
+
+    def test_round_trip(self):
+        for block in blocks(compile_source(source)):
+            decoded = LocationTable.decode(block.locations.encode())
+            self.assertEqual(list(decoded.offsets), list(block.locations.offsets))
+            self.assertEqual(list(decoded.lines), list(block.locations.lines))
+            self.assertEqual(list(decoded.columns), list(block.locations.columns))
+
+    def test_stripped(self):
+        block = load_module(dump_module(compile_source(source), strip_locations=True))
+        self.assertTrue(all(block.locations is None for block in blocks(block)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+from compiler import compile_source
+from vm.builtins import builtins, spy_str
+from vm.registers import RegisterVM
+from tests.common import run, tiers
+
+# `say` prints its label before returning its value, so the output shows
+# which operands were evaluated.
+say = """
+let say = |label, value|:
+    print(label)
+    value
+end
+"""
+
+def run_everywhere(test: unittest.TestCase, source: str) -> list[str]:
+    """
+    Runs `source` on every tier and the register VM, checks they all print
+    the same, and returns that.
+    """
+
+    expected = run(source, **tiers["bytecode"])
+    for tier, options in tiers.items():
+        with test.subTest(tier=tier):
+            test.assertEqual(run(source, **options), expected)
+    with test.subTest(tier="registers"):
+        lines = []
+        quiet = {**builtins, "print": lambda *values: lines.append(" ".join(map(spy_str, values)))}
+        RegisterVM(quiet).run_module(compile_source(source))
+        test.assertEqual(lines, expected)
+    return expected
+
+class TestLogical(unittest.TestCase):
+    """
+    `and` and `or`, as values and as conditions.
+    """
+
+    def test_values(self):
+        self.assertEqual(run_everywhere(self, """
+print(true and false, true and true, false or true, false or false)
+print(1 and 0, 0 and 1, 0 or 5, 3 or 5, "" or "default", "a" and "b")
+let f = |a, b|: a and b end
+let g = |a, b|: a or b end
+print(f(1, 2), f(0, 2), g(0, ""), g("x", 2))
+"""), ["false true true false", "0 0 5 3 default b", "2 0  x"])
+
+    def test_precedence(self):
+        self.assertEqual(run_everywhere(self, """
+print(1 < 2 and 3, 2 < 1 or 4 > 3, 1 + 1 > 1 and 2 * 3)
+print(false and true or true, true or true and false, false or false and true)
+print(1 < 2 and 2 < 3 or 3 < 2, 1 > 2 or 2 > 3 and 3 > 2)
+"""), [
+            # comparisons bind tighter than `and` and `or`
+            "3 true 6",
+            # `and` binds tighter than `or`
+            "true true false",
+            "true false",
+        ])
+
+    def test_short_circuit(self):
+        self.assertEqual(run_everywhere(self, say + """
+print(say("a", false) and say("b", true))
+print(say("c", true) and say("d", 0))
+print(say("e", 1) or say("f", 2))
+print(say("g", 0) or say("h", 2))
+print(say("i", false) and say("j", true) and say("k", true))
+print(say("l", true) or say("m", true) and say("n", false))
+"""), ["a", "false", "c", "d", "0", "e", "1", "g", "h", "2", "i", "false", "l", "true"])
+
+    def test_conditions(self):
+        self.assertEqual(run_everywhere(self, say + """
+let check = |a, b|:
+    if say("left", a) and say("right", b): "both" else: "not both" end
+end
+let either = |a, b|:
+    if say("left", a) or say("right", b): "either" else: "neither" end
+end
+print(check(true, true), check(false, true), check(0, 1), check(1, ""))
+print(either(false, true), either(1, 0), either(0, ""))
+let nested = |a, b, c|:
+    if a and b or c: 1 elif a or b and c: 2 else: 3 end
+end
+print(nested(true, true, false), nested(false, true, true), nested(true, false, false), nested(false, true, false))
+"""), [
+            "left", "right", "left", "left", "left", "right", "both not both not both not both",
+            "left", "right", "left", "left", "right", "either either neither",
+            "1 1 2 3",
+        ])
+
+    def test_conditions_and_values_agree(self):
+        self.assertEqual(run_everywhere(self, """
+let as_condition = |a, b|: if a and b: "yes" else: "no" end end
+let as_value = |a, b|:
+    let value = a and b
+    if value: "yes" else: "no" end
+end
+let or_condition = |a, b|: if a or b: "yes" else: "no" end end
+let or_value = |a, b|:
+    let value = a or b
+    if value: "yes" else: "no" end
+end
+let each = |a, b|:
+    print(as_condition(a, b), as_value(a, b), or_condition(a, b), or_value(a, b))
+end
+each(true, false)
+each(1, 2)
+each(0, "")
+each("", "b")
+"""), ["no no yes yes", "yes yes yes yes", "no no no no", "no no yes yes"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+from codegen.consts import FunctionLiteralConst
+from codegen.module import dump_module, load_module
+from compiler import compile_source
+from tests.common import run, run_block
+
+source = """
+let apply = |f, x|: f(x) end
+let greeting = "hello"
+let make = |n|:
+    let var total = n
+    let add = |x|: total = total + x total end
+    add
+end
+let f = |n|:
+    let double = apply(|x|: x * 2 end, n)
+    let bump = apply(|x|: x + 1 end, n)
+    double + bump
+end
+let g = |n|:
+    let double = apply(|x|: x * 2 end, n)
+    let bump = apply(|x|: x + 1 end, n)
+    double - bump
+end
+let counter = make(10)
+counter(5)
+print(greeting + " " + "hello")
+print(f(7), g(7), counter(1), true, 12345678901234567890)
+"""
+
+def functions(block):
+    return {const.block.name: const.block for const in block.consts if isinstance(const, FunctionLiteralConst)}
+
+def callbacks(block):
+    # the literals passed to `apply` in `f` or `g`
+    return [const.block for const in block.consts if isinstance(const, FunctionLiteralConst)]
+
+class TestModule(unittest.TestCase):
+    """
+    Serialized modules, with and without the pool.
+    """
+
+    def test_round_trips(self):
+        expected = run(source)
+        block = compile_source(source)
+        for options in (dict(), dict(pooled=True), dict(strip_locations=True), dict(pooled=True, strip_locations=True)):
+            with self.subTest(**options):
+                data = dump_module(block, **options)
+                loaded = load_module(data)
+                self.assertEqual(dump_module(loaded, **options), data)
+                self.assertEqual(run_block(loaded), expected)
+
+    def test_shared_blocks(self):
+        block = compile_source(source)
+        for pooled in (None, False, True):
+            with self.subTest(pooled=pooled):
+                if pooled is not None:
+                    block = load_module(dump_module(block, pooled=pooled))
+                f, g = functions(block)["f"], functions(block)["g"]
+                self.assertEqual(len(callbacks(f)), 2)
+                for f_callback, g_callback in zip(callbacks(f), callbacks(g)):
+                    self.assertIs(f_callback, g_callback)
+                self.assertEqual(run_block(block), run(source))
+
+    def test_different_literals_are_not_shared(self):
+        source = """
+let apply = |f, x|: f(x) end
+let two = 2
+let three = 3
+let f = |a|:
+    print(apply(|x|: x * 2 end, a), apply(|x|: x * 3 end, a))
+    print(apply(|x|: x + two end, a), apply(|x|: x + three end, a))
+    print(apply(|x|: x + a end, 1))
+end
+let g = |b|:
+    print(apply(|x|: x + b end, 1))
+end
+let h = |a|:
+    print(apply(|x|: x + a end, 1))
+end
+f(10)
+g(20)
+h(30)
+"""
+        block = compile_source(source)
+        in_f = callbacks(functions(block)["f"])
+        constants, names = in_f[:2], in_f[2:4]
+        captured = [callbacks(functions(block)[name])[-1] for name in "fgh"]
+        self.assertIsNot(*constants)
+        self.assertIsNot(*names)
+        # only the one capturing a variable of the same name is shared
+        self.assertIsNot(captured[0], captured[1])
+        self.assertIs(captured[0], captured[2])
+        self.assertEqual(run_block(block), ["20 30", "12 13", "11", "21", "31"])
+
+    def test_function_refs(self):
+        shared, unshared = compile_source(source), compile_source(source, share_blocks=False)
+        f, g = functions(unshared)["f"], functions(unshared)["g"]
+        for f_callback, g_callback in zip(callbacks(f), callbacks(g)):
+            self.assertIsNot(f_callback, g_callback)
+        for pooled in (False, True):
+            with self.subTest(pooled=pooled):
+                # the shared callbacks are written once, then referred to
+                data = dump_module(shared, pooled=pooled)
+                self.assertLess(len(data), len(dump_module(unshared, pooled=pooled)))
+                loaded = load_module(data)
+                self.assertEqual(dump_module(loaded, pooled=pooled), data)
+                f, g = functions(loaded)["f"], functions(loaded)["g"]
+                for f_callback, g_callback in zip(callbacks(f), callbacks(g)):
+                    self.assertIs(f_callback, g_callback)
+                # and blocks that weren't shared don't become shared
+                loaded = load_module(dump_module(unshared, pooled=pooled))
+                f, g = functions(loaded)["f"], functions(loaded)["g"]
+                for f_callback, g_callback in zip(callbacks(f), callbacks(g)):
+                    self.assertIsNot(f_callback, g_callback)
+                self.assertEqual(run_block(loaded), run(source))
+
+    def test_pooled_constants_are_shared(self):
+        loaded = load_module(dump_module(compile_source(source), pooled=True))
+        # `1` is a constant of the module and of the `|x|: x + 1 end` callback
+        ones = [const for b in (loaded, callbacks(functions(loaded)["f"])[1]) for const in b.consts
+                if getattr(const, "value", None) == "1"]
+        self.assertEqual(len(ones), 2)
+        self.assertIs(ones[0], ones[1])
+
+    def test_rejects_bad_headers(self):
+        data = dump_module(compile_source(source), pooled=True)
+        for bad in (b"SPYX" + data[4:], data[:4] + b"\xff\xff" + data[6:], data[:6] + b"\x80" + data[7:]):
+            with self.assertRaises(ValueError):
+                load_module(bad)
+
+if __name__ == "__main__":
+    unittest.main()
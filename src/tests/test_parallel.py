@@ -0,0 +1,29 @@
+import unittest
+
+from codegen.module import dump_module
+from compiler import compile_source
+from tests.common import run, tiers
+from tests.test_tiers import programs
+
+class TestParallelCodegen(unittest.TestCase):
+    """
+    Module-level functions generated in worker processes.
+    """
+
+    def test_same_module(self):
+        for label, source in programs.items():
+            serial = compile_source(source)
+            parallel = compile_source(source, workers=2)
+            for pooled in (False, True):
+                with self.subTest(program=label, pooled=pooled):
+                    self.assertEqual(dump_module(parallel, pooled=pooled), dump_module(serial, pooled=pooled))
+
+    def test_same_results(self):
+        for label, source in programs.items():
+            expected = run(source, **tiers["bytecode"])
+            for tier, options in tiers.items():
+                with self.subTest(program=label, tier=tier):
+                    self.assertEqual(run(source, dict(workers=2), **options), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+
+from bench.pratt import ChainedParser
+from compiler import CompileError, compile_source
+from lex.lexer import Lexer
+from parse.parser import Parser
+from parse.parsenode import *
+
+def parse(source: str) -> tuple[ProgramNode, list[tuple[int, int, str]]]:
+    """
+    The program and the line, column and message of each diagnostic.
+    """
+
+    lexer = Lexer(source)
+    parser = Parser(lexer.lex(), lexer.line_index)
+    root = parser.parse_program()
+    return root, [(d.line, d.column, d.message) for d in parser.diagnostics]
+
+def skipped(node: ErrorNode) -> str:
+    return " ".join(token.content for token in node.tokens)
+
+def shape(expr: Expression) -> str:
+    """
+    `expr` with every operation parenthesized, operator first.
+    """
+
+    match expr:
+        case BinaryExpressionNode():
+            return f"({expr.operator} {shape(expr.left)} {shape(expr.right)})"
+        case PrefixExpressionNode():
+            return f"({expr.operator} {shape(expr.operand)})"
+        case AssignmentExpressionNode():
+            return f"(= {shape(expr.left)} {shape(expr.value)})"
+        case CallExpressionNode():
+            return f"(call {' '.join(shape(e) for e in [expr.callee, *(arg.expr for arg in expr.arglist.arguments)])})"
+        case IndexExpressionNode():
+            return f"(index {shape(expr.left)} {shape(expr.index)})"
+        case _:
+            return expr.token.content
+
+class TestErrorRecovery(unittest.TestCase):
+    """
+    Every syntax error in a source is reported, and parsing picks up again
+    at the next statement.
+    """
+
+    def test_reports_every_error_in_order(self):
+        root, errors = parse("""let a = 1 +
+let b = )
+let c = 3
+let = 4
+let d = c * 2
+""")
+        self.assertEqual(errors, [
+            (2, 1, "while parsing atomic: encountered unexpected token 'let'"),
+            (2, 9, "while parsing atomic: encountered unexpected token ')'"),
+            (4, 5, "expected identifier, but got equals '='"),
+        ])
+        self.assertEqual([type(statement) for statement in root.statements],
+                         [ErrorNode, ErrorNode, LetStatementNode, ErrorNode, LetStatementNode])
+        self.assertEqual([skipped(root.statements[i]) for i in (0, 1, 3)], ["let a = 1 +", "let b = )", "let = 4"])
+        self.assertEqual(root.statements[4].name.token.content, "d")
+
+    def test_resyncs_on_keywords(self):
+        # `print(a)` can't start a statement on its own, so it is skipped
+        # with the error before it; `if` and `let` can
+        root, errors = parse("""let a = )
+print(a)
+if a > 1: 2 else: 3 end
+let b = ( 1
+let c = 2
+""")
+        self.assertEqual([line for line, _, _ in errors], [1, 4])
+        self.assertEqual([type(statement) for statement in root.statements],
+                         [ErrorNode, ExpressionStatementNode, ErrorNode, LetStatementNode])
+        self.assertEqual(skipped(root.statements[0]), "let a = ) print ( a )")
+        self.assertIsInstance(root.statements[1].expr, IfElseExpressionNode)
+
+    def test_skips_blocks_opened_by_the_bad_statement(self):
+        # the `end`s of the function and of the `if` in the statement that
+        # failed are skipped with it, rather than closing anything else
+        root, errors = parse("""let f = |x|:
+    if x > 1: x else: 0 end
+end +
+let g = |x|:
+    let y = * x
+    if x: y else: 0 end
+end
+let h = 1
+""")
+        self.assertEqual(errors, [
+            (4, 1, "while parsing atomic: encountered unexpected token 'let'"),
+            (5, 13, "while parsing atomic: encountered unexpected token '*'"),
+        ])
+        self.assertEqual([type(statement) for statement in root.statements],
+                         [ErrorNode, LetStatementNode, LetStatementNode])
+        body = root.statements[1].value.body.statements
+        self.assertEqual([type(statement) for statement in body], [ErrorNode, ExpressionStatementNode])
+        self.assertEqual(skipped(body[0]), "let y = * x")
+        self.assertEqual(root.statements[2].name.token.content, "h")
+
+    def test_errors_in_nested_blocks(self):
+        root, errors = parse("""let f = |x|:
+    if x > 1:
+        let y = )
+        y
+    else: ( end
+    x
+end
+let g = 1
+""")
+        self.assertEqual([(line, column) for line, column, _ in errors], [(3, 17), (5, 11)])
+        self.assertEqual([type(statement) for statement in root.statements], [LetStatementNode, LetStatementNode])
+        body = root.statements[0].value.body.statements
+        self.assertEqual(len(body), 2)
+        (_, then), (_, otherwise) = body[0].expr.cases
+        # `y` can't start a statement, so it goes with the bad `let`
+        self.assertEqual([skipped(statement) for statement in then.statements], ["let y = ) y"])
+        self.assertEqual([type(statement) for statement in otherwise.statements], [ErrorNode])
+
+    def test_compile_error_has_every_diagnostic(self):
+        with self.assertRaises(CompileError) as raised:
+            compile_source("let a = )\nlet b = 1 +\nlet c = 2\nprint(c ( ]\n")
+        self.assertEqual([(d.stage, d.line) for d in raised.exception.diagnostics],
+                         [("parse", 1), ("parse", 3), ("parse", 4)])
+        self.assertEqual(str(raised.exception).count("\n"), 2)
+
+class TestPrattTables(unittest.TestCase):
+    """
+    The binding power tables parse like the precedence chains they
+    replaced, kept in `bench.pratt`.
+    """
+
+    def test_shapes(self):
+        shapes = {
+            "a + b * c - d / e": "(minus (plus a (asterisk b c)) (slash d e))",
+            "a - b - c": "(minus (minus a b) c)",
+            "a / b * c": "(asterisk (slash a b) c)",
+            "-a * -b + +c": "(plus (asterisk (minus a) (minus b)) (plus c))",
+            "a + b < c * d": "(less (plus a b) (asterisk c d))",
+            "a <= b >= c": "(greaterequals (lessequals a b) c)",
+            "f(a, b + 1)[i * 2](c)": "(call (index (call f a (plus b 1)) (asterisk i 2)) c)",
+            "-f(x)[0]": "(minus (index (call f x) 0))",
+            "x = a < b": "(= x (less a b))",
+            "a-b": "(minus a b)",
+        }
+        for source, expected in shapes.items():
+            with self.subTest(source=source):
+                root, errors = parse(source)
+                self.assertEqual(errors, [])
+                self.assertEqual(shape(root.statements[0].expr), expected)
+
+    def test_same_trees_and_errors_as_the_chains(self):
+        sources = [
+            "\n".join(shapes) for shapes in (
+                ["let v = a * 2 + b / 2 - -c * d(e, 1) <= f + g * h - 3 * i / j", "print(a < b, a > b, a >= b, a <= b)"],
+                ["let var x = 1", "x = x + 1", "let o = { a: 1 }", "print(o[\"a\"] * -x, !x)"],
+                ["let f = |a, b|: if a < b: a - b else: f(b, a)[0] end end", "print(f(1, 2) + +3)"],
+            )
+        ] + [
+            # operators that are errors, or that don't count as binary
+            # because of their spacing
+            "let a = b . c\nlet d = - e\nlet f = 1 = 2\nlet g = h -i\nlet j = k- l\nlet m = n",
+        ]
+        for source in sources:
+            with self.subTest(source=source):
+                lexer = Lexer(source)
+                tokens = lexer.lex()
+                tables, chains = Parser(tokens, lexer.line_index), ChainedParser(tokens, lexer.line_index)
+                self.assertEqual(tables.parse_program(), chains.parse_program())
+                self.assertEqual(tables.diagnostics, chains.diagnostics)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from compiler import compile_source
+from vm.builtins import builtins
+from vm.interpreter import VM
+from vm.profiler import TracingProfiler
+
+source = """
+let countdown = |n|: if n > 0: countdown(n - 1) else: 0 end end
+let double = |x|: x * 2 end
+let twice = |x|: double(double(x)) end
+let finish = |x|: double(x) end
+print(countdown(50))
+print(twice(3))
+print(finish(4))
+"""
+
+class TestProfiler(unittest.TestCase):
+    """
+    What the tracing profiler counts.
+    """
+
+    def test_block_calls(self):
+        vm = VM({**builtins, "print": lambda value: None})
+        with TracingProfiler(vm) as profile:
+            vm.run_module(compile_source(source, inline_budget=None))
+        calls = {block.name: count for block, count in profile.block_calls.items()}
+        # countdown calls itself 50 times in tail position, and `finish`
+        # tail calls `double`
+        self.assertEqual(calls["countdown"], 51)
+        self.assertEqual(calls["twice"], 1)
+        self.assertEqual(calls["finish"], 1)
+        self.assertEqual(calls["double"], 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from compiler import compile_source
+from vm.interpreter import VM
+from vm.builtins import builtins
+from tests.common import run, tiers
+
+# Passing the functions to `apply` keeps them from being inlined and their
+# parameters untyped, so their operations are the generic instructions.
+# Each is warmed up on ints, or strings for `join`, and then given
+# something else.
+source = """
+let add = |a, b|: a + b end
+let subtract = |a, b|: a - b end
+let multiply = |a, b|: a * b end
+let divide = |a, b|: a / b end
+let less = |a, b|: a < b end
+let smaller = |a, b|: if a < b: a else: b end end
+let at_least = |a, b|: a >= b end
+let join = |a, b|: a + b end
+let apply = |f, a, b|: f(a, b) end
+let each = |i|:
+    if i < 20:
+        print(apply(add, i, 3), apply(subtract, i, 3), apply(multiply, i, 3), apply(divide, i * 7, 3))
+        print(apply(less, i, 10), apply(smaller, i, 10), apply(at_least, i, 10), apply(join, "a", "b"))
+        each(i + 1)
+    end
+end
+each(0)
+print(apply(add, "x", "y"), apply(subtract, true, 2), apply(multiply, "ab", 3), apply(divide, true, 2))
+print(apply(less, "a", "b"), apply(smaller, "b", "a"), apply(at_least, "b", "a"), apply(join, 1, 2))
+print(apply(add, 1, 2), apply(less, 1, 2), apply(join, "c", "d"))
+"""
+
+class TestQuickening(unittest.TestCase):
+    """
+    Specialized instructions, and their fallback to the generic ones.
+    """
+
+    def test_same_results(self):
+        self.assertEqual(run(source, **tiers["quickened"]), run(source, **tiers["bytecode"]))
+
+    def test_misses_fall_back(self):
+        vm = VM({**builtins, "print": lambda *values: None}, count_quickening_hits=True, **tiers["quickened"])
+        vm.run_module(compile_source(source))
+        summary = vm.quickening.summary()
+        # each form ran 20 times with the operands it was made for, then
+        # missed once and turned back into the generic instruction, which
+        # ran the last line
+        for name in ("ADD_INT", "SUBTRACT_INT", "MULTIPLY_INT", "DIVIDE_INT", "GTEQ_INT", "ADD_STR"):
+            with self.subTest(name):
+                self.assertEqual(summary[name], {"specialized": 1, "hits": 20, "misses": 1})
+        self.assertEqual(summary["LT_INT"], {"specialized": 2, "hits": 40, "misses": 2})
+
+    def test_hits_only_counted_on_request(self):
+        vm = VM({**builtins, "print": lambda *values: None}, **tiers["quickened"])
+        vm.run_module(compile_source(source))
+        self.assertEqual(vm.quickening.summary()["ADD_INT"], {"specialized": 1, "hits": 0, "misses": 1})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from compiler import compile_source
+from vm.builtins import builtins, spy_str
+from vm.registers import RegisterVM
+from tests.common import run, tiers
+from tests.test_tiers import programs
+
+class TestRegisterVM(unittest.TestCase):
+    """
+    The register VM prints what the stack VM prints.
+    """
+
+    def test_programs(self):
+        for label, source in programs.items():
+            with self.subTest(program=label):
+                lines = []
+                quiet = {**builtins, "print": lambda *values: lines.append(" ".join(map(spy_str, values)))}
+                RegisterVM(quiet).run_module(compile_source(source))
+                self.assertEqual(lines, run(source, **tiers["bytecode"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+
+from bench.resolve import ScopeChainResolver
+from lex.lexer import Lexer
+from parse.parser import Parser
+from process.binding import Resolver
+from vm.builtins import builtins
+
+def resolve(source: str, cls: type[Resolver] = Resolver) -> tuple[Resolver, list[tuple[str, int, int]]]:
+    """
+    The resolver, and the name, line and line of its declaration of every
+    reference in `source`, in source order.
+    """
+
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = cls(root, builtins.keys())
+    resolver.resolve()
+    line = lambda token: lexer.line_index.line_col(token.position[0])[0]
+    references = sorted(
+        (node.token.position[0], node.token.content, line(node.token), line(info.decl.name.token))
+        for node, info in resolver.bindings.items())
+    return resolver, [reference[1:] for reference in references]
+
+# the line numbers in the tests count from the line after the opening quotes
+nested_functions = """
+let x = 1
+let f = |x|:
+    let g = |y|:
+        let x = y + x
+        x
+    end
+    g(x)
+end
+print(f(x), x)
+"""
+
+nested_blocks = """
+let a = 1
+let f = |b|:
+    if b > a:
+        let a = b
+        if a > 2:
+            let b = a
+            b
+        else: a end
+    else:
+        a + b
+    end
+end
+print(f(a), a)
+"""
+
+class TestResolver(unittest.TestCase):
+    """
+    Identifiers bind to the innermost declaration in scope, through the
+    flat map from names to binding stacks.
+    """
+
+    def test_shadowing_in_nested_functions(self):
+        resolver, references = resolve(nested_functions)
+        self.assertEqual(references, [
+            # `let x` isn't in scope until after its value
+            ("y", 5, 4), ("x", 5, 3),
+            ("x", 6, 5),
+            ("g", 8, 4), ("x", 8, 3),
+            ("f", 10, 3), ("x", 10, 2), ("x", 10, 2),
+        ])
+        # leaving the functions popped everything they declared
+        self.assertEqual({name: len(stack) for name, stack in resolver.names.items()}, {"x": 1, "f": 1})
+        # `g` uses the parameter `x`, which never changes, so it gets a copy
+        g = resolver.root.statements[1].value.body.statements[0].value
+        self.assertEqual(resolver.copied_variables, {g: ["x"]})
+        self.assertEqual(resolver.cell_variables, {})
+
+    def test_shadowing_in_nested_blocks(self):
+        resolver, references = resolve(nested_blocks)
+        self.assertEqual(references, [
+            ("b", 4, 3), ("a", 4, 2),
+            ("b", 5, 3),
+            ("a", 6, 5),
+            ("a", 7, 5),
+            ("b", 8, 7),
+            ("a", 9, 5),
+            ("a", 11, 2), ("b", 11, 3),
+            ("f", 14, 3), ("a", 14, 2), ("a", 14, 2),
+        ])
+        self.assertEqual(set(resolver.names), {"a", "f"})
+
+    def test_captures_through_the_stacks(self):
+        resolver, references = resolve("""
+let make = |n|:
+    let var total = n
+    let add = |x|:
+        let n = x
+        total = total + n
+        total
+    end
+    add
+end
+""")
+        self.assertEqual([reference for reference in references if reference[0] == "n"], [("n", 3, 2), ("n", 6, 5)])
+        make = resolver.root.statements[0].value
+        add = make.body.statements[1].value
+        self.assertEqual(resolver.cell_variables, {make: ["total"]})
+        self.assertEqual(resolver.free_variables, {add: ["total"]})
+
+    def test_out_of_scope(self):
+        for source in (
+                "if true: let b = 1 end\nb",
+                "let f = |p|: p end\np",
+                "let f = ||: let local = 1 local end\nlet g = ||: local end",
+                "let a = a"):
+            with self.subTest(source=source):
+                with self.assertRaises(NameError):
+                    resolve(source)
+
+    def test_redeclared_globals(self):
+        resolver, references = resolve("let a = 1\nlet a = a + 1\nprint(a)")
+        self.assertEqual(references, [("a", 2, 1), ("a", 3, 2)])
+        self.assertEqual(len(resolver.names["a"]), 2)
+        self.assertTrue(all(not info.immutable for info in resolver.names["a"]))
+
+    def test_same_as_walking_the_scope_chain(self):
+        for source in (nested_functions, nested_blocks):
+            with self.subTest(source=source):
+                flat, chain = resolve(source), resolve(source, ScopeChainResolver)
+                self.assertEqual(flat[1], chain[1])
+                self.assertEqual(flat[0].bindings, chain[0].bindings)
+
+if __name__ == "__main__":
+    unittest.main()
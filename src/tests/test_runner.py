@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+from vm.runner import ModuleCache, run_batch, run_script
+
+scripts = {
+    "ok.spy": "print(1 + 2)\n",
+    "syntax.spy": "print(1 +)\n",
+    "undefined.spy": "print(missing)\n",
+    "failing.spy": "let f = |x|: x end\nf(1, 2)\n",
+}
+
+class TestRunner(unittest.TestCase):
+    """
+    Batches of scripts, where one failing never stops the others.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cache = ModuleCache(os.path.join(self.directory.name, "cache"))
+        self.paths = []
+        for name, source in scripts.items():
+            path = os.path.join(self.directory.name, name)
+            with open(path, "w") as file:
+                file.write(source)
+            self.paths.append(path)
+
+    def test_failures_are_reported_per_script(self):
+        report = run_batch(self.paths, self.cache, processes=2)
+        results = {os.path.basename(result.path): result for result in report.results}
+        self.assertEqual(results["ok.spy"].output, "3")
+        self.assertIsNone(results["ok.spy"].error)
+        self.assertIn("parse error", results["syntax.spy"].error)
+        self.assertIn("NameError", results["undefined.spy"].error)
+        self.assertIn("argument", results["failing.spy"].error)
+        self.assertEqual(len(report.failed), 3)
+
+    def test_unloadable_module(self):
+        path = os.path.join(self.directory.name, "broken.spyc")
+        with open(path, "wb") as file:
+            file.write(b"SPYC\xff")
+        result = run_script("broken.spy", path)
+        self.assertEqual(result.path, "broken.spy")
+        self.assertIn("unpack", result.error)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from vm.objects import SpyRuntimeError
+from tests.common import run, tiers
+
+class TestTailCalls(unittest.TestCase):
+    def test_deep_self_recursion(self):
+        source = """
+let count = |n, acc|:
+    if n < 1: acc
+    else: count(n - 1, acc + 1)
+    end
+end
+print(count(50000, 0))
+"""
+        for tier, options in tiers.items():
+            with self.subTest(tier=tier):
+                self.assertEqual(run(source, max_depth=100, **options), ["50000"])
+
+    def test_deep_mutual_recursion(self):
+        source = """
+let even = |n, odd|: if n < 1: true else: odd(n - 1, even) end end
+let odd = |n, even|: if n < 1: false else: even(n - 1, odd) end end
+print(even(20001, odd))
+"""
+        for tier, options in tiers.items():
+            with self.subTest(tier=tier):
+                self.assertEqual(run(source, max_depth=100, **options), ["false"])
+
+    def test_self_call_with_wrong_argument_count(self):
+        source = """
+let f = |a, b|: if a > 100: a else: f(a + 1) end end
+print(f(1, 2))
+"""
+        for tier, options in tiers.items():
+            with self.subTest(tier=tier):
+                with self.assertRaisesRegex(SpyRuntimeError, r"f takes 2 argument\(s\) but got 1"):
+                    run(source, **options)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from tests.common import run, tiers
+
+programs = {
+    "recursion": """
+let fib = |n|:
+    if n < 2: n
+    else: fib(n - 1) + fib(n - 2)
+    end
+end
+print(fib(15))
+""",
+    "closures": """
+let make_counter = ||:
+    let var count = 0
+    ||:
+        count = count + 1
+        count
+    end
+end
+let counter = make_counter()
+let run = |n|: if n > 0: counter() run(n - 1) else: counter() end end
+print(run(300))
+let adder = |a|: |b|: a + b end end
+print(adder(3)(4))
+""",
+    "mixed": """
+let mod = |n, d|: n - n / d * d end
+let label = |i|:
+    if mod(i, 15) < 1: "FizzBuzz"
+    elif mod(i, 3) < 1: "Fizz"
+    elif mod(i, 5) < 1: "Buzz"
+    else: i
+    end
+end
+let each = |i|: if i < 31: print(label(i)) each(i + 1) end end
+each(1)
+print(1 > 2 or 3 > 2 and "yes")
+print(!true or false)
+print(7 / 2)
+print(-7 / 2)
+""",
+    # calls made from a frame running threaded code into ones that aren't
+    # yet, and back, with frames reused between them
+    "tier changes": """
+let leaf = |x|: x * 2 end
+let middle = |x|: leaf(x) + leaf(x + 1) end
+let top = |n, acc|: if n < 1: acc else: top(n - 1, acc + middle(n)) end end
+print(top(400, 0))
+print(top(400, 0))
+""",
+}
+
+class TestTiers(unittest.TestCase):
+    """
+    Every tier prints what the bytecode loop prints.
+    """
+
+    def test_programs(self):
+        for label, source in programs.items():
+            expected = run(source, **tiers["bytecode"])
+            for tier, options in tiers.items():
+                with self.subTest(program=label, tier=tier):
+                    self.assertEqual(run(source, **options), expected)
+
+    def test_default_thresholds(self):
+        for label, source in programs.items():
+            with self.subTest(program=label):
+                self.assertEqual(run(source), run(source, **tiers["bytecode"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import dataclasses
+import unittest
+
+from codegen.consts import FunctionLiteralConst
+from compiler import compile_source
+from lex.lexer import Lexer
+from parse.parser import Parser
+from parse.parsenode import LetStatementNode
+from process.binding import Resolver
+from process.types import TypeInference
+from vm.builtins import builtins
+from tests.common import run, tiers
+
+def let_types(source: str) -> dict[str, str | None]:
+    """
+    The inferred type of the value of every `let` in `source`, by name.
+    """
+
+    lexer = Lexer(source)
+    root = Parser(lexer.lex(), lexer.line_index).parse_program()
+    resolver = Resolver(root, builtins.keys())
+    resolver.resolve()
+    types = TypeInference(resolver)
+    types.infer()
+
+    found = {}
+    def walk(value):
+        if isinstance(value, (list, tuple)):
+            for item in value:
+                walk(item)
+        elif dataclasses.is_dataclass(value):
+            if isinstance(value, LetStatementNode):
+                found[value.name.token.content] = types.type_of(value.value)
+            for field in dataclasses.fields(value):
+                walk(getattr(value, field.name))
+    walk(root)
+    return found
+
+def instruction_names(source: str, function: str) -> set[str]:
+    block = compile_source(source)
+    for const in block.consts:
+        if isinstance(const, FunctionLiteralConst) and const.block.name == function:
+            return {name for _, name, _ in const.block.instructions()}
+    raise KeyError(function)
+
+class TestTypeInference(unittest.TestCase):
+    """
+    The types codegen's typed instructions rely on.
+    """
+
+    def test_literals_and_operators(self):
+        types = let_types("""
+let n = 1 + 2 * 3
+let s = "a" + "b"
+let b = 1 < 2
+let o = { a: 1 }
+let f = |x|: x end
+let mixed = 1 + "a"
+""")
+        self.assertEqual(types, {"n": "int", "s": "string", "b": "bool", "o": "object", "f": "function",
+                                 "mixed": None})
+
+    def test_parameters_of_known_functions(self):
+        types = let_types("""
+let add = |a, b|:
+    let sum = a + b
+    sum
+end
+let same = |x|:
+    let copy = x
+    copy
+end
+let never_called = |y|:
+    let unused = y
+    unused
+end
+print(add(1, 2) + add(3, 4))
+same(1)
+same("one")
+""")
+        self.assertEqual(types["sum"], "int")
+        # called with an int and with a string
+        self.assertIsNone(types["copy"])
+        # no argument ever reached it
+        self.assertIsNone(types["unused"])
+
+    def test_reassigned_variables(self):
+        types = let_types("""
+let var changes = 1
+changes = "now a string"
+let read_changes = changes
+let var counter = 1
+counter = counter + 1
+let read_counter = counter
+let f = ||:
+    let var inner = 0
+    inner = true
+    let read_inner = inner
+    read_inner
+end
+f()
+""")
+        self.assertIsNone(types["read_changes"])
+        self.assertEqual(types["read_counter"], "int")
+        self.assertIsNone(types["read_inner"])
+
+    def test_escaping_functions(self):
+        types = let_types("""
+let escapes = |x|:
+    let copy = x
+    copy + 1
+end
+let rebound = |x|:
+    let copy_rebound = x
+    copy_rebound
+end
+let apply = |f, value|: f(value) end
+print(apply(escapes, 1))
+print(escapes(2))
+let alias = rebound
+print(alias("text"))
+print(rebound(3))
+""")
+        # both are used as values, so their calls aren't all known
+        self.assertIsNone(types["copy"])
+        self.assertIsNone(types["copy_rebound"])
+
+    def test_typed_instructions(self):
+        source = """
+let known = |a, b|: if a < b: a + b else: a * b end end
+let unknown = |a, b|: if a < b: a + b else: a * b end end
+let apply = |f, a, b|: f(a, b) end
+print(known(1, 2), known(4, 3))
+print(apply(unknown, 1, 2), apply(unknown, "a", "b"))
+"""
+        self.assertTrue({"INT_LT", "INT_ADD", "INT_MULTIPLY"} <= instruction_names(source, "known"))
+        self.assertTrue({"LT", "ADD", "MULTIPLY"} <= instruction_names(source, "unknown"))
+        self.assertFalse({"INT_LT", "INT_ADD", "INT_MULTIPLY"} & instruction_names(source, "unknown"))
+
+    def test_same_output_without_inference(self):
+        sources = [
+            """
+let add = |a, b|: a + b end
+let label = |n|: if n > 10: "big" elif n > 5: "medium" else: "small" end end
+print(add(1, 2), add(40, 2), label(add(3, 4)), label(add(10, 20)), label(1))
+let var total = 0
+let bump = |n|: total = total + n total end
+print(bump(1), bump(2), bump(3))
+let greet = |name|: "hello " + name end
+print(greet("spy"))
+""",
+            """
+let apply = |f, a, b|: f(a, b) end
+let combine = |a, b|: if a < b: a + b else: a - b end end
+print(apply(combine, 1, 2), apply(combine, 5, 2), apply(combine, "a", "b"))
+print(combine(7, 3), combine(2, 9))
+""",
+        ]
+        for source in sources:
+            expected = run(source, dict(infer_types=False), **tiers["bytecode"])
+            for tier, options in tiers.items():
+                with self.subTest(tier=tier):
+                    self.assertEqual(run(source, **options), expected)
+
+if __name__ == "__main__":
+    unittest.main()
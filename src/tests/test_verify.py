@@ -0,0 +1,83 @@
+import unittest
+
+from codegen.consts import FunctionLiteralConst
+from codegen.instructions import instruction_values
+from codegen.module import dump_module, load_module
+from codegen.verify import VerifyError, verify_block
+from compiler import compile_source
+
+source = """
+let f = |a, b|:
+    let c = a + b
+    if a > b: c else: b end
+end
+print(f(1, 2))
+"""
+
+# `f` compiles to
+#
+#   0000 LOAD_LOCAL 0
+#   0003 LOAD_LOCAL 1
+#   0006 INT_ADD
+#   0007 STORE_LOCAL 2
+#   000A LOAD_LOCAL 0
+#   000D LOAD_LOCAL 1
+#   0010 INT_GT
+#   0011 JUMP_FORWARD_FALSE 9
+#   0014 LOAD_LOCAL 2
+#   0017 JUMP_FORWARD 6
+#   001A LOAD_LOCAL 1
+#   001D RETURN
+
+def replace(offset: int, *values: int):
+    def change(block):
+        block.body[offset:offset + len(values)] = bytes(values)
+    return change
+
+def set_attribute(name: str, value):
+    return lambda block: setattr(block, name, value)
+
+def truncate(length: int):
+    def change(block):
+        del block.body[length:]
+    return change
+
+# each malformed case `verify_block` documents, as a change to `f` and
+# part of the error it gives
+cases = {
+    "unknown opcode": (replace(0x06, 0xFF), "unknown opcode 0xff"),
+    "quickened opcode": (replace(0x06, instruction_values["SPECIALIZE"]), "only created by the VM"),
+    "placeholder body": (replace(0x06, instruction_values["LAZY_BODY"]), "never generated"),
+    "missing operand": (truncate(0x1C), "missing its operand"),
+    "local out of range": (replace(0x15, 0, 9), "LOAD_LOCAL operand 9 is out of range"),
+    "jump into an instruction": (replace(0x18, 0, 5), "isn't an instruction"),
+    "too many arguments": (set_attribute("argument_count", 4), "4 arguments but only 3 locals"),
+    "copied variables": (set_attribute("copied_names", ["a"]), "copied variables"),
+    "paths disagree": (replace(0x12, 0, 12), "reached with stack depths 1 and 0"),
+    "empty stack": (replace(0x00, instruction_values["POP"], instruction_values["NOP"], instruction_values["NOP"]), "stack holds 0"),
+    "wrong max stack depth": (set_attribute("max_stack_depth", 5), "max stack depth is 2, not 5"),
+    "no return": (replace(0x1D, instruction_values["POP"]), "run off its end"),
+}
+
+def function(module):
+    return next(const.block for const in module.consts if isinstance(const, FunctionLiteralConst))
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        self.module = compile_source(source, locations=False)
+
+    def test_accepts_generated_code(self):
+        verify_block(self.module)
+
+    def test_rejects_malformed_blocks(self):
+        for label, (change, message) in cases.items():
+            with self.subTest(label):
+                module = load_module(dump_module(self.module))
+                change(function(module))
+                with self.assertRaisesRegex(VerifyError, message):
+                    verify_block(module)
+                with self.assertRaisesRegex(VerifyError, message):
+                    load_module(dump_module(module))
+
+if __name__ == "__main__":
+    unittest.main()
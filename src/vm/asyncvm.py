@@ -0,0 +1,142 @@
+import asyncio
+import sys
+
+from codegen.block import Block
+from codegen.instructions import instruction_values
+from vm.objects import *
+from vm.interpreter import VM, Frame, SUSPENDED
+
+_jump_backward = instruction_values["JUMP_BACKWARD"]
+
+class BudgetExceeded(SpyRuntimeError):
+    """
+    Raised when a run executes more instructions or holds more memory
+    than its budget allows.
+    """
+
+class AsyncVM(VM):
+    """
+    A VM for running SPY inside an asyncio event loop.
+
+    `run_module_async` and `call_async` give the event loop back every
+    `yield_every` instructions, and with `yield_on_back_edges` also at
+    every JUMP_BACKWARD, so other coroutines keep running while SPY code
+    does. Each AsyncVM runs one module or call at a time; create one per
+    concurrent evaluation.
+
+    A run raises `BudgetExceeded` once it has executed `instruction_budget`
+    instructions, or when its live values are found to take more than
+    `memory_budget` bytes. Memory is estimated at each yield, from the
+    globals and the values reachable from the active frames.
+
+    Counting instructions uses the tracer, so runs stay on the bytecode
+    loop rather than the faster tiers.
+    """
+
+    def __init__(
+            self,
+            builtins: dict[str, object] | None = None,
+            max_depth: int = 10_000,
+            yield_every: int = 1000,
+            yield_on_back_edges: bool = False,
+            instruction_budget: int | None = None,
+            memory_budget: int | None = None):
+        super().__init__(builtins, max_depth)
+        self.yield_every = yield_every
+        self.yield_on_back_edges = yield_on_back_edges
+        self.instruction_budget = instruction_budget
+        self.memory_budget = memory_budget
+        self.executed = 0
+        self._until_yield = yield_every
+        # set while continuing a suspended run, whose next instruction was
+        # counted before it suspended and must now run rather than yield
+        self._resuming = False
+        self.tracer = self._count
+
+    def _count(self, frames: list[Frame], pc: int) -> bool:
+        if self._resuming:
+            self._resuming = False
+            return False
+
+        self.executed += 1
+        if self.instruction_budget is not None and self.executed > self.instruction_budget:
+            raise BudgetExceeded(f"instruction budget of {self.instruction_budget} exceeded")
+
+        self._until_yield -= 1
+        if self._until_yield <= 0 \
+                or (self.yield_on_back_edges and frames[-1].code.body[pc] == _jump_backward):
+            self._until_yield = self.yield_every
+            if self.memory_budget is not None and (used := self.live_bytes()) > self.memory_budget:
+                raise BudgetExceeded(f"memory budget of {self.memory_budget} bytes exceeded ({used} bytes)")
+            return True
+        return False
+
+    def live_bytes(self) -> int:
+        """
+        Estimates the memory held by the globals and the active frames,
+        counting every reachable value once.
+        """
+
+        seen = set()
+        total = 0
+        pending: list[object] = [self.globals]
+        for frame in self.frames:
+            pending.append(frame.values)
+            pending.append(frame.derefs)
+            if frame.stack is not None:
+                pending.append(frame.stack)
+
+        while pending:
+            value = pending.pop()
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            total += sys.getsizeof(value)
+            match value:
+                case dict():
+                    pending.extend(value.keys())
+                    pending.extend(value.values())
+                case list() | tuple():
+                    pending.extend(value)
+                case SpyObject():
+                    pending.append(value.attributes)
+                case Cell():
+                    pending.append(value.value)
+                case Function():
+                    pending.append(value.closure)
+        return total
+
+    async def run_module_async(self, block: Block):
+        """
+        Runs a module block to completion in this VM's globals, yielding to
+        the event loop as it goes.
+        """
+
+        code = self.code_for(block)
+        return await self._run_async(Frame(code, None, code.padding.copy()))
+
+    async def call_async(self, function: Function, *args):
+        """
+        Calls a SPY function and returns its result, yielding to the event
+        loop as it goes.
+        """
+
+        return await self._run_async(self._enter(function, list(args)))
+
+    async def _run_async(self, frame: Frame):
+        if self.frames:
+            raise SpyRuntimeError("this VM is already running")
+        self.executed = 0
+        self._until_yield = self.yield_every
+        self._resuming = False
+        result = self._run(frame)
+        try:
+            while result is SUSPENDED:
+                await asyncio.sleep(0)
+                self._resuming = True
+                result = self._run(self.frames[-1], 0)
+        except asyncio.CancelledError:
+            # abandon the suspended run
+            self.frames.clear()
+            raise
+        return result
@@ -0,0 +1,25 @@
+import math
+
+def spy_str(value) -> str:
+    """
+    Formats a value the way SPY prints it.
+    """
+
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif value is None:
+        return "none"
+    return str(value)
+
+def spy_print(*values):
+    print(*map(spy_str, values))
+
+def spy_sqrt(value):
+    return math.sqrt(value)
+
+builtins = {
+    "print": spy_print,
+    "sqrt": spy_sqrt,
+}
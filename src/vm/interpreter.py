@@ -0,0 +1,899 @@
+from typing import Callable
+
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from vm.objects import *
+from vm.builtins import builtins as default_builtins
+from vm.threaded import thread_code
+from vm.quicken import QuickeningStats, quicken, specialize
+from vm.transpile import transpile, Untranslatable
+
+class Frame:
+    """
+    The state of one call: its cells (own cells first, then the free
+    variables copied from the closure) and `values`, which holds its
+    locals (the values copied from the closure among them) followed by its
+    value stack. `values` is allocated once at its
+    full size, `code.local_count + code.max_stack_depth`, and `sp` indexes
+    the top of the stack in it. `pc` and `sp` are only up to date while
+    the frame is waiting on a call.
+
+    Frames running in the threaded tier keep their value stack in `stack`
+    instead; it is None for frames running bytecode. The stack is empty
+    once the frame returns, so a reused frame keeps its list.
+    """
+    __slots__ = ('code', 'function', 'values', 'derefs', 'sp', 'pc', 'stack')
+
+    def __init__(self, code: Code, function: Function | None, values: list):
+        self.code = code
+        self.function = function
+        self.values = values
+        self.derefs = [Cell() for _ in range(code.cell_count)] + [None] * code.free_count
+        self.sp = code.local_count
+        self.pc = 0
+        self.stack = None
+
+type Tracer = Callable[[list[Frame], int], bool | None]
+
+# Returned by `VM._run` when its tracer suspended the run
+SUSPENDED = object()
+
+class VM:
+    """
+    Executes compiled SPY modules.
+
+    Calls between SPY functions don't recurse in Python: every active call
+    is a `Frame` on `frames`, and the dispatch loop in `_run` switches
+    between them, so SPY recursion is only limited by `max_depth`.
+
+    Frames of finished calls are kept on their code's free list, up to
+    `frame_pool_size` per function, and reused by later calls to it.
+
+    After `quicken_threshold` calls, the instructions of a function that
+    can be specialized are rewritten in place into forms for the operand
+    types they see, like ADD_INT, which fall back to the generic
+    instruction when they see something else (see `vm.quicken`).
+    `quickening` counts how that goes, including how often each form
+    runs if `count_quickening_hits` is set. None disables quickening.
+
+    Once a function has been called `tier_up_threshold` times it is
+    translated to direct-threaded code (see `vm.threaded`), which later
+    calls run instead of decoding the bytecode. None disables tiering.
+
+    After `transpile_threshold` calls a function is also translated to
+    Python (see `vm.transpile`) where possible, and later calls run that
+    Python function instead. Those calls recurse in Python, so once
+    `max_native_depth` of them are active, further calls run in frames
+    again. None disables the Python tier.
+
+    If `tracer` is set it is called before every instruction with the
+    frame stack and the offset of the instruction about to run. If it
+    returns true, the run is suspended before that instruction and can be
+    continued later; see `vm.asyncvm`.
+    """
+    frames: list[Frame]
+    globals: dict[str, object]
+    tracer: Tracer | None
+
+    def __init__(
+            self,
+            builtins: dict[str, object] | None = None,
+            max_depth: int = 10_000,
+            frame_pool_size: int = 64,
+            tier_up_threshold: int | None = 100,
+            transpile_threshold: int | None = 1000,
+            max_native_depth: int = 100,
+            quicken_threshold: int | None = 8,
+            count_quickening_hits: bool = False):
+        self.builtins = builtins if builtins is not None else default_builtins
+        self.max_depth = max_depth
+        self.frame_pool_size = frame_pool_size
+        self.tier_up_threshold = tier_up_threshold
+        self.transpile_threshold = transpile_threshold
+        self.max_native_depth = max_native_depth
+        self.quicken_threshold = quicken_threshold
+        self.quickening = QuickeningStats(count_quickening_hits)
+        self.native_depth = 0
+        self.globals = {}
+        self.frames = []
+        self.tracer = None
+        self.codes: dict[Block, Code] = {}
+        # runtime values of scalar constants by the id of the const, which
+        # `codes` keeps alive; blocks of a pooled module share their const
+        # objects, so each is only materialized once
+        self.const_values: dict[int, object] = {}
+
+    def code_for(self, block: Block) -> Code:
+        """
+        Gets the runtime form of `block`, creating it on first use.
+        """
+
+        code = self.codes.get(block)
+        if code is None:
+            code = Code(block, self._materialize_consts(block))
+            self.codes[block] = code
+        return code
+
+    def _materialize_consts(self, block: Block) -> list:
+        consts = []
+        for const in block.consts:
+            if type(const) is FunctionLiteralConst:
+                nested = const.block
+                closure_indices = tuple(block.get_deref_index(name) for name in nested.free_names)
+                copied_indices = tuple(block.get_local_index(name) for name in nested.copied_names)
+                if None in closure_indices or None in copied_indices:
+                    raise SpyRuntimeError(f"{nested.name} captures a variable {block.name} doesn't have")
+                consts.append(FunctionTemplate(self.code_for(nested), closure_indices, copied_indices))
+            else:
+                key = id(const)
+                if key not in self.const_values:
+                    self.const_values[key] = materialize_const(const)
+                consts.append(self.const_values[key])
+        return consts
+
+    def _generate_body(self, code: Code):
+        """
+        Generates the body of `code`'s function, which the parser skipped
+        (see `Block.pending`), and brings `code` up to date with it. Another
+        VM running the same module may have generated it already, in which
+        case `code` is only brought up to date. The call that got here
+        doesn't count towards tiering up.
+        """
+
+        block = code.block
+        if block.pending is not None:
+            block.pending()
+        Code.__init__(code, block, self._materialize_consts(block))
+
+    def run_module(self, block: Block):
+        """
+        Runs a module block to completion in this VM's globals.
+        """
+
+        code = self.code_for(block)
+        return self._run(Frame(code, None, code.padding.copy()))
+
+    def call(self, function: Function, *args):
+        """
+        Calls a SPY function from Python and returns its result.
+        """
+
+        return self._run(self._enter(function, list(args)))
+
+    def _enter(self, function: Function, args: list) -> Frame:
+        """
+        Gets a frame for a call to `function`, reusing a free one if there
+        is one, and counts the call towards tiering up.
+        """
+
+        code = function.code
+        if len(args) != code.argument_count:
+            raise SpyRuntimeError(
+                f"{code.name} takes {code.argument_count} argument(s) but got {len(args)}")
+        code.calls += 1
+        if self.tracer is None:
+            if code.calls == self.tier_up_threshold:
+                self._tier_up(code)
+            elif code.calls == self.transpile_threshold:
+                self._transpile(code)
+            elif code.calls == self.quicken_threshold:
+                quicken(code, self.quickening)
+
+        if code.free_frames:
+            frame = code.free_frames.pop()
+            frame.function = function
+            frame.values[:len(args)] = args
+            if code.local_padding:
+                frame.values[len(args):code.local_count] = code.local_padding
+            if code.cell_count:
+                frame.derefs[:code.cell_count] = [Cell() for _ in range(code.cell_count)]
+        else:
+            frame = Frame(code, function, args + code.padding)
+        frame.pc = 0
+        frame.sp = code.local_count
+        if code.threaded is None or self.tracer is not None:
+            frame.stack = None
+        elif frame.stack is None:
+            frame.stack = []
+        return frame
+
+    def _tail_call(self, frame: Frame, function: Function, args: list) -> Frame:
+        """
+        Replaces `frame`, the innermost one, with a frame for a call to
+        `function`.
+        """
+
+        if len(frame.code.free_frames) < self.frame_pool_size:
+            frame.code.free_frames.append(frame)
+        frame = self._enter(function, args)
+        self.frames[-1] = frame
+        return frame
+
+    def _return(self, frame: Frame, value, base: int) -> Frame | None:
+        """
+        Finishes `frame`, the innermost one, passing `value` to its caller.
+        Returns the caller, or None when `frame` was the first one `_run`
+        was given.
+        """
+
+        frames = self.frames
+        frames.pop()
+        if len(frame.code.free_frames) < self.frame_pool_size:
+            frame.code.free_frames.append(frame)
+        if len(frames) == base:
+            return None
+        caller = frames[-1]
+        if caller.stack is not None:
+            caller.stack.append(value)
+        else:
+            caller.values[caller.sp] = value
+            caller.sp += 1
+        return caller
+
+    def _tier_up(self, code: Code):
+        if code.block.pending is not None:
+            # the placeholder is about to be replaced
+            return
+        code.threaded = thread_code(code, self.globals, self.builtins)
+
+    def _transpile(self, code: Code):
+        if code.block.pending is not None:
+            return
+        try:
+            code.native = transpile(code, self)
+        except Untranslatable:
+            # the function keeps running in the VM
+            pass
+
+    def _call_native(self, function: Function, args):
+        """
+        Calls `function` through its Python translation.
+        """
+
+        code = function.code
+        if len(args) != code.argument_count:
+            raise SpyRuntimeError(
+                f"{code.name} takes {code.argument_count} argument(s) but got {len(args)}")
+        self.native_depth += 1
+        try:
+            return code.native(function, *args)
+        finally:
+            self.native_depth -= 1
+
+    def traceback(self, pc: int) -> list[str]:
+        """
+        Describes each active call, outermost first, given the offset the
+        innermost one is at.
+        """
+
+        trace = [frame.code.location(frame.pc) for frame in self.frames[:-1]]
+        if self.frames:
+            trace.append(self.frames[-1].code.location(pc))
+        return trace
+
+    def _run(self, frame: Frame, base: int | None = None):
+        """
+        Runs `frame` until it returns, and returns its result. With `base`,
+        instead continues a suspended run whose first frame is at `base`
+        and whose innermost frame is `frame`. Returns `SUSPENDED` when the
+        tracer suspends the run.
+        """
+
+        frames = self.frames
+        if base is None:
+            base = len(frames)
+            frames.append(frame)
+
+        code = frame.code
+        body = code.body
+        consts = code.consts
+        values = frame.values
+        derefs = frame.derefs
+        sp = frame.sp
+        pc = frame.pc
+        tracer = self.tracer
+        pool_size = self.frame_pool_size
+        # tracing needs every instruction to go through this loop
+        threshold = self.tier_up_threshold if tracer is None else None
+        transpile_threshold = self.transpile_threshold if tracer is None else None
+        quicken_threshold = self.quicken_threshold if tracer is None else None
+        quickening = self.quickening
+        hits = quickening.hits if quickening.count_hits else None
+        native_limit = self.max_native_depth if tracer is None else 0
+        frame.stack = [] if code.threaded is not None and tracer is None else None
+
+        try:
+            while True:
+                if frame.stack is not None:
+                    # threaded tier: run the translated instructions until
+                    # one the driver has to handle
+                    ops = code.threaded
+                    stack = frame.stack
+                    while True:
+                        while (op := ops[pc]) is not None:
+                            pc = op(values, stack, derefs)
+
+                        if pc >= len(body):
+                            # only module blocks can run off the end of their body
+                            frames.pop()
+                            return None
+
+                        op = body[pc]
+                        if op == 0x30: # CALL
+                            argc = (body[pc + 1] << 8) | body[pc + 2]
+                            if argc:
+                                args = stack[-argc:]
+                                del stack[-argc:]
+                            else:
+                                args = []
+                            callee = stack.pop()
+
+                            if type(callee) is Function and callee.code.native is not None \
+                                    and self.native_depth < native_limit:
+                                stack.append(self._call_native(callee, args))
+                                pc += 3
+                                continue
+                            elif type(callee) is Function:
+                                # as in the bytecode loop below, without
+                                # going through `_enter`
+                                callee_code = callee.code
+                                if argc != callee_code.argument_count:
+                                    raise SpyRuntimeError(
+                                        f"{callee_code.name} takes {callee_code.argument_count} argument(s) but got {argc}")
+                                if len(frames) - base >= self.max_depth:
+                                    raise SpyRuntimeError("maximum call depth exceeded")
+                                frame.pc = pc + 3
+                                callee_code.calls += 1
+                                if callee_code.calls == threshold:
+                                    self._tier_up(callee_code)
+                                elif callee_code.calls == transpile_threshold:
+                                    self._transpile(callee_code)
+                                elif callee_code.calls == quicken_threshold:
+                                    quicken(callee_code, quickening)
+
+                                free_frames = callee_code.free_frames
+                                if free_frames:
+                                    frame = free_frames.pop()
+                                    frame.function = callee
+                                    callee_values = frame.values
+                                    callee_values[:argc] = args
+                                    if callee_code.local_padding:
+                                        callee_values[argc:callee_code.local_count] = callee_code.local_padding
+                                    if callee_code.cell_count:
+                                        frame.derefs[:callee_code.cell_count] = [Cell() for _ in range(callee_code.cell_count)]
+                                else:
+                                    frame = Frame(callee_code, callee, args + callee_code.padding)
+                                frame.pc = 0
+                                frame.sp = callee_code.local_count
+                                if callee_code.threaded is None:
+                                    frame.stack = None
+                                elif frame.stack is None:
+                                    frame.stack = []
+                                frames.append(frame)
+                            elif callable(callee):
+                                stack.append(callee(*args))
+                                pc += 3
+                                continue
+                            else:
+                                raise SpyRuntimeError(f"{callee!r} is not callable")
+                        elif op == 0x31: # RETURN
+                            value = stack.pop()
+                            frames.pop()
+                            if len(code.free_frames) < pool_size:
+                                code.free_frames.append(frame)
+                            if len(frames) == base:
+                                return value
+                            frame = frames[-1]
+                            if frame.stack is not None:
+                                frame.stack.append(value)
+                            else:
+                                frame.values[frame.sp] = value
+                                frame.sp += 1
+                        elif op == 0x33: # TAIL_CALL
+                            argc = (body[pc + 1] << 8) | body[pc + 2]
+                            if argc:
+                                args = stack[-argc:]
+                                del stack[-argc:]
+                            else:
+                                args = []
+                            callee = stack.pop()
+
+                            native = type(callee) is Function and callee.code.native is not None \
+                                and self.native_depth < native_limit
+                            if type(callee) is Function and not native:
+                                frame = self._tail_call(frame, callee, args)
+                            elif native or callable(callee):
+                                # builtins and Python translations return to
+                                # this call's caller right away
+                                value = self._call_native(callee, args) if native else callee(*args)
+                                frame = self._return(frame, value, base)
+                                if frame is None:
+                                    return value
+                            else:
+                                raise SpyRuntimeError(f"{callee!r} is not callable")
+                        elif op == 0x32: # COPY_FREE_VARS
+                            closure = frame.function.closure
+                            if code.copied_count:
+                                # values copied into the closure go into
+                                # the locals after the arguments
+                                derefs[code.cell_count:] = closure[:code.free_count]
+                                values[code.argument_count:code.argument_count + code.copied_count] = closure[code.free_count:]
+                            else:
+                                derefs[code.cell_count:] = closure
+                            pc += 1
+                            continue
+                        else:
+                            raise SpyRuntimeError(f"unsupported instruction {op:#04x}")
+
+                        # switched frames
+                        code = frame.code
+                        body = code.body
+                        consts = code.consts
+                        values = frame.values
+                        derefs = frame.derefs
+                        pc = frame.pc
+                        sp = frame.sp
+                        if frame.stack is None:
+                            break
+                        ops = code.threaded
+                        stack = frame.stack
+                    continue
+
+                while True:
+                    if pc >= len(body):
+                        # only module blocks can run off the end of their body
+                        frames.pop()
+                        return None
+
+                    if tracer is not None and tracer(frames, pc):
+                        frame.pc = pc
+                        frame.sp = sp
+                        return SUSPENDED
+
+                    op = body[pc]
+
+                    if op == 0x10: # LOAD_LOCAL
+                        values[sp] = values[(body[pc + 1] << 8) | body[pc + 2]]
+                        sp += 1
+                        pc += 3
+                    elif 0x44 <= op <= 0x4D:
+                        # typed instructions: codegen has worked out the
+                        # operand types, so there's nothing to check
+                        left = values[sp - 2]
+                        right = values[sp - 1]
+                        if op >= 0x48:
+                            if op == 0x4C: # INT_LT
+                                result = left < right
+                            elif op == 0x4A: # INT_GT
+                                result = left > right
+                            elif op == 0x48: # INT_EQ
+                                result = left == right
+                            elif op == 0x49: # INT_NEQ
+                                result = left != right
+                            elif op == 0x4B: # INT_GTEQ
+                                result = left >= right
+                            else: # INT_LTEQ
+                                result = left <= right
+                            if body[pc + 1] == 0x23 and tracer is None:
+                                # branch on the result right away rather than
+                                # dispatching the JUMP_FORWARD_FALSE after it
+                                sp -= 2
+                                if result:
+                                    pc += 4
+                                else:
+                                    pc += 1 + ((body[pc + 2] << 8) | body[pc + 3])
+                                continue
+                            sp -= 1
+                            values[sp - 1] = result
+                        else:
+                            sp -= 1
+                            if op == 0x45: # INT_SUBTRACT
+                                values[sp - 1] = left - right
+                            elif op == 0x46: # INT_MULTIPLY
+                                values[sp - 1] = left * right
+                            else: # INT_ADD, STR_ADD
+                                values[sp - 1] = left + right
+                        pc += 1
+                    elif op >= 0x82:
+                        # guarded forms of quickened instructions; on a miss
+                        # they turn back into the block's instruction, for
+                        # good, and run again as that
+                        left = values[sp - 2]
+                        right = values[sp - 1]
+                        if op < 0x8C:
+                            if type(left) is int and type(right) is int:
+                                if hits is not None:
+                                    hits[op] += 1
+                                if op < 0x88:
+                                    if op == 0x86: # LT_INT
+                                        result = left < right
+                                    elif op == 0x84: # GT_INT
+                                        result = left > right
+                                    elif op == 0x82: # EQ_INT
+                                        result = left == right
+                                    elif op == 0x83: # NEQ_INT
+                                        result = left != right
+                                    elif op == 0x85: # GTEQ_INT
+                                        result = left >= right
+                                    else: # LTEQ_INT
+                                        result = left <= right
+                                    if body[pc + 1] == 0x23 and tracer is None:
+                                        # branch on the result right away rather
+                                        # than dispatching the JUMP_FORWARD_FALSE
+                                        sp -= 2
+                                        if result:
+                                            pc += 4
+                                        else:
+                                            pc += 1 + ((body[pc + 2] << 8) | body[pc + 3])
+                                    else:
+                                        sp -= 1
+                                        values[sp - 1] = result
+                                        pc += 1
+                                    continue
+
+                                sp -= 1
+                                if op == 0x89: # SUBTRACT_INT
+                                    values[sp - 1] = left - right
+                                elif op == 0x8A: # MULTIPLY_INT
+                                    values[sp - 1] = left * right
+                                elif op == 0x88: # ADD_INT
+                                    values[sp - 1] = left + right
+                                else: # DIVIDE_INT
+                                    values[sp - 1] = left // right
+                                pc += 1
+                                continue
+                        elif type(left) is str and type(right) is str: # ADD_STR
+                            if hits is not None:
+                                hits[op] += 1
+                            sp -= 1
+                            values[sp - 1] = left + right
+                            pc += 1
+                            continue
+
+                        quickening.misses[op] += 1
+                        body[pc] = code.block.body[pc]
+                    elif op >= 0x80:
+                        if op == 0x81: # LOAD_CONST_VALUE
+                            values[sp] = consts[(body[pc + 1] << 8) | body[pc + 2]]
+                            sp += 1
+                            pc += 3
+                        else: # SPECIALIZE
+                            specialize(code, pc, values[sp - 2], values[sp - 1], quickening)
+                    elif op == 0x14: # LOAD_CONST
+                        const = consts[(body[pc + 1] << 8) | body[pc + 2]]
+                        if type(const) is FunctionTemplate:
+                            closure = tuple(derefs[i] for i in const.closure_indices)
+                            if const.copied_indices:
+                                closure += tuple(values[i] for i in const.copied_indices)
+                            const = Function(const.code, closure)
+                        values[sp] = const
+                        sp += 1
+                        pc += 3
+                    elif op == 0x15: # LOAD_DEREF
+                        values[sp] = derefs[(body[pc + 1] << 8) | body[pc + 2]].value
+                        sp += 1
+                        pc += 3
+                    elif op == 0x12: # LOAD_NAME
+                        name = code.names[(body[pc + 1] << 8) | body[pc + 2]]
+                        if name in self.globals:
+                            values[sp] = self.globals[name]
+                        elif name in self.builtins:
+                            values[sp] = self.builtins[name]
+                        else:
+                            raise SpyRuntimeError(f"name {name} is not defined")
+                        sp += 1
+                        pc += 3
+                    elif op == 0x16: # STORE_LOCAL
+                        sp -= 1
+                        values[(body[pc + 1] << 8) | body[pc + 2]] = values[sp]
+                        pc += 3
+                    elif op == 0x19: # STORE_DEREF
+                        sp -= 1
+                        derefs[(body[pc + 1] << 8) | body[pc + 2]].value = values[sp]
+                        pc += 3
+                    elif op == 0x18: # STORE_NAME
+                        sp -= 1
+                        self.globals[code.names[(body[pc + 1] << 8) | body[pc + 2]]] = values[sp]
+                        pc += 3
+
+                    elif op == 0x40: # ADD
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] + values[sp]
+                        pc += 1
+                    elif op == 0x41: # SUBTRACT
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] - values[sp]
+                        pc += 1
+                    elif op == 0x42: # MULTIPLY
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] * values[sp]
+                        pc += 1
+                    elif op == 0x43: # DIVIDE
+                        sp -= 1
+                        left = values[sp - 1]
+                        right = values[sp]
+                        if type(left) is int and type(right) is int:
+                            values[sp - 1] = left // right
+                        else:
+                            values[sp - 1] = left / right
+                        pc += 1
+
+                    elif op == 0x60: # EQ
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] == values[sp]
+                        pc += 1
+                    elif op == 0x61: # NEQ
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] != values[sp]
+                        pc += 1
+                    elif op == 0x62: # GT
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] > values[sp]
+                        pc += 1
+                    elif op == 0x63: # GTEQ
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] >= values[sp]
+                        pc += 1
+                    elif op == 0x64: # LT
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] < values[sp]
+                        pc += 1
+                    elif op == 0x65: # LTEQ
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] <= values[sp]
+                        pc += 1
+
+                    elif op == 0x23: # JUMP_FORWARD_FALSE
+                        sp -= 1
+                        if values[sp]:
+                            pc += 3
+                        else:
+                            pc += (body[pc + 1] << 8) | body[pc + 2]
+                    elif op == 0x22: # JUMP_FORWARD_TRUE
+                        sp -= 1
+                        if values[sp]:
+                            pc += (body[pc + 1] << 8) | body[pc + 2]
+                        else:
+                            pc += 3
+                    elif op == 0x24: # JUMP_IF_FALSE_OR_POP
+                        if values[sp - 1]:
+                            sp -= 1
+                            pc += 3
+                        else:
+                            pc += (body[pc + 1] << 8) | body[pc + 2]
+                    elif op == 0x25: # JUMP_IF_TRUE_OR_POP
+                        if values[sp - 1]:
+                            pc += (body[pc + 1] << 8) | body[pc + 2]
+                        else:
+                            sp -= 1
+                            pc += 3
+                    elif op == 0x20: # JUMP_FORWARD
+                        pc += (body[pc + 1] << 8) | body[pc + 2]
+                    elif op == 0x21: # JUMP_BACKWARD
+                        pc -= (body[pc + 1] << 8) | body[pc + 2]
+
+                    elif op == 0x30: # CALL
+                        argc = (body[pc + 1] << 8) | body[pc + 2]
+                        sp -= argc + 1
+                        callee = values[sp]
+
+                        if type(callee) is Function and callee.code.native is not None \
+                                and self.native_depth < native_limit:
+                            values[sp] = self._call_native(callee, values[sp + 1:sp + 1 + argc])
+                            sp += 1
+                            pc += 3
+                        elif type(callee) is Function:
+                            callee_code = callee.code
+                            if argc != callee_code.argument_count:
+                                raise SpyRuntimeError(
+                                    f"{callee_code.name} takes {callee_code.argument_count} argument(s) but got {argc}")
+                            if len(frames) - base >= self.max_depth:
+                                raise SpyRuntimeError("maximum call depth exceeded")
+                            frame.pc = pc + 3
+                            frame.sp = sp
+                            callee_code.calls += 1
+                            if callee_code.calls == threshold:
+                                self._tier_up(callee_code)
+                            elif callee_code.calls == transpile_threshold:
+                                self._transpile(callee_code)
+                            elif callee_code.calls == quicken_threshold:
+                                quicken(callee_code, quickening)
+
+                            # reuse a frame from an earlier call if there is one,
+                            # copying the arguments straight into its locals
+                            free_frames = callee_code.free_frames
+                            if free_frames:
+                                frame = free_frames.pop()
+                                frame.function = callee
+                                callee_values = frame.values
+                                if argc == 1:
+                                    callee_values[0] = values[sp + 1]
+                                elif argc:
+                                    callee_values[:argc] = values[sp + 1:sp + 1 + argc]
+                                if callee_code.local_padding:
+                                    callee_values[argc:callee_code.local_count] = callee_code.local_padding
+                                if callee_code.cell_count:
+                                    frame.derefs[:callee_code.cell_count] = [Cell() for _ in range(callee_code.cell_count)]
+                            else:
+                                frame = Frame(callee_code, callee, values[sp + 1:sp + 1 + argc] + callee_code.padding)
+
+                            frames.append(frame)
+                            code = callee_code
+                            body = code.body
+                            consts = code.consts
+                            values = frame.values
+                            derefs = frame.derefs
+                            sp = code.local_count
+                            pc = 0
+                            if code.threaded is not None and tracer is None:
+                                if frame.stack is None:
+                                    frame.stack = []
+                                break
+                            frame.stack = None
+                        elif callable(callee):
+                            values[sp] = callee(*values[sp + 1:sp + 1 + argc])
+                            sp += 1
+                            pc += 3
+                        else:
+                            raise SpyRuntimeError(f"{callee!r} is not callable")
+                    elif op == 0x31: # RETURN
+                        value = values[sp - 1]
+                        frames.pop()
+                        if len(code.free_frames) < pool_size:
+                            code.free_frames.append(frame)
+                        if len(frames) == base:
+                            return value
+                        frame = frames[-1]
+                        code = frame.code
+                        body = code.body
+                        consts = code.consts
+                        values = frame.values
+                        derefs = frame.derefs
+                        pc = frame.pc
+                        if frame.stack is not None:
+                            frame.stack.append(value)
+                            break
+                        sp = frame.sp
+                        values[sp] = value
+                        sp += 1
+                    elif op == 0x33: # TAIL_CALL
+                        argc = (body[pc + 1] << 8) | body[pc + 2]
+                        sp -= argc + 1
+                        callee = values[sp]
+
+                        if type(callee) is Function and callee.code is code:
+                            # self-recursion runs in this very frame
+                            if argc != code.argument_count:
+                                raise SpyRuntimeError(
+                                    f"{code.name} takes {code.argument_count} argument(s) but got {argc}")
+                            if argc == 1:
+                                values[0] = values[sp + 1]
+                            elif argc:
+                                values[:argc] = values[sp + 1:sp + 1 + argc]
+                            if code.local_padding:
+                                values[argc:code.local_count] = code.local_padding
+                            if code.cell_count:
+                                derefs[:code.cell_count] = [Cell() for _ in range(code.cell_count)]
+                            frame.function = callee
+                            sp = code.local_count
+                            pc = 0
+                            code.calls += 1
+                            if code.calls == threshold:
+                                self._tier_up(code)
+                            elif code.calls == transpile_threshold:
+                                self._transpile(code)
+                            elif code.calls == quicken_threshold:
+                                quicken(code, quickening)
+                            if code.threaded is not None and tracer is None:
+                                frame.stack = []
+                                break
+                        elif type(callee) is Function and (callee.code.native is None or self.native_depth >= native_limit):
+                            # other callees get a frame that takes this one's place
+                            frame = self._tail_call(frame, callee, values[sp + 1:sp + 1 + argc])
+                            code = frame.code
+                            body = code.body
+                            consts = code.consts
+                            values = frame.values
+                            derefs = frame.derefs
+                            sp = code.local_count
+                            pc = 0
+                            if frame.stack is not None:
+                                break
+                        elif type(callee) is Function or callable(callee):
+                            # builtins and Python translations return to this
+                            # call's caller right away
+                            args = values[sp + 1:sp + 1 + argc]
+                            value = self._call_native(callee, args) if type(callee) is Function else callee(*args)
+                            frames.pop()
+                            if len(code.free_frames) < pool_size:
+                                code.free_frames.append(frame)
+                            if len(frames) == base:
+                                return value
+                            frame = frames[-1]
+                            code = frame.code
+                            body = code.body
+                            consts = code.consts
+                            values = frame.values
+                            derefs = frame.derefs
+                            pc = frame.pc
+                            if frame.stack is not None:
+                                frame.stack.append(value)
+                                break
+                            sp = frame.sp
+                            values[sp] = value
+                            sp += 1
+                        else:
+                            raise SpyRuntimeError(f"{callee!r} is not callable")
+                    elif op == 0x32: # COPY_FREE_VARS
+                        closure = frame.function.closure
+                        if code.copied_count:
+                            derefs[code.cell_count:] = closure[:code.free_count]
+                            values[code.argument_count:code.argument_count + code.copied_count] = closure[code.free_count:]
+                        else:
+                            derefs[code.cell_count:] = closure
+                        pc += 1
+                    elif op == 0x34: # LAZY_BODY
+                        self._generate_body(code)
+                        # the frame was made for the placeholder
+                        values = frame.values = values[:code.argument_count] + code.padding
+                        derefs = frame.derefs = [Cell() for _ in range(code.cell_count)] + [None] * code.free_count
+                        body = code.body
+                        consts = code.consts
+                        sp = code.local_count
+                        pc = 0
+
+                    elif op == 0x01: # POP
+                        sp -= 1
+                        pc += 1
+                    elif op == 0x02: # DUP
+                        values[sp] = values[sp - 1]
+                        sp += 1
+                        pc += 1
+                    elif op == 0x03: # SWAP
+                        values[sp - 1], values[sp - 2] = values[sp - 2], values[sp - 1]
+                        pc += 1
+                    elif op == 0x00: # NOP
+                        pc += 1
+
+                    elif op == 0x50: # NEGATE
+                        values[sp - 1] = -values[sp - 1]
+                        pc += 1
+                    elif op == 0x51: # POSITIVE
+                        values[sp - 1] = +values[sp - 1]
+                        pc += 1
+                    elif op == 0x66: # NOT
+                        values[sp - 1] = not values[sp - 1]
+                        pc += 1
+                    elif op == 0x67: # AND
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] and values[sp]
+                        pc += 1
+                    elif op == 0x68: # OR
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1] or values[sp]
+                        pc += 1
+
+                    elif op == 0x1A: # MAKE_OBJECT
+                        values[sp] = SpyObject()
+                        sp += 1
+                        pc += 1
+                    elif op == 0x13: # LOAD_ATTR
+                        sp -= 1
+                        values[sp - 1] = values[sp - 1].attributes[values[sp]]
+                        pc += 1
+                    elif op == 0x1D: # STORE_ATTR
+                        sp -= 2
+                        values[sp - 1].attributes[values[sp]] = values[sp + 1]
+                        pc += 1
+
+                    else:
+                        raise SpyRuntimeError(f"unsupported instruction {op:#04x}")
+        except SpyRuntimeError as error:
+            if not error.trace:
+                error.trace = self.traceback(pc)
+            del frames[base:]
+            raise
+        except Exception as error:
+            trace = self.traceback(pc)
+            del frames[base:]
+            raise SpyRuntimeError(f"{type(error).__name__}: {error}", trace) from error
@@ -0,0 +1,128 @@
+from ast import literal_eval
+
+from codegen.block import Block
+from codegen.consts import *
+
+class SpyRuntimeError(Exception):
+    """
+    An error raised by a running SPY program. `trace` lists the active
+    calls, outermost first, as human-readable locations.
+    """
+    trace: list[str]
+
+    def __init__(self, message: str, trace: list[str] | None = None):
+        super().__init__(message)
+        self.trace = trace if trace is not None else []
+
+    def __str__(self):
+        lines = [f"  at {location}" for location in reversed(self.trace)]
+        return "\n".join([super().__str__(), *lines])
+
+class Cell:
+    """
+    Holds a variable that is captured by a closure.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+class Code:
+    """
+    The runtime form of a `Block`: its own copy of its body, which the VM
+    quickens in place (see `vm.quicken`), and its constants turned into
+    values once, so frames can share them.
+    `padding` fills a frame's values after its arguments, up to its full
+    size, and `local_padding` just its locals that aren't arguments.
+    `free_frames` holds frames of finished calls for reuse. `calls`
+    counts calls for tiering up, `threaded` is the direct-threaded
+    translation once there is one and `native` the Python one.
+    """
+    __slots__ = (
+        'block', 'name', 'body', 'consts', 'names',
+        'argument_count', 'local_count', 'cell_count', 'free_count', 'copied_count',
+        'max_stack_depth', 'frame_size', 'padding', 'local_padding', 'free_frames',
+        'calls', 'threaded', 'native',
+    )
+
+    def __init__(self, block: Block, consts: list):
+        self.block = block
+        self.name = block.name
+        self.body = bytearray(block.body)
+        self.consts = consts
+        self.names = block.names
+        self.argument_count = block.argument_count
+        self.local_count = len(block.local_names)
+        self.cell_count = len(block.cell_names)
+        self.free_count = len(block.free_names)
+        self.copied_count = len(block.copied_names)
+        self.max_stack_depth = block.max_stack_depth
+        self.frame_size = self.local_count + self.max_stack_depth
+        self.padding = [None] * (self.local_count - self.argument_count + self.max_stack_depth)
+        self.local_padding = [None] * (self.local_count - self.argument_count)
+        self.free_frames = []
+        self.calls = 0
+        self.threaded = None
+        self.native = None
+
+    def location(self, offset: int) -> str:
+        """
+        Describes the instruction at `offset`, using its source line when
+        the block has a location table.
+        """
+
+        if self.block.locations is not None:
+            location = self.block.locations.lookup(offset)
+            if location is not None:
+                return f"{self.name}:{location[0]}"
+        return f"{self.name}+{offset:04X}"
+
+class FunctionTemplate:
+    """
+    A function literal constant. Loading it creates a `Function` that
+    closes over the cells at `closure_indices` in the loading frame, and
+    over the values of the locals at `copied_indices`.
+    """
+    __slots__ = ('code', 'closure_indices', 'copied_indices')
+
+    def __init__(self, code: Code, closure_indices: tuple[int, ...], copied_indices: tuple[int, ...] = ()):
+        self.code = code
+        self.closure_indices = closure_indices
+        self.copied_indices = copied_indices
+
+class Function:
+    __slots__ = ('code', 'closure')
+
+    def __init__(self, code: Code, closure: tuple):
+        self.code = code
+        self.closure = closure
+
+    def __repr__(self):
+        return f"<function {self.code.name}>"
+
+class SpyObject:
+    __slots__ = ('attributes',)
+
+    def __init__(self):
+        self.attributes = {}
+
+    def __repr__(self):
+        return "{" + ", ".join(f"{k}: {v}" for k, v in self.attributes.items()) + "}"
+
+def materialize_const(const: Const) -> object:
+    """
+    Turns a scalar compile-time constant into its runtime value.
+    """
+
+    match const:
+        case IntegerConst():
+            return int(const.value)
+        case StringConst():
+            # string constants keep their quotes and escapes from the source
+            return literal_eval(const.value)
+        case BoolConst():
+            return const.value == 1
+        case NoneConst():
+            return None
+        case _:
+            raise NotImplementedError(f"Not implemented for {type(const)}")
@@ -0,0 +1,271 @@
+"""
+Profilers for SPY programs running on the `VM`.
+
+`TracingProfiler` is deterministic: it hooks every instruction, counting
+executions and measuring time per opcode, per block and per call stack.
+`SamplingProfiler` leaves the dispatch loop alone and instead samples the
+running block and instruction offset from a `signal.setitimer` timer, so it
+costs next to nothing between samples.
+
+Both produce a `Profile`, which can be written out as collapsed stacks for
+flamegraph tools or used to annotate a disassembly with hit counts.
+
+    python -m vm.profiler [--sample MS] [--collapsed FILE] [--annotate] FILE
+"""
+import signal
+import sys
+from time import perf_counter_ns
+from typing import Literal
+
+from codegen.block import Block
+from codegen.instructions import instruction_names
+from vm.interpreter import VM, Frame
+
+class Profile:
+    """
+    Results of a profiling run. Weights are nanoseconds for a tracing
+    profile and sample counts for a sampling profile.
+    """
+    unit: Literal['ns', 'samples']
+
+    # executions (tracing) or samples (sampling) of each instruction
+    hits: dict[Block, dict[int, int]]
+    opcode_counts: dict[str, int]
+    opcode_weights: dict[str, int]
+
+    # calls into each block; only known to the tracing profiler
+    block_calls: dict[Block, int]
+    # weight spent in each block itself, not counting its callees
+    block_weights: dict[Block, int]
+
+    # collapsed call stacks (outermost first, separated by ';') to weight
+    stacks: dict[str, int]
+
+    def __init__(self, unit: Literal['ns', 'samples']):
+        self.unit = unit
+        self.hits = {}
+        self.opcode_counts = {}
+        self.opcode_weights = {}
+        self.block_calls = {}
+        self.block_weights = {}
+        self.stacks = {}
+
+    def collapsed(self) -> str:
+        """
+        Formats the stacks in the collapsed format read by flamegraph.pl and
+        speedscope: one `frame;frame;frame weight` line per stack.
+        """
+
+        return "".join(f"{stack} {weight}\n" for stack, weight in sorted(self.stacks.items()))
+
+    def summary(self, limit: int = 10) -> str:
+        lines = [f"{'block'.ljust(30)} {'calls'.rjust(10)} {self.unit.rjust(14)}"]
+        for block, weight in sorted(self.block_weights.items(), key=lambda kv: -kv[1])[:limit]:
+            calls = self.block_calls.get(block, '-')
+            lines.append(f"{block.name.ljust(30)} {str(calls).rjust(10)} {str(weight).rjust(14)}")
+        lines.append("")
+        lines.append(f"{'opcode'.ljust(30)} {'count'.rjust(10)} {self.unit.rjust(14)}")
+        for name, weight in sorted(self.opcode_weights.items(), key=lambda kv: -kv[1])[:limit]:
+            lines.append(f"{name.ljust(30)} {str(self.opcode_counts[name]).rjust(10)} {str(weight).rjust(14)}")
+        return "\n".join(lines)
+
+class _StackKeys:
+    """
+    Builds collapsed stack keys, caching each instruction's location and
+    the key of the calling frames, which only changes on calls and returns.
+    """
+
+    def __init__(self):
+        self.locations = {}
+        self.callers: list[Frame] = []
+        self.prefix = ""
+
+    def location(self, code, pc: int) -> str:
+        key = (code, pc)
+        location = self.locations.get(key)
+        if location is None:
+            location = self.locations[key] = code.location(pc)
+        return location
+
+    def key(self, frames: list[Frame], pc: int) -> str:
+        callers = self.callers
+        depth = len(frames) - 1
+        if len(callers) != depth or (depth and callers[-1] is not frames[-2]):
+            self.callers = callers = frames[:-1]
+            self.prefix = "".join(self.location(frame.code, frame.pc) + ";" for frame in callers)
+        return self.prefix + self.location(frames[-1].code, pc)
+
+class TracingProfiler:
+    """
+    Counts and times every instruction executed by `vm` while running.
+
+    The time between two instructions is charged to the first one, so each
+    opcode's time includes the dispatch overhead of the loop but not the
+    profiler's own bookkeeping.
+    """
+
+    def __init__(self, vm: VM):
+        self.vm = vm
+        self.profile = Profile('ns')
+        self._keys = _StackKeys()
+        self._last = None
+        self._last_depth = 0
+        self._last_time = 0
+
+    def __enter__(self):
+        self.start()
+        return self.profile
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self.vm.tracer = self._trace
+
+    def stop(self):
+        self._charge(perf_counter_ns())
+        self._last = None
+        self.vm.tracer = None
+
+    def _charge(self, now: int):
+        if self._last is None:
+            return
+        block, name, stack = self._last
+        elapsed = now - self._last_time
+        profile = self.profile
+        profile.opcode_weights[name] = profile.opcode_weights.get(name, 0) + elapsed
+        profile.block_weights[block] = profile.block_weights.get(block, 0) + elapsed
+        profile.stacks[stack] = profile.stacks.get(stack, 0) + elapsed
+
+    def _trace(self, frames: list[Frame], pc: int):
+        self._charge(perf_counter_ns())
+
+        profile = self.profile
+        code = frames[-1].code
+        block = code.block
+        name = instruction_names[code.body[pc]]
+
+        # a call has just entered a new frame when the stack grows, or when
+        # a tail call replaced the frame that made it and starts over
+        depth = len(frames)
+        if depth > self._last_depth or (
+                depth == self._last_depth and pc == 0
+                and self._last is not None and self._last[1] == "TAIL_CALL"):
+            profile.block_calls[block] = profile.block_calls.get(block, 0) + 1
+        self._last_depth = depth
+
+        hits = profile.hits.get(block)
+        if hits is None:
+            hits = profile.hits[block] = {}
+        hits[pc] = hits.get(pc, 0) + 1
+        profile.opcode_counts[name] = profile.opcode_counts.get(name, 0) + 1
+
+        self._last = (block, name, self._keys.key(frames, pc))
+        self._last_time = perf_counter_ns()
+
+class SamplingProfiler:
+    """
+    Samples the instruction `vm` is executing every `interval` seconds of
+    CPU time, using `SIGPROF`. Only usable from the main thread on platforms
+    with `signal.setitimer`.
+
+    The offset of the running instruction is a local variable of the
+    dispatch loop, so the signal handler reads it from the loop's Python
+    frame rather than having the loop publish it on every instruction.
+    """
+
+    def __init__(self, vm: VM, interval: float = 0.001):
+        self.vm = vm
+        self.interval = interval
+        self.profile = Profile('samples')
+        self._keys = _StackKeys()
+        self._previous_handler = None
+
+    def __enter__(self):
+        self.start()
+        return self.profile
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    def _sample(self, signum, python_frame):
+        frames = self.vm.frames
+        while python_frame is not None and python_frame.f_code is not VM._run.__code__:
+            python_frame = python_frame.f_back
+        if python_frame is None or not frames:
+            return
+
+        pc = python_frame.f_locals.get('pc')
+        code = frames[-1].code
+        # a sample can land mid-call, after the new frame is pushed but
+        # before pc is reset for it
+        if pc is None or pc >= len(code.body):
+            return
+
+        profile = self.profile
+        block = code.block
+        name = instruction_names[code.body[pc]]
+
+        hits = profile.hits.get(block)
+        if hits is None:
+            hits = profile.hits[block] = {}
+        hits[pc] = hits.get(pc, 0) + 1
+        profile.opcode_counts[name] = profile.opcode_counts.get(name, 0) + 1
+        profile.opcode_weights[name] = profile.opcode_weights.get(name, 0) + 1
+        profile.block_weights[block] = profile.block_weights.get(block, 0) + 1
+
+        stack = self._keys.key(frames, pc)
+        profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+
+def main():
+    from compiler import compile_source
+
+    args = sys.argv[1:]
+    sample_ms = None
+    collapsed_path = None
+    annotate = False
+    while len(args) > 1:
+        flag = args.pop(0)
+        if flag == "--sample":
+            sample_ms = float(args.pop(0))
+        elif flag == "--collapsed":
+            collapsed_path = args.pop(0)
+        elif flag == "--annotate":
+            annotate = True
+        else:
+            raise SystemExit(f"unknown option {flag}")
+    if len(args) != 1:
+        raise SystemExit(__doc__)
+
+    with open(args[0]) as file:
+        block = compile_source(file.read())
+
+    # with the faster tiers, hot functions would stop running the bytecode
+    # the profilers look at, and their time would be charged to the CALL
+    # that entered them
+    vm = VM(tier_up_threshold=None, transpile_threshold=None, quicken_threshold=None)
+    if sample_ms is not None:
+        profiler = SamplingProfiler(vm, sample_ms / 1000)
+    else:
+        profiler = TracingProfiler(vm)
+
+    with profiler as profile:
+        vm.run_module(block)
+
+    print(profile.summary(), file=sys.stderr)
+    if annotate:
+        block.pretty_print(profile.hits)
+    if collapsed_path is not None:
+        with open(collapsed_path, "w") as file:
+            file.write(profile.collapsed())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from codegen.instructions import instruction_values, instruction_names
+from vm.objects import *
+
+_LOAD_CONST = instruction_values["LOAD_CONST"]
+_LOAD_CONST_VALUE = instruction_values["LOAD_CONST_VALUE"]
+_SPECIALIZE = instruction_values["SPECIALIZE"]
+
+# The specialized forms of each generic instruction, by the type both
+# operands have to be exactly (so not bool for int). Where type inference
+# already knows the operands are ints or strings codegen emits the typed
+# INT_ and STR_ instructions instead, so these only ever stand in for
+# operations on values it can't follow, like the parameters of functions
+# that escape.
+_specializations: dict[int, dict[type, int]] = {
+    instruction_values[generic]: {
+        operand_type: instruction_values[name] for operand_type, name in forms.items()
+    }
+    for generic, forms in {
+        "ADD": {int: "ADD_INT", str: "ADD_STR"},
+        "SUBTRACT": {int: "SUBTRACT_INT"},
+        "MULTIPLY": {int: "MULTIPLY_INT"},
+        "DIVIDE": {int: "DIVIDE_INT"},
+        "EQ": {int: "EQ_INT"},
+        "NEQ": {int: "NEQ_INT"},
+        "GT": {int: "GT_INT"},
+        "GTEQ": {int: "GTEQ_INT"},
+        "LT": {int: "LT_INT"},
+        "LTEQ": {int: "LTEQ_INT"},
+    }.items()
+}
+
+class QuickeningStats:
+    """
+    Counts, by opcode, how many instructions were rewritten into each
+    quickened form, how many times the specialized forms ran with the
+    operands they expect (`hits`) and how many times they didn't and were
+    rewritten back (`misses`). The VM updates the lists directly;
+    `summary` keys them by instruction name.
+
+    Counting hits costs the specialized forms about as much as they save,
+    so it only happens with `count_hits`; otherwise `hits` stays zero.
+    """
+    specialized: list[int]
+    hits: list[int]
+    misses: list[int]
+    count_hits: bool
+
+    def __init__(self, count_hits: bool = False):
+        self.count_hits = count_hits
+        self.specialized = [0] * 256
+        self.hits = [0] * 256
+        self.misses = [0] * 256
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        return {
+            name: {
+                "specialized": self.specialized[opcode],
+                "hits": self.hits[opcode],
+                "misses": self.misses[opcode],
+            }
+            for opcode, name in instruction_names.items()
+            if self.specialized[opcode] or self.hits[opcode] or self.misses[opcode]
+        }
+
+def quicken(code: Code, stats: QuickeningStats):
+    """
+    Rewrites the instructions of `code` that can be specialized, in place
+    in its copy of the body. LOAD_CONST of anything but a function literal
+    becomes LOAD_CONST_VALUE for good, since constants never change.
+    Instructions with specialized forms become SPECIALIZE, which picks a form for
+    them once it sees their operands; see `specialize`.
+    """
+
+    body = code.body
+    for offset, name, arg in code.block.instructions():
+        opcode = body[offset]
+        if opcode == _LOAD_CONST:
+            if type(code.consts[arg]) is not FunctionTemplate:
+                body[offset] = _LOAD_CONST_VALUE
+                stats.specialized[_LOAD_CONST_VALUE] += 1
+        elif opcode in _specializations:
+            body[offset] = _SPECIALIZE
+            stats.specialized[_SPECIALIZE] += 1
+
+def specialize(code: Code, offset: int, left, right, stats: QuickeningStats) -> int:
+    """
+    Rewrites the SPECIALIZE at `offset` into the form for its operands
+    `left` and `right`, like ADD_INT or LT_INT, or back into its generic
+    instruction if there is none, and returns the new opcode.
+
+    The generic instruction is the one at the same offset in the block.
+    Specialized forms check their operands each time and rewrite
+    themselves back into it when they don't match, for good.
+    """
+
+    generic = code.block.body[offset]
+    opcode = generic
+    if type(left) is type(right):
+        opcode = _specializations[generic].get(type(left), generic)
+    code.body[offset] = opcode
+    if opcode != generic:
+        stats.specialized[opcode] += 1
+    return opcode
@@ -0,0 +1,324 @@
+from codegen.block import Block
+from codegen.consts import FunctionLiteralConst
+from codegen.registers import RegisterBlock, lower_block
+from vm.objects import *
+from vm.builtins import builtins as default_builtins
+from vm.interpreter import Tracer
+
+class RegisterCode:
+    """
+    The runtime form of a block lowered to registers: its instructions and
+    constants, and the `padding` that fills a frame's registers between the
+    arguments and the constants.
+    """
+    __slots__ = (
+        'block', 'name', 'instructions', 'consts', 'names',
+        'argument_count', 'cell_count', 'free_count', 'copied_count', 'padding',
+    )
+
+    def __init__(self, lowered: RegisterBlock, consts: list):
+        block = lowered.block
+        self.block = block
+        self.name = block.name
+        self.instructions = tuple(lowered.instructions)
+        self.consts = consts
+        self.names = block.names
+        self.argument_count = block.argument_count
+        self.cell_count = len(block.cell_names)
+        self.free_count = len(block.free_names)
+        self.copied_count = len(block.copied_names)
+        self.padding = [None] * (lowered.const_base - block.argument_count)
+
+    def location(self, pc: int) -> str:
+        return f"{self.name}#{pc}"
+
+class RegisterFrame:
+    """
+    The state of one call in the register VM. `pc` and `result` (the
+    caller's register that receives the return value of the call it is
+    waiting on) are only up to date while the frame is waiting on a call.
+    """
+    __slots__ = ('code', 'function', 'registers', 'derefs', 'pc', 'result')
+
+    def __init__(self, code: RegisterCode, function: Function | None, registers: list):
+        self.code = code
+        self.function = function
+        self.registers = registers
+        self.derefs = [Cell() for _ in range(code.cell_count)] + [None] * code.free_count
+        self.pc = 0
+        self.result = 0
+
+class RegisterVM:
+    """
+    Executes compiled SPY modules on the register backend. It behaves like
+    `VM`, but lowers every block to register instructions before running
+    it; see `codegen.registers`.
+
+    It runs fewer instructions than `VM`'s bytecode loop and beats it, but
+    it has no threaded or Python tier, so `VM` with those on is faster on
+    anything that runs long enough for them to kick in (see
+    `bench.backends`).
+    """
+    frames: list[RegisterFrame]
+    globals: dict[str, object]
+    tracer: Tracer | None
+
+    def __init__(self, builtins: dict[str, object] | None = None, max_depth: int = 10_000):
+        self.builtins = builtins if builtins is not None else default_builtins
+        self.max_depth = max_depth
+        self.globals = {}
+        self.frames = []
+        self.tracer = None
+        self.codes: dict[Block, RegisterCode] = {}
+
+    def code_for(self, block: Block) -> RegisterCode:
+        """
+        Gets the runtime form of `block`, lowering it on first use.
+        """
+
+        code = self.codes.get(block)
+        if code is None:
+            if block.pending is not None:
+                # whole modules are lowered up front, so bodies the parser
+                # skipped are generated right away
+                block.pending()
+            consts = []
+            for const in block.consts:
+                if type(const) is FunctionLiteralConst:
+                    nested = const.block
+                    closure_indices = tuple(block.get_deref_index(name) for name in nested.free_names)
+                    copied_indices = tuple(block.get_local_index(name) for name in nested.copied_names)
+                    if None in closure_indices or None in copied_indices:
+                        raise SpyRuntimeError(f"{nested.name} captures a variable {block.name} doesn't have")
+                    consts.append(FunctionTemplate(self.code_for(nested), closure_indices, copied_indices))
+                else:
+                    consts.append(materialize_const(const))
+            code = RegisterCode(lower_block(block), consts)
+            self.codes[block] = code
+        return code
+
+    def run_module(self, block: Block):
+        """
+        Runs a module block to completion in this VM's globals.
+        """
+
+        code = self.code_for(block)
+        return self._run(RegisterFrame(code, None, code.padding + code.consts))
+
+    def call(self, function: Function, *args):
+        """
+        Calls a SPY function from Python and returns its result.
+        """
+
+        return self._run(self._make_frame(function, list(args)))
+
+    def _make_frame(self, function: Function, args: list) -> RegisterFrame:
+        code = function.code
+        if len(args) != code.argument_count:
+            raise SpyRuntimeError(
+                f"{code.name} takes {code.argument_count} argument(s) but got {len(args)}")
+        return RegisterFrame(code, function, args + code.padding + code.consts)
+
+    def traceback(self, pc: int) -> list[str]:
+        """
+        Describes each active call, outermost first, given the index of the
+        instruction after the one the innermost call is at.
+        """
+
+        trace = [frame.code.location(frame.pc - 1) for frame in self.frames[:-1]]
+        if self.frames:
+            trace.append(self.frames[-1].code.location(pc - 1))
+        return trace
+
+    def _run(self, frame: RegisterFrame):
+        frames = self.frames
+        base = len(frames)
+        frames.append(frame)
+
+        code = frame.code
+        instructions = code.instructions
+        registers = frame.registers
+        derefs = frame.derefs
+        pc = 0
+        tracer = self.tracer
+
+        try:
+            while True:
+                if pc >= len(instructions):
+                    # only module blocks can run off the end of their body
+                    frames.pop()
+                    return None
+
+                if tracer is not None:
+                    tracer(frames, pc)
+
+                op, a, b, c = instructions[pc]
+                pc += 1
+
+                if op == 0x00: # MOVE
+                    registers[a] = registers[b]
+
+                elif op == 0x40: # ADD
+                    registers[a] = registers[b] + registers[c]
+                elif op == 0x41: # SUBTRACT
+                    registers[a] = registers[b] - registers[c]
+                elif op == 0x42: # MULTIPLY
+                    registers[a] = registers[b] * registers[c]
+                elif op == 0x43: # DIVIDE
+                    left = registers[b]
+                    right = registers[c]
+                    if type(left) is int and type(right) is int:
+                        registers[a] = left // right
+                    else:
+                        registers[a] = left / right
+
+                elif op == 0x60: # EQ
+                    registers[a] = registers[b] == registers[c]
+                elif op == 0x61: # NEQ
+                    registers[a] = registers[b] != registers[c]
+                elif op == 0x62: # GT
+                    registers[a] = registers[b] > registers[c]
+                elif op == 0x63: # GTEQ
+                    registers[a] = registers[b] >= registers[c]
+                elif op == 0x64: # LT
+                    registers[a] = registers[b] < registers[c]
+                elif op == 0x65: # LTEQ
+                    registers[a] = registers[b] <= registers[c]
+
+                elif op == 0x11: # JUMP_FALSE
+                    if not registers[a]:
+                        pc = b
+                elif op == 0x12: # JUMP_TRUE
+                    if registers[a]:
+                        pc = b
+                elif op == 0x10: # JUMP
+                    pc = a
+
+                elif op == 0x03: # LOAD_DEREF
+                    registers[a] = derefs[b].value
+                elif op == 0x04: # STORE_DEREF
+                    derefs[a].value = registers[b]
+                elif op == 0x01: # LOAD_NAME
+                    name = code.names[b]
+                    if name in self.globals:
+                        registers[a] = self.globals[name]
+                    elif name in self.builtins:
+                        registers[a] = self.builtins[name]
+                    else:
+                        raise SpyRuntimeError(f"name {name} is not defined")
+                elif op == 0x02: # STORE_NAME
+                    self.globals[code.names[a]] = registers[b]
+                elif op == 0x05: # CLOSURE
+                    template = code.consts[b]
+                    closure = tuple(derefs[i] for i in template.closure_indices)
+                    if template.copied_indices:
+                        closure += tuple(registers[i] for i in template.copied_indices)
+                    registers[a] = Function(template.code, closure)
+
+                elif op == 0x20: # CALL
+                    callee = registers[b]
+                    args = registers[b + 1:b + 1 + c]
+
+                    if type(callee) is Function:
+                        if len(frames) - base >= self.max_depth:
+                            raise SpyRuntimeError("maximum call depth exceeded")
+                        frame.pc = pc
+                        frame.result = a
+                        frame = self._make_frame(callee, args)
+                        frames.append(frame)
+                        code = frame.code
+                        instructions = code.instructions
+                        registers = frame.registers
+                        derefs = frame.derefs
+                        pc = 0
+                    elif callable(callee):
+                        registers[a] = callee(*args)
+                    else:
+                        raise SpyRuntimeError(f"{callee!r} is not callable")
+                elif op == 0x21: # RETURN
+                    value = registers[a]
+                    frames.pop()
+                    if len(frames) == base:
+                        return value
+                    frame = frames[-1]
+                    code = frame.code
+                    instructions = code.instructions
+                    registers = frame.registers
+                    derefs = frame.derefs
+                    pc = frame.pc
+                    registers[frame.result] = value
+                elif op == 0x23: # TAIL_CALL
+                    callee = registers[a]
+                    args = registers[a + 1:a + 1 + b]
+
+                    if type(callee) is Function:
+                        callee_code = callee.code
+                        if b != callee_code.argument_count:
+                            raise SpyRuntimeError(
+                                f"{callee_code.name} takes {callee_code.argument_count} argument(s) but got {b}")
+                        if callee_code is code:
+                            # self-recursion runs in this very frame
+                            registers[:b] = args
+                            registers[b:b + len(code.padding)] = code.padding
+                            frame.function = callee
+                            frame.derefs[:code.cell_count] = [Cell() for _ in range(code.cell_count)]
+                        else:
+                            frame = self._make_frame(callee, args)
+                            frames[-1] = frame
+                            code = callee_code
+                            instructions = code.instructions
+                            registers = frame.registers
+                            derefs = frame.derefs
+                        pc = 0
+                    elif callable(callee):
+                        # a builtin returns to this call's caller right away
+                        value = callee(*args)
+                        frames.pop()
+                        if len(frames) == base:
+                            return value
+                        frame = frames[-1]
+                        code = frame.code
+                        instructions = code.instructions
+                        registers = frame.registers
+                        derefs = frame.derefs
+                        pc = frame.pc
+                        registers[frame.result] = value
+                    else:
+                        raise SpyRuntimeError(f"{callee!r} is not callable")
+                elif op == 0x22: # COPY_FREE_VARS
+                    closure = frame.function.closure
+                    if code.copied_count:
+                        derefs[code.cell_count:] = closure[:code.free_count]
+                        registers[code.argument_count:code.argument_count + code.copied_count] = closure[code.free_count:]
+                    else:
+                        derefs[code.cell_count:] = closure
+
+                elif op == 0x50: # NEGATE
+                    registers[a] = -registers[b]
+                elif op == 0x51: # POSITIVE
+                    registers[a] = +registers[b]
+                elif op == 0x66: # NOT
+                    registers[a] = not registers[b]
+                elif op == 0x67: # AND
+                    registers[a] = registers[b] and registers[c]
+                elif op == 0x68: # OR
+                    registers[a] = registers[b] or registers[c]
+
+                elif op == 0x06: # MAKE_OBJECT
+                    registers[a] = SpyObject()
+                elif op == 0x07: # LOAD_ATTR
+                    registers[a] = registers[b].attributes[registers[c]]
+                elif op == 0x08: # STORE_ATTR
+                    registers[a].attributes[registers[b]] = registers[c]
+
+                else:
+                    raise SpyRuntimeError(f"unsupported instruction {op:#04x}")
+        except SpyRuntimeError as error:
+            if not error.trace:
+                error.trace = self.traceback(pc)
+            del frames[base:]
+            raise
+        except Exception as error:
+            trace = self.traceback(pc)
+            del frames[base:]
+            raise SpyRuntimeError(f"{type(error).__name__}: {error}", trace) from error
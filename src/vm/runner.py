@@ -0,0 +1,273 @@
+"""
+Runs a batch of independent SPY scripts across a process pool.
+
+Each script is compiled once, in this process, into an on-disk cache of
+pooled `.spyc` modules keyed by the hash of its source and the compiler version,
+so unchanged scripts aren't compiled again on later runs either. Workers
+map the cached module files into memory and load them from there, rather
+than receiving pickled blocks, and keep what they loaded for the next
+script that needs it. Every script runs in a fresh VM, with its output
+captured.
+
+At most `--concurrency` scripts are in the pool at once, each submitted
+`--repeat` times. Latency is the time from submitting a script to getting
+its result back.
+
+    python -m vm.runner [--processes N] [--concurrency N] [--repeat N] [--cache DIR] PATH...
+"""
+import functools
+import hashlib
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import sys
+from dataclasses import dataclass
+from time import perf_counter_ns
+
+from compiler import compile_source, CompileError
+from codegen.block import Block
+from codegen.module import VERSION, dump_module, load_module
+from vm.builtins import builtins, spy_str
+from vm.interpreter import VM
+from vm.objects import SpyRuntimeError
+from vm.stats import module_paths
+
+# Packages whose source determines what the compiler produces
+_compiler_packages = ("lex", "parse", "process", "codegen")
+
+@functools.cache
+def compiler_version() -> str:
+    """
+    Identifies the compiler by the module format version and a hash of the
+    compiler's own source, so cached modules go stale when either changes.
+    """
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = [os.path.join(root, "compiler.py")]
+    for package in _compiler_packages:
+        for directory, _, files in os.walk(os.path.join(root, package)):
+            paths.extend(os.path.join(directory, file) for file in files if file.endswith(".py"))
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return f"v{VERSION}-{digest.hexdigest()[:16]}"
+
+class ModuleCache:
+    """
+    A directory of compiled modules, named after the hash of their source
+    and the compiler version.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.version = compiler_version()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, source: str) -> str:
+        key = hashlib.sha256(source.encode()).hexdigest()
+        return os.path.join(self.directory, f"{key}-{self.version}.spyc")
+
+    def compile(self, source: str) -> tuple[str, bool]:
+        """
+        Gets the path of the compiled module for `source`, compiling it if
+        it isn't cached yet. Also returns whether it was already cached.
+        Raises `CompileError` if the source doesn't parse, and whatever the
+        resolver or codegen raise if it parses but doesn't resolve or generate.
+        """
+
+        path = self.path_for(source)
+        if os.path.exists(path):
+            return path, True
+        data = dump_module(compile_source(source), pooled=True)
+        # written under a temporary name first, so that no reader ever
+        # sees a partial module
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        return path, False
+
+@dataclass
+class ScriptResult:
+    path: str
+    output: str
+    error: str | None
+    # time spent loading and running the script in its worker
+    run_ns: int
+
+# Modules this worker has loaded, by cache path
+_loaded: dict[str, Block] = {}
+
+def _load_cached(path: str) -> Block:
+    block = _loaded.get(path)
+    if block is None:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            block = load_module(data)
+        _loaded[path] = block
+    return block
+
+def run_script(path: str, module_path: str) -> ScriptResult:
+    """
+    Runs the compiled module at `module_path` in a fresh VM. Runs in a
+    worker process.
+    """
+
+    lines = []
+    def capture_print(*values):
+        lines.append(" ".join(map(spy_str, values)))
+
+    start = perf_counter_ns()
+    error = None
+    try:
+        block = _load_cached(module_path)
+    except Exception as e:
+        # a cache file that is unreadable or fails verification
+        error = f"{type(e).__name__}: {e}"
+    else:
+        try:
+            VM({**builtins, "print": capture_print}).run_module(block)
+        except (SpyRuntimeError, ValueError) as e:
+            error = str(e)
+    return ScriptResult(path, "\n".join(lines), error, perf_counter_ns() - start)
+
+@dataclass
+class BatchReport:
+    results: list[ScriptResult]
+    latencies_ns: list[int]
+    elapsed_ns: int
+    compiled: int
+    cached: int
+
+    @property
+    def failed(self) -> list[ScriptResult]:
+        return [result for result in self.results if result.error is not None]
+
+    def throughput(self) -> float:
+        """
+        Scripts completed per second.
+        """
+
+        return len(self.latencies_ns) / (self.elapsed_ns / 1_000_000_000) if self.elapsed_ns else 0.0
+
+    def percentile(self, p: float) -> int:
+        """
+        The latency below which `p` percent of the scripts completed, by
+        nearest rank.
+        """
+
+        if not self.latencies_ns:
+            return 0
+        ordered = sorted(self.latencies_ns)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def run_batch(
+        paths: list[str],
+        cache: ModuleCache,
+        processes: int | None = None,
+        concurrency: int | None = None,
+        repeat: int = 1) -> BatchReport:
+    """
+    Compiles every script in `paths` into `cache`, then runs each `repeat`
+    times in a pool of `processes` workers (one per CPU by default), with
+    at most `concurrency` (by default one per worker) submitted at once.
+    Scripts that don't compile, resolve or generate are reported as failed
+    without running.
+    """
+
+    processes = processes or os.cpu_count() or 1
+    concurrency = concurrency or processes
+
+    results = []
+    modules = {}
+    compiled = cached = 0
+    for path in dict.fromkeys(paths):
+        with open(path) as file:
+            source = file.read()
+        try:
+            modules[path], hit = cache.compile(source)
+        except CompileError as error:
+            results.append(ScriptResult(path, "", str(error), 0))
+            continue
+        except Exception as error:
+            # the resolver raises NameError for undefined names and codegen
+            # a plain Exception for duplicate bindings
+            results.append(ScriptResult(path, "", f"{type(error).__name__}: {error}", 0))
+            continue
+        if hit:
+            cached += 1
+        else:
+            compiled += 1
+
+    jobs = [path for path in paths if path in modules] * repeat
+    done = queue.SimpleQueue()
+    latencies = []
+
+    with multiprocessing.Pool(processes) as pool:
+        def submit(path: str):
+            submitted = perf_counter_ns()
+            pool.apply_async(
+                run_script,
+                (path, modules[path]),
+                callback=lambda result: done.put((result, perf_counter_ns() - submitted)),
+                error_callback=lambda error: done.put((
+                    ScriptResult(path, "", f"{type(error).__name__}: {error}", 0),
+                    perf_counter_ns() - submitted)))
+
+        def collect():
+            result, latency = done.get()
+            results.append(result)
+            latencies.append(latency)
+
+        start = perf_counter_ns()
+        for i, path in enumerate(jobs):
+            if i >= concurrency:
+                collect()
+            submit(path)
+        for _ in range(min(concurrency, len(jobs))):
+            collect()
+        elapsed = perf_counter_ns() - start
+
+    return BatchReport(results, latencies, elapsed, compiled, cached)
+
+def _format_ns(ns: int) -> str:
+    return f"{ns / 1_000_000:.3f}ms"
+
+def main():
+    args = sys.argv[1:]
+    processes = None
+    concurrency = None
+    repeat = 1
+    cache_directory = ".spycache"
+    roots = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--processes":
+            processes = int(args.pop(0))
+        elif arg == "--concurrency":
+            concurrency = int(args.pop(0))
+        elif arg == "--repeat":
+            repeat = int(args.pop(0))
+        elif arg == "--cache":
+            cache_directory = args.pop(0)
+        else:
+            roots.append(arg)
+    if not roots:
+        raise SystemExit(__doc__)
+
+    paths = [path for path in module_paths(roots) if path.endswith(".spy")]
+    report = run_batch(paths, ModuleCache(cache_directory), processes, concurrency, repeat)
+
+    for result in report.failed:
+        print(f"{result.path}: {result.error}", file=sys.stderr)
+    print(f"scripts      {len(report.results)} ({len(report.failed)} failed)")
+    print(f"modules      {report.compiled} compiled, {report.cached} cached")
+    print(f"throughput   {report.throughput():.1f} scripts/s")
+    print(f"p50 latency  {_format_ns(report.percentile(50))}")
+    print(f"p99 latency  {_format_ns(report.percentile(99))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Opcode and opcode-pair statistics over a directory of SPY modules.
+
+By default the bytecode is analysed statically. With `--dynamic` each
+module is run and every executed instruction is counted instead. Compiled
+modules (`.spyc`) are loaded as is; sources (`.spy`) are compiled first.
+The result is printed as JSON, or written to `--output` (useful with
+`--dynamic`, where the programs print too).
+
+    python -m vm.stats [--dynamic] [--output FILE] DIR...
+"""
+import os
+import sys
+
+from codegen.block import Block, read_instruction
+from codegen.reader import Reader
+from codegen.module import load_module
+from codegen.stats import OpcodeStats
+from vm.interpreter import VM, Frame
+
+class StatsTracer:
+    """
+    A VM tracer that adds every executed instruction to `stats`. Pairs are
+    only counted between instructions executed one after the other in the
+    same frame.
+    """
+
+    def __init__(self, stats: OpcodeStats):
+        self.stats = stats
+        self._previous: list[str | None] = []
+
+    def __call__(self, frames: list[Frame], pc: int):
+        depth = len(frames)
+        previous = self._previous
+        if depth > len(previous):
+            previous.append(None)
+        elif depth < len(previous):
+            del previous[depth:]
+
+        reader = Reader(frames[-1].code.body, debug=False)
+        reader.pos = pc
+        name, arg = read_instruction(reader)
+        self.stats.add(name, arg, previous[-1])
+        previous[-1] = name
+
+def load(path: str) -> Block:
+    if path.endswith(".spyc"):
+        with open(path, "rb") as file:
+            return load_module(file.read())
+    else:
+        from compiler import compile_source
+        with open(path) as file:
+            return compile_source(file.read())
+
+def module_paths(roots: list[str]) -> list[str]:
+    paths = []
+    for root in roots:
+        if os.path.isfile(root):
+            paths.append(root)
+            continue
+        for directory, _, files in os.walk(root):
+            for file in files:
+                if file.endswith(".spy") or file.endswith(".spyc"):
+                    paths.append(os.path.join(directory, file))
+    return sorted(paths)
+
+def main():
+    args = sys.argv[1:]
+    dynamic = False
+    output_path = None
+    roots = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--dynamic":
+            dynamic = True
+        elif arg == "--output":
+            output_path = args.pop(0)
+        else:
+            roots.append(arg)
+    if not roots:
+        raise SystemExit(__doc__)
+
+    stats = OpcodeStats()
+    for path in module_paths(roots):
+        block = load(path)
+        if dynamic:
+            vm = VM()
+            vm.tracer = StatsTracer(stats)
+            vm.run_module(block)
+        else:
+            stats.add_block(block)
+
+    if output_path is None:
+        print(stats.to_json())
+    else:
+        with open(output_path, "w") as file:
+            file.write(stats.to_json() + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import operator
+from typing import Callable
+
+from codegen.instructions import instruction_sizes, typed_instructions
+from vm.objects import *
+
+# An instruction translated ahead of time: it runs against a frame's
+# values (its locals come first), its value stack and its cells, and
+# returns the offset of the next instruction.
+type ThreadedOp = Callable[[list, list, list], int]
+
+# Instructions that switch frames or need the frame itself; `VM._run`
+# handles these from the bytecode.
+_driver_instructions = {"CALL", "TAIL_CALL", "RETURN", "COPY_FREE_VARS"}
+
+# Binary operators that are fused with the two loads before them, with
+# their typed forms, which run the same Python operator
+_fusable_operators = {
+    "ADD": operator.add,
+    "SUBTRACT": operator.sub,
+    "MULTIPLY": operator.mul,
+    "EQ": operator.eq,
+    "NEQ": operator.ne,
+    "GT": operator.gt,
+    "GTEQ": operator.ge,
+    "LT": operator.lt,
+    "LTEQ": operator.le,
+}
+_fusable_operators.update({
+    typed: _fusable_operators[generic]
+    for generic, forms in typed_instructions.items() for typed in forms.values()
+})
+
+def thread_code(code: Code, globals: dict[str, object], builtins: dict[str, object]) -> list[ThreadedOp | None]:
+    """
+    Translates `code` into direct-threaded form: a list indexed by bytecode
+    offset holding, at the start of each instruction, a closure with its
+    operand already decoded. Common three-instruction sequences get one
+    closure for the whole sequence. Entries are None for instructions the
+    driver handles itself and past the end of the body.
+    """
+
+    ops: list[ThreadedOp | None] = [None] * (len(code.body) + 1)
+    decoded = list(code.block.instructions())
+    for i, (offset, name, arg) in enumerate(decoded):
+        if name in _driver_instructions:
+            continue
+        ops[offset] = _fuse(code, decoded[i:i + 3]) \
+            or _translate(code, name, arg, offset, globals, builtins)
+    return ops
+
+def _fuse(code: Code, window: list[tuple[int, str, int | None]]) -> ThreadedOp | None:
+    """
+    Translates a local load, a local or constant load and a binary
+    operator into a single closure, if that's what `window` starts with.
+    Jumps into the middle of the sequence still find the closures for the
+    single instructions at their offsets.
+    """
+
+    if len(window) < 3 or window[2][1] not in _fusable_operators:
+        return None
+    (offset, first, first_arg), (_, second, second_arg), (last_offset, operator_name, _) = window
+    fn = _fusable_operators[operator_name]
+    next_pc = last_offset + 1
+
+    if first == "LOAD_LOCAL" and second == "LOAD_LOCAL":
+        def op(values, stack, derefs):
+            stack.append(fn(values[first_arg], values[second_arg]))
+            return next_pc
+    elif first == "LOAD_LOCAL" and second == "LOAD_CONST" and type(code.consts[second_arg]) is not FunctionTemplate:
+        const = code.consts[second_arg]
+        def op(values, stack, derefs):
+            stack.append(fn(values[first_arg], const))
+            return next_pc
+    else:
+        return None
+    return op
+
+def _translate(
+        code: Code,
+        name: str,
+        arg: int | None,
+        offset: int,
+        globals: dict[str, object],
+        builtins: dict[str, object]) -> ThreadedOp:
+    next_pc = offset + instruction_sizes[code.body[offset]]
+
+    match name:
+        case "LOAD_LOCAL":
+            def op(values, stack, derefs):
+                stack.append(values[arg])
+                return next_pc
+        case "LOAD_CONST":
+            const = code.consts[arg]
+            if type(const) is FunctionTemplate:
+                template_code = const.code
+                closure_indices = const.closure_indices
+                copied_indices = const.copied_indices
+                if copied_indices:
+                    def op(values, stack, derefs):
+                        stack.append(Function(template_code,
+                            tuple(derefs[i] for i in closure_indices) + tuple(values[i] for i in copied_indices)))
+                        return next_pc
+                else:
+                    def op(values, stack, derefs):
+                        stack.append(Function(template_code, tuple(derefs[i] for i in closure_indices)))
+                        return next_pc
+            else:
+                def op(values, stack, derefs):
+                    stack.append(const)
+                    return next_pc
+        case "LOAD_DEREF":
+            def op(values, stack, derefs):
+                stack.append(derefs[arg].value)
+                return next_pc
+        case "LOAD_NAME":
+            name = code.names[arg]
+            def op(values, stack, derefs):
+                if name in globals:
+                    stack.append(globals[name])
+                elif name in builtins:
+                    stack.append(builtins[name])
+                else:
+                    raise SpyRuntimeError(f"name {name} is not defined")
+                return next_pc
+        case "STORE_LOCAL":
+            def op(values, stack, derefs):
+                values[arg] = stack.pop()
+                return next_pc
+        case "STORE_DEREF":
+            def op(values, stack, derefs):
+                derefs[arg].value = stack.pop()
+                return next_pc
+        case "STORE_NAME":
+            name = code.names[arg]
+            def op(values, stack, derefs):
+                globals[name] = stack.pop()
+                return next_pc
+
+        case "ADD" | "INT_ADD" | "STR_ADD":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] + right
+                return next_pc
+        case "SUBTRACT" | "INT_SUBTRACT":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] - right
+                return next_pc
+        case "MULTIPLY" | "INT_MULTIPLY":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] * right
+                return next_pc
+        case "DIVIDE":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is int and type(right) is int:
+                    stack[-1] = left // right
+                else:
+                    stack[-1] = left / right
+                return next_pc
+
+        case "EQ" | "INT_EQ":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] == right
+                return next_pc
+        case "NEQ" | "INT_NEQ":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] != right
+                return next_pc
+        case "GT" | "INT_GT":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] > right
+                return next_pc
+        case "GTEQ" | "INT_GTEQ":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] >= right
+                return next_pc
+        case "LT" | "INT_LT":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] < right
+                return next_pc
+        case "LTEQ" | "INT_LTEQ":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] <= right
+                return next_pc
+
+        case "JUMP_FORWARD_FALSE":
+            target = offset + arg
+            def op(values, stack, derefs):
+                return next_pc if stack.pop() else target
+        case "JUMP_FORWARD_TRUE":
+            target = offset + arg
+            def op(values, stack, derefs):
+                return target if stack.pop() else next_pc
+        case "JUMP_IF_FALSE_OR_POP":
+            target = offset + arg
+            def op(values, stack, derefs):
+                if stack[-1]:
+                    stack.pop()
+                    return next_pc
+                return target
+        case "JUMP_IF_TRUE_OR_POP":
+            target = offset + arg
+            def op(values, stack, derefs):
+                if stack[-1]:
+                    return target
+                stack.pop()
+                return next_pc
+        case "JUMP_FORWARD":
+            target = offset + arg
+            def op(values, stack, derefs):
+                return target
+        case "JUMP_BACKWARD":
+            target = offset - arg
+            def op(values, stack, derefs):
+                return target
+
+        case "POP":
+            def op(values, stack, derefs):
+                stack.pop()
+                return next_pc
+        case "DUP":
+            def op(values, stack, derefs):
+                stack.append(stack[-1])
+                return next_pc
+        case "SWAP":
+            def op(values, stack, derefs):
+                stack[-1], stack[-2] = stack[-2], stack[-1]
+                return next_pc
+        case "NOP" | "LOCAL_SLOTS":
+            def op(values, stack, derefs):
+                return next_pc
+
+        case "NEGATE":
+            def op(values, stack, derefs):
+                stack[-1] = -stack[-1]
+                return next_pc
+        case "POSITIVE":
+            def op(values, stack, derefs):
+                stack[-1] = +stack[-1]
+                return next_pc
+        case "NOT":
+            def op(values, stack, derefs):
+                stack[-1] = not stack[-1]
+                return next_pc
+        case "AND":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] and right
+                return next_pc
+        case "OR":
+            def op(values, stack, derefs):
+                right = stack.pop()
+                stack[-1] = stack[-1] or right
+                return next_pc
+
+        case "MAKE_OBJECT":
+            def op(values, stack, derefs):
+                stack.append(SpyObject())
+                return next_pc
+        case "LOAD_ATTR":
+            def op(values, stack, derefs):
+                key = stack.pop()
+                stack[-1] = stack[-1].attributes[key]
+                return next_pc
+        case "STORE_ATTR":
+            def op(values, stack, derefs):
+                value = stack.pop()
+                key = stack.pop()
+                stack[-1].attributes[key] = value
+                return next_pc
+
+        case _:
+            raise NotImplementedError(f"Not implemented for {name}")
+
+    return op
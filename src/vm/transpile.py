@@ -0,0 +1,391 @@
+from ast import literal_eval
+from typing import Callable, TYPE_CHECKING
+
+from parse.parsenode import *
+from vm.objects import *
+
+if TYPE_CHECKING:
+    from vm.interpreter import VM
+
+# A SPY function translated to Python. It is called with the `Function`
+# being called followed by the arguments, and returns the result.
+type NativeFunction = Callable[..., object]
+
+class Untranslatable(Exception):
+    """
+    Raised for a function the transpiler can't turn into Python. The
+    function just keeps running in the VM.
+    """
+
+_binary_operators = {
+    'plus': '+',
+    'minus': '-',
+    'asterisk': '*',
+    'greater': '>',
+    'greaterequals': '>=',
+    'less': '<',
+    'lessequals': '<=',
+    'equalsequals': '==',
+    'bangequals': '!=',
+}
+
+# Operators that behave differently from their Python counterpart, so
+# they call a helper: integer division floors
+_binary_helpers = {
+    'slash': '_divide',
+}
+
+_prefix_operators = {
+    'minus': '-',
+    'plus': '+',
+    'bang': 'not ',
+}
+
+def _needs_statements(node: Node) -> bool:
+    """
+    Whether translating `node` emits statements, rather than just producing
+    a Python expression.
+    """
+
+    match node:
+        case IfElseExpressionNode() | AssignmentExpressionNode() | BlockNode():
+            return True
+        case BinaryExpressionNode():
+            return _needs_statements(node.left) or _needs_statements(node.right)
+        case PrefixExpressionNode():
+            return _needs_statements(node.operand)
+        case CallExpressionNode():
+            return _needs_statements(node.callee) \
+                or any(_needs_statements(arg.expr) for arg in node.arglist.arguments)
+        case _:
+            return False
+
+class Transpiler:
+    """
+    Translates one SPY function, from the function literal its block was
+    generated from, into the source of a Python function.
+
+    SPY locals become Python locals. Cell and free variables stay `Cell`s,
+    held in Python locals, so closures created here and in the VM share
+    them; variables copied into the closure are plain locals. Uses the
+    bytecode loads as constants become the literals they are bound to, and
+    the lets binding them are dropped. Every SPY expression becomes a Python expression, with the
+    statements it needs (for an if/else, a block or an assignment) emitted
+    before the statement that uses it. The body runs in a `while True`
+    loop so that a tail call to the function itself just rebinds the
+    parameters and goes around again.
+
+    Names are resolved exactly as `Codegen` resolves them, so the result
+    behaves like the bytecode.
+    """
+
+    def __init__(self, code: Code):
+        block = code.block
+        if block.node is None:
+            raise Untranslatable(f"{code.name} has no syntax tree")
+        self.code = code
+        self.node: FunctionLiteralExpressionNode = block.node
+        self.parameters = [param.name.token.content for param in self.node.paramlist.parameters]
+        self.cells = set(block.cell_names)
+        self.free = set(block.free_names)
+        self.constants = block.constant_nodes
+        self.locals: set[str] = set()
+        self.templates = {
+            node: const for const in code.consts
+            if type(const) is FunctionTemplate and const.code.block.node is not None
+            for node in (const.code.block.node, *const.code.block.shared_nodes)
+        }
+        # values the generated source refers to by name
+        self.namespace: dict[str, object] = {}
+        self.lines: list[str] = []
+        self.depth = 0
+        self.temp_count = 0
+
+    def emit(self, line: str):
+        self.lines.append("    " * self.depth + line)
+
+    def temp(self) -> str:
+        name = f"_t{self.temp_count}"
+        self.temp_count += 1
+        return name
+
+    def spill(self, value: str) -> str:
+        """
+        Evaluates `value` now, into a new temporary.
+        """
+
+        name = self.temp()
+        self.emit(f"{name} = {value}")
+        return name
+
+    def translate(self) -> str:
+        block = self.code.block
+        parameters = "".join(f", l_{name}" for name in self.parameters)
+        self.emit(f"def _spy(_function{parameters}):")
+        self.depth += 1
+        for index, name in enumerate(block.free_names):
+            self.emit(f"f_{name} = _function.closure[{index}]")
+        for index, name in enumerate(block.copied_names, len(block.free_names)):
+            self.emit(f"l_{name} = _function.closure[{index}]")
+        self.emit("while True:")
+        self.depth += 1
+
+        # every call starts with fresh cells and unset locals
+        for name in block.cell_names:
+            self.emit(f"c_{name} = _Cell({f'l_{name}' if name in self.parameters else ''})")
+        for name in block.local_names[block.argument_count + len(block.copied_names):]:
+            self.emit(f"l_{name} = None")
+        self.locals.update(self.parameters)
+        self.locals.update(block.copied_names)
+
+        self.tail(self.node.body)
+        return "\n".join(self.lines) + "\n"
+
+    def indented(self, translate: Callable, *args):
+        self.depth += 1
+        translate(*args)
+        self.depth -= 1
+
+    def statement(self, node: Node):
+        match node:
+            case LetStatementNode():
+                if id(node) in self.constants:
+                    # its uses are the literal
+                    return
+                name = node.name.token.content
+                value = self.expr(node.value)
+                if name in self.cells or name in self.free:
+                    self.emit(f"{self.deref(name)}.value = {value}")
+                else:
+                    self.locals.add(name)
+                    self.emit(f"l_{name} = {value}")
+            case ExpressionStatementNode():
+                value = self.expr(node.expr)
+                # a plain name or None has nothing left to evaluate
+                if not value.isidentifier():
+                    self.emit(value)
+            case _:
+                raise Untranslatable(f"can't translate {type(node).__name__}")
+
+    def tail(self, node: Node):
+        """
+        Translates `node` into statements that return its value.
+        """
+
+        match node:
+            case BlockNode():
+                for statement in node.statements[:-1]:
+                    self.statement(statement)
+                if node.statements and isinstance(node.statements[-1], ExpressionStatementNode):
+                    self.tail(node.statements[-1].expr)
+                else:
+                    if node.statements:
+                        self.statement(node.statements[-1])
+                    self.emit("return None")
+            case IfElseExpressionNode():
+                self.if_chain(node.cases, self.tail, lambda: self.emit("return None"))
+            case CallExpressionNode():
+                callee = self.spill(self.expr(node.callee))
+                args = self.operands([arg.expr for arg in node.arglist.arguments])
+                if len(args) == len(self.parameters):
+                    self.emit(f"if {callee} is _function:")
+                    self.depth += 1
+                    if args:
+                        targets = ", ".join(f"l_{name}" for name in self.parameters)
+                        self.emit(f"{targets} = {', '.join(args)}")
+                    self.emit("continue")
+                    self.depth -= 1
+                self.emit(f"return _call({', '.join([callee, *args])})")
+            case _:
+                self.emit(f"return {self.expr(node)}")
+
+    def if_chain(self, cases, translate_body: Callable[[Node], None], translate_missing: Callable[[], None]):
+        """
+        Translates the cases of an if/else into Python if statements, with
+        `translate_body` for each case's body and `translate_missing` for
+        when no case matches and there is no else.
+        """
+
+        keyword = "if"
+        nesting = 0
+        for condition, body in cases:
+            if condition is None:
+                if keyword == "if":
+                    translate_body(body)
+                else:
+                    self.emit("else:")
+                    self.indented(translate_body, body)
+                break
+            if keyword == "elif" and _needs_statements(condition):
+                # the condition's statements may only run once the
+                # previous conditions were false
+                self.emit("else:")
+                self.depth += 1
+                nesting += 1
+                keyword = "if"
+            self.emit(f"{keyword} {self.expr(condition)}:")
+            self.indented(translate_body, body)
+            keyword = "elif"
+        else:
+            self.emit("else:")
+            self.indented(translate_missing)
+        self.depth -= nesting
+
+    def operands(self, nodes: list[Node]) -> list[str]:
+        """
+        Translates `nodes`, which are evaluated left to right. An operand
+        followed by one that emits statements is evaluated into a temporary
+        first, so those statements can't run before it.
+        """
+
+        values = []
+        for i, node in enumerate(nodes):
+            value = self.expr(node)
+            if any(_needs_statements(later) for later in nodes[i + 1:]):
+                value = self.spill(value)
+            values.append(value)
+        return values
+
+    def deref(self, name: str) -> str:
+        if name in self.cells:
+            return f"c_{name}"
+        if name in self.free:
+            return f"f_{name}"
+        raise Untranslatable(f"{name} isn't a cell or free variable of {self.code.name}")
+
+    def expr(self, node: Node) -> str:
+        """
+        Translates `node` into a Python expression, emitting any statements
+        it needs first.
+        """
+
+        match node:
+            case NumberLiteralExpressionNode():
+                return repr(int(node.token.content))
+            case StringLiteralExpressionNode():
+                return repr(literal_eval(node.token.content))
+            case BoolLiteralExpressionNode():
+                return repr(node.get_value())
+
+            case IdentifierExpressionNode():
+                if (literal := self.constants.get(id(node))) is not None:
+                    return self.expr(literal)
+                name = node.token.content
+                if name in self.cells or name in self.free:
+                    return f"{self.deref(name)}.value"
+                if name in self.locals:
+                    return f"l_{name}"
+                return f"(_globals[{name!r}] if {name!r} in _globals else _load({name!r}))"
+
+            case BinaryExpressionNode() if node.operator == 'and' or node.operator == 'or':
+                if not _needs_statements(node.right):
+                    return f"({self.expr(node.left)} {node.operator} {self.expr(node.right)})"
+                # the right side's statements may only run when it is evaluated
+                result = self.spill(self.expr(node.left))
+                self.emit(f"if {result}:" if node.operator == 'and' else f"if not {result}:")
+                self.indented(lambda: self.emit(f"{result} = {self.expr(node.right)}"))
+                return result
+            case BinaryExpressionNode():
+                left, right = self.operands([node.left, node.right])
+                if node.operator in _binary_operators:
+                    return f"({left} {_binary_operators[node.operator]} {right})"
+                if node.operator in _binary_helpers:
+                    return f"{_binary_helpers[node.operator]}({left}, {right})"
+                raise Untranslatable(f"can't translate the {node.operator} operator")
+            case PrefixExpressionNode():
+                if node.operator not in _prefix_operators:
+                    raise Untranslatable(f"can't translate the {node.operator} operator")
+                return f"({_prefix_operators[node.operator]}{self.expr(node.operand)})"
+
+            case CallExpressionNode():
+                values = self.operands([node.callee, *(arg.expr for arg in node.arglist.arguments)])
+                return f"_call({', '.join(values)})"
+
+            case AssignmentExpressionNode():
+                name = node.left.token.content
+                value = self.expr(node.value)
+                if name in self.cells or name in self.free:
+                    self.emit(f"{self.deref(name)}.value = {value}")
+                elif name in self.locals:
+                    self.emit(f"l_{name} = {value}")
+                else:
+                    self.emit(f"_globals[{name!r}] = {value}")
+                return "None"
+
+            case IfElseExpressionNode():
+                result = self.temp()
+                self.if_chain(
+                    node.cases,
+                    lambda body: self.emit(f"{result} = {self.expr(body)}"),
+                    lambda: self.emit(f"{result} = None"))
+                return result
+            case BlockNode():
+                for statement in node.statements[:-1]:
+                    self.statement(statement)
+                if node.statements and isinstance(node.statements[-1], ExpressionStatementNode):
+                    return self.expr(node.statements[-1].expr)
+                if node.statements:
+                    self.statement(node.statements[-1])
+                return "None"
+
+            case FunctionLiteralExpressionNode():
+                template = self.templates.get(node)
+                if template is None:
+                    raise Untranslatable(f"no code for a function literal in {self.code.name}")
+                name = f"_code{len(self.namespace)}"
+                self.namespace[name] = template.code
+                nested = template.code.block
+                closure = "".join(f"{self.deref(free)}, " for free in nested.free_names)
+                closure += "".join(f"l_{copied}, " for copied in nested.copied_names)
+                return f"_Function({name}, ({closure}))"
+
+            case _:
+                raise Untranslatable(f"can't translate {type(node).__name__}")
+
+def runtime(vm: 'VM') -> dict[str, object]:
+    """
+    The helpers generated functions use to run against `vm`.
+    """
+
+    globals = vm.globals
+    builtins = vm.builtins
+
+    def load(name: str):
+        if name in builtins:
+            return builtins[name]
+        raise SpyRuntimeError(f"name {name} is not defined")
+
+    def call(callee, *args):
+        if type(callee) is Function:
+            if callee.code.native is not None and vm.native_depth < vm.max_native_depth:
+                return vm._call_native(callee, args)
+            return vm.call(callee, *args)
+        if callable(callee):
+            return callee(*args)
+        raise SpyRuntimeError(f"{callee!r} is not callable")
+
+    def divide(left, right):
+        if type(left) is int and type(right) is int:
+            return left // right
+        return left / right
+
+    return {
+        "_globals": globals,
+        "_load": load,
+        "_call": call,
+        "_divide": divide,
+        "_Function": Function,
+        "_Cell": Cell,
+    }
+
+def transpile(code: Code, vm: 'VM') -> NativeFunction:
+    """
+    Translates `code` to Python and compiles it, or raises `Untranslatable`
+    if it can't be.
+    """
+
+    transpiler = Transpiler(code)
+    source = transpiler.translate()
+    namespace = {**runtime(vm), **transpiler.namespace}
+    exec(compile(source, f"<spy {code.name}>", "exec"), namespace)
+    return namespace["_spy"]